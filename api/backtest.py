@@ -0,0 +1,210 @@
+"""Strategy backtests over the daily BTC history — /api/backtest.
+
+A strategy is a buy schedule (daily, weekly or monthly from the start date)
+plus an optional rule that scales each buy by looking at an indicator on
+that day: the Mayer multiple (price / 200-day SMA) or the drawdown from the
+running all-time high. Both indicators are the derived.Source series the
+cycles and metrics pages already use. Each strategy is a few passes over
+its buy days (running totals by itertools.accumulate, lowest close between
+buys by min() over array slices), not a Python loop over every day.
+
+Strategies are given as compact specs, comma-separated in ?strategies=:
+
+    lump                        everything monthly DCA would invest, on day one
+    dca[:freq]                  fixed buys; freq daily, weekly (default) or monthly
+    mayer:<below>:<x>[:freq]    buy x times as much while the Mayer multiple < below
+    dip:<pct>:<x>[:freq]        buy x times as much while more than pct% below the ATH
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate
+from operator import truediv
+from typing import List, Optional
+
+from flask import jsonify, request
+
+import derived
+from series import downsample_xy, to_ms
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+# Buys per month at each frequency, so every schedule spends the same per month
+BUYS_PER_MONTH = {'daily': 365.25 / 12, 'weekly': 365.25 / 7 / 12, 'monthly': 1.0}
+DEFAULT_STRATEGIES = 'lump,dca:monthly,dca:weekly,dca:daily,mayer:1.0:2,mayer:0.8:3,dip:50:2'
+MAX_STRATEGIES = 16
+MAX_CURVE_POINTS = 1000
+
+
+class Strategy:
+    """A parsed ?strategies= entry."""
+
+    def __init__(self, spec: str, kind: str, freq: str = 'monthly',
+                 threshold: Optional[float] = None, boost: float = 1.0):
+        self.spec = spec
+        self.kind = kind
+        self.freq = freq
+        self.threshold = threshold
+        self.boost = boost
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Strategy':
+        """Raises ValueError for anything not in the module docstring's grammar."""
+        parts = spec.strip().lower().split(':')
+        kind, args = parts[0], parts[1:]
+        if kind == 'lump' and not args:
+            return cls('lump', 'lump')
+        if kind == 'dca' and len(args) <= 1:
+            freq = args[0] if args else 'weekly'
+            if freq in FREQUENCIES:
+                return cls(f'dca:{freq}', 'dca', freq)
+        if kind in ('mayer', 'dip') and len(args) in (2, 3):
+            try:
+                threshold, boost = float(args[0]), float(args[1])
+            except ValueError:
+                raise ValueError(spec)
+            freq = args[2] if len(args) == 3 else 'weekly'
+            if threshold > 0 and 0 <= boost <= 100 and freq in FREQUENCIES:
+                return cls(f'{kind}:{args[0]}:{args[1]}:{freq}', kind, freq, threshold, boost)
+        raise ValueError(spec)
+
+
+def _buy_days(src: 'derived.Source', lo: int, hi: int, freq: str) -> List[int]:
+    """Indices in [lo, hi) of the first close on or after each scheduled date."""
+    if freq == 'daily':
+        return list(range(lo, hi))
+    ts_ms = src.series.ts_ms
+    start = src.date(lo)
+    out: List[int] = []
+    k = 0
+    while True:
+        if freq == 'weekly':
+            when = start + timedelta(days=7 * k)
+        else:
+            month = start.month - 1 + k
+            when = start.replace(year=start.year + month // 12, month=month % 12 + 1, day=min(start.day, 28))
+        i = bisect_left(ts_ms, to_ms(when), lo, hi)
+        if i >= hi:
+            return out
+        if not out or out[-1] != i:
+            out.append(i)
+        k += 1
+
+
+def _mayer_multiple(src: 'derived.Source') -> List[Optional[float]]:
+    """Price / 200-day SMA for each day, as on the cycles page."""
+    def compute():
+        return [v / m if m else None for v, m in zip(src.values, src.sma(200))]
+    return src.memo('mayer_multiple', compute)
+
+
+def _amounts(src: 'derived.Source', strategy: Strategy, days: List[int], base: float) -> List[float]:
+    """What the strategy spends on each buy day."""
+    boost = base * strategy.boost
+    if strategy.kind == 'mayer':
+        mayer, below = _mayer_multiple(src), strategy.threshold
+        return [boost if mayer[i] is not None and mayer[i] < below else base for i in days]
+    if strategy.kind == 'dip':
+        drawdown, below = src.drawdown(), -strategy.threshold
+        return [boost if drawdown[i] < below else base for i in days]
+    return [base] * len(days)
+
+
+def _run(src: 'derived.Source', strategy: Strategy, lo: int, hi: int, monthly: float,
+         months: int, curve_at: List[int], curve_dates: List[str]) -> dict:
+    values = src.values
+    if strategy.kind == 'lump':
+        days, amounts = [lo], [monthly * months]
+    else:
+        days = _buy_days(src, lo, hi, strategy.freq)
+        amounts = _amounts(src, strategy, days, monthly / BUYS_PER_MONTH[strategy.freq])
+
+    cum_invested = list(accumulate(amounts))
+    cum_btc = list(accumulate(map(truediv, amounts, [values[i] for i in days])))
+    btc, invested = cum_btc[-1], cum_invested[-1]
+
+    # Holdings are fixed between buys, so each stretch is deepest underwater
+    # on its lowest close
+    worst = 0.0
+    for k, start in enumerate(days):
+        if cum_invested[k]:
+            stop = days[k + 1] if k + 1 < len(days) else hi
+            low = values[start] if stop - start == 1 else min(values[start:stop])
+            worst = min(worst, cum_btc[k] / cum_invested[k] * low - 1.0)
+
+    curve = []
+    for i, label in zip(curve_at, curve_dates):
+        k = bisect_right(days, i) - 1
+        held, spent = (cum_btc[k], cum_invested[k]) if k >= 0 else (0.0, 0.0)
+        curve.append([label, round(held * values[i], 2), round(spent, 2)])
+
+    value = btc * values[hi - 1]
+    out = {
+        'strategy': strategy.spec,
+        'buys': len(days),
+        'invested': round(invested, 2),
+        'btc': round(btc, 8),
+        'value': round(value, 2),
+        'multiple': round(value / invested, 3) if invested else None,
+        'return_pct': round((value / invested - 1.0) * 100.0, 2) if invested else None,
+        'avg_cost': round(invested / btc, 2) if btc else None,
+        'max_underwater_pct': round(worst * 100.0, 2),
+    }
+    if curve_at:
+        # [date, value, invested to date]
+        out['curve'] = curve
+    return out
+
+
+def api_backtest():
+    """Backtest DCA / lump-sum / indicator-driven buying over the daily history.
+
+    Query params:
+        strategies  comma-separated specs (see module docstring)
+        currency    gbp (default) or usd
+        monthly     amount invested per month at the base rate (default 100)
+        start       YYYY-MM-DD first buy (default 2018-01-01)
+        end         YYYY-MM-DD last day valued (default latest close)
+        points      equity curve points per strategy, 0 for none (default 200)
+    """
+    try:
+        currency = (request.args.get('currency') or 'gbp').lower()
+        if currency not in derived.CURRENCY_SOURCES:
+            return jsonify({'error': 'currency must be gbp or usd'}), 400
+        specs = (request.args.get('strategies') or DEFAULT_STRATEGIES).split(',')
+        if len(specs) > MAX_STRATEGIES:
+            return jsonify({'error': f'at most {MAX_STRATEGIES} strategies'}), 400
+        try:
+            strategies = [Strategy.parse(s) for s in specs]
+        except ValueError as e:
+            return jsonify({'error': f'invalid strategy: {e}'}), 400
+        try:
+            monthly = float(request.args.get('monthly', 100))
+            points = int(request.args.get('points', 200))
+            start_dt = datetime.strptime(request.args.get('start', '2018-01-01'), '%Y-%m-%d')
+            end_dt = datetime.strptime(request.args['end'], '%Y-%m-%d') if 'end' in request.args else None
+            if not 0 < monthly <= 1_000_000 or not 0 <= points <= MAX_CURVE_POINTS:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': 'monthly must be 0..1000000, points 0..1000, start/end YYYY-MM-DD'}), 400
+
+        src = derived.source(derived.CURRENCY_SOURCES[currency])
+        if not len(src.values):
+            return jsonify({'error': 'BTC history unavailable'}), 502
+        lo = src.first_on_or_after(start_dt)
+        hi = src.first_after(end_dt) if end_dt else len(src.values)
+        if lo is None or lo >= hi:
+            return jsonify({'error': 'no closes between start and end'}), 404
+
+        months = len(_buy_days(src, lo, hi, 'monthly'))
+        curve_at = downsample_xy(list(range(lo, hi)), points) if points else []
+        curve_dates = [src.date(i).strftime('%Y-%m-%d') for i in curve_at]
+        return jsonify({
+            'currency': currency,
+            'monthly': monthly,
+            'start': src.date(lo).strftime('%Y-%m-%d'),
+            'end': src.date(hi - 1).strftime('%Y-%m-%d'),
+            'price_start': round(src.values[lo], 2),
+            'price_end': round(src.values[hi - 1], 2),
+            'results': [_run(src, s, lo, hi, monthly, months, curve_at, curve_dates) for s in strategies],
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,281 @@
+"""Cache shared by every section.
+
+Each entry is {'fetched_at': iso, 'data': ..., 'version': hash of data}
+stored under a short key (e.g. 'fx_usdgbp_cache'). Payloads derived from
+other datasets also record the versions of those inputs, and are served by
+:func:`cached_for` for as long as the inputs are unchanged. Where it is
+stored is chosen by BITVIZ_CACHE, see cache_backends.py: 'file' (the
+default) keeps one JSON file per key (<key>.cache.json) under DATA_DIR,
+while 'sqlite' or 'redis://...' let several workers or instances share one
+warm cache.
+
+BITVIZ_DATA_DIR relocates DATA_DIR, e.g. to /tmp where api/data is
+read-only; BITVIZ_CACHE_MAX_ENTRIES bounds how many entries are kept.
+
+Inside :func:`refresh_ahead` every freshness check is shortened by a lead
+time, which is how the warmer (datasets.py) refreshes entries through the
+usual code paths before they expire.
+
+Payloads that endpoints return as they are also keep a ready-to-send copy
+of their response (:func:`write_response`), stored as raw bytes under
+'<key>.response': one JSON header line (fetched_at, inputs, etag, body
+length), the body exactly as jsonify would encode it, then a gzip copy of
+the body if it is at least GZIP_MIN_BYTES. :func:`cached_response` serves
+that with no decoding or re-encoding of the payload, gzipped when the
+client accepts it, and answers If-None-Match with a 304.
+"""
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, List, Tuple
+
+from flask import Response, jsonify, request
+
+import deadline
+from cache_backends import CacheBackend, DEFAULT_MAX_ENTRIES, from_url
+
+DATA_DIR = Path(os.environ.get('BITVIZ_DATA_DIR') or Path(__file__).parent / 'data')
+
+RESPONSE_SUFFIX = '.response'
+# Smaller bodies aren't worth a gzip copy
+GZIP_MIN_BYTES = 1024
+
+_backend: Optional[CacheBackend] = None
+_lead: contextvars.ContextVar = contextvars.ContextVar('cache_refresh_lead', default=timedelta(0))
+
+def backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        _backend = from_url(
+            os.environ.get('BITVIZ_CACHE') or 'file',
+            DATA_DIR,
+            int(os.environ.get('BITVIZ_CACHE_MAX_ENTRIES') or DEFAULT_MAX_ENTRIES),
+        )
+    return _backend
+
+@contextmanager
+def refresh_ahead(lead: timedelta):
+    """Treat data as stale `lead` before it would expire, for everything
+    called inside the block."""
+    token = _lead.set(lead)
+    try:
+        yield
+    finally:
+        _lead.reset(token)
+
+def refresh_lead() -> timedelta:
+    return _lead.get()
+
+def _is_fresh(fetched_at: Optional[str], max_age: timedelta) -> bool:
+    try:
+        return datetime.utcnow() - datetime.fromisoformat(fetched_at) < max_age - _lead.get()
+    except Exception:
+        return False
+
+def _fresh(entry, max_age: timedelta):
+    try:
+        if 'data' in entry and _is_fresh(entry.get('fetched_at'), max_age):
+            return entry['data']
+    except Exception:
+        return None
+    return None
+
+def cached_json(key: str, max_age: timedelta) -> Optional[dict]:
+    try:
+        entry = backend().get(key)
+    except Exception:
+        return None
+    return _fresh(entry, max_age) if entry else None
+
+def cached_many(keys: Iterable[str], max_age: timedelta) -> Dict[str, dict]:
+    """cached_json for several keys in one backend round trip; keys that are
+    missing or older than max_age are left out."""
+    try:
+        entries = backend().get_many(keys)
+    except Exception:
+        return {}
+    out = {}
+    for key, entry in entries.items():
+        data = _fresh(entry, max_age)
+        if data is not None:
+            out[key] = data
+    return out
+
+def cached_for(key: str, inputs: Dict[str, Optional[str]]) -> Optional[dict]:
+    """Data cached under key if it was computed from exactly these input
+    versions (see datasets.input_versions), however old it is."""
+    try:
+        entry = backend().get(key)
+    except Exception:
+        return None
+    if not entry or entry.get('inputs') != inputs or 'data' not in entry:
+        return None
+    return entry['data']
+
+def version(key: str) -> Optional[str]:
+    """Content version of the data cached under key, or None if nothing is."""
+    try:
+        entry = backend().get(key)
+    except Exception:
+        return None
+    if not entry or 'data' not in entry:
+        return None
+    return entry.get('version') or _version(entry['data'])
+
+def _encode(data) -> str:
+    # Byte for byte what jsonify sends, less its trailing newline
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+def _version(data, text: Optional[str] = None) -> str:
+    return hashlib.sha1((text or _encode(data)).encode()).hexdigest()[:16]
+
+def stale_json(key: str) -> Optional[dict]:
+    """Cached data regardless of age, for when the upstream is unavailable."""
+    try:
+        entry = backend().get(key)
+    except Exception:
+        return None
+    return entry.get('data') if entry else None
+
+def decode_series(cached: Optional[dict], key: str) -> List[Tuple[datetime, float]]:
+    """Decode a cached [[iso_date, value], ...] list back into tuples."""
+    out: List[Tuple[datetime, float]] = []
+    if not cached or key not in cached:
+        return out
+    for d, v in cached[key]:
+        try:
+            out.append((datetime.fromisoformat(d), float(v)))
+        except Exception:
+            continue
+    return out
+
+def write_cache(key: str, data: dict, keep_for: Optional[timedelta] = None,
+                inputs: Optional[Dict[str, Optional[str]]] = None):
+    """Store data under key. Entries are kept for stale fallbacks until
+    evicted, or until keep_for has passed if given. Pass the input versions
+    a derived payload was computed from to have cached_for serve it."""
+    write_many({key: data}, keep_for, inputs)
+
+def write_many(items: Dict[str, dict], keep_for: Optional[timedelta] = None,
+               inputs: Optional[Dict[str, Optional[str]]] = None):
+    fetched_at = datetime.utcnow().isoformat()
+    entries = {key: _entry(data, fetched_at, inputs) for key, data in items.items()}
+    try:
+        backend().set_many(entries, ttl=keep_for.total_seconds() if keep_for is not None else None)
+    except Exception:
+        pass
+
+def _entry(data: dict, fetched_at: str, inputs: Optional[Dict[str, Optional[str]]],
+           text: Optional[str] = None) -> dict:
+    entry = {'fetched_at': fetched_at, 'data': data, 'version': _version(data, text)}
+    if inputs is not None:
+        entry['inputs'] = inputs
+    return entry
+
+# --------------------------------------------------------------------------- #
+# Pre-encoded responses
+# --------------------------------------------------------------------------- #
+
+def _response_record(entry: dict, text: Optional[str] = None) -> bytes:
+    """The '<key>.response' bytes for a cache entry."""
+    body = (text or _encode(entry['data'])).encode() + b'\n'
+    header = {
+        'fetched_at': entry.get('fetched_at'),
+        'inputs': entry.get('inputs'),
+        'etag': entry.get('version') or _version(entry['data']),
+        'length': len(body),
+    }
+    compressed = gzip.compress(body, 6, mtime=0) if len(body) >= GZIP_MIN_BYTES else b''
+    return json.dumps(header).encode() + b'\n' + body + compressed
+
+def _record_header(record: bytes) -> Optional[dict]:
+    try:
+        return json.loads(record[:record.index(b'\n')])
+    except ValueError:
+        return None
+
+def _current(meta: dict, max_age: Optional[timedelta], inputs: Optional[Dict[str, Optional[str]]]) -> bool:
+    """Whether an entry or record header is what cached_json(key, max_age)
+    or, given inputs, cached_for(key, inputs) would serve."""
+    if inputs is not None:
+        return meta.get('inputs') == inputs
+    return _is_fresh(meta.get('fetched_at'), max_age)
+
+def _serve(record: bytes, header: dict) -> Response:
+    """Response to the current request from a '<key>.response' record."""
+    start = record.index(b'\n') + 1
+    end = start + header['length']
+    etag = header['etag']
+    compressed = end < len(record)
+    if compressed and request.accept_encodings['gzip']:
+        resp = Response(record[end:], mimetype='application/json')
+        resp.headers['Content-Encoding'] = 'gzip'
+        etag += '-gz'
+    else:
+        resp = Response(record[start:end], mimetype='application/json')
+    if compressed:
+        resp.vary.add('Accept-Encoding')
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+def cached_response(key: str, max_age: Optional[timedelta] = None,
+                    inputs: Optional[Dict[str, Optional[str]]] = None) -> Optional[Response]:
+    """jsonify(cached_json(key, max_age)), or with inputs given
+    jsonify(cached_for(key, inputs)), served from the stored response bytes.
+
+    An entry cached without them gets them now, so only the first hit on it
+    encodes anything.
+    """
+    try:
+        record = backend().get_raw(key + RESPONSE_SUFFIX)
+        header = _record_header(record) if record else None
+        if header and _current(header, max_age, inputs):
+            return _serve(record, header)
+        entry = backend().get(key)
+    except Exception:
+        return None
+    if not entry or 'data' not in entry or not _current(entry, max_age, inputs):
+        return None
+    record = _response_record(entry)
+    try:
+        backend().set_raw(key + RESPONSE_SUFFIX, record)
+    except Exception:
+        pass
+    return _serve(record, _record_header(record))
+
+def write_response(key: str, data: dict, inputs: Optional[Dict[str, Optional[str]]] = None) -> Response:
+    """write_cache(key, data, inputs=inputs) plus the response bytes for
+    cached_response; returns the response, encoded only the once."""
+    text = _encode(data)
+    entry = _entry(data, datetime.utcnow().isoformat(), inputs, text)
+    record = _response_record(entry, text)
+    try:
+        backend().set_many({key: entry})
+        backend().set_raw(key + RESPONSE_SUFFIX, record)
+    except Exception:
+        pass
+    return _serve(record, _record_header(record))
+
+def cache_and_respond(key: str, payload: dict, inputs: Optional[Dict[str, Optional[str]]] = None,
+                      respond: Optional[Callable[[dict], Any]] = None):
+    """Cache and return a freshly computed payload, as JSON (write_response)
+    or encoded by `respond`.
+
+    If the request's upstream budget ran out while computing it, some inputs
+    may be missing: serve the last complete payload instead, or failing that
+    return this one flagged as partial without caching it.
+    """
+    if deadline.exhausted():
+        stale = stale_json(key)
+        if stale:
+            return (respond or jsonify)(stale)
+        return (respond or jsonify)(dict(payload, partial=True))
+    if respond is None:
+        return write_response(key, payload, inputs=inputs)
+    write_cache(key, payload, inputs=inputs)
+    return respond(payload)
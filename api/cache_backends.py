@@ -0,0 +1,518 @@
+"""Storage backends behind cache.py.
+
+Every backend maps a string key to a JSON-serialisable entry and supports
+the same small interface: batch get/set, delete, an optional per-entry TTL
+after which the entry is gone, and a bound on the number of entries kept
+(least recently used goes first). The *_raw methods store bytes instead,
+handed back exactly as given without any decoding.
+
+    memory              this process only; fastest, lost on cold start
+    file                one JSON file per key under a directory
+    sqlite              one SQLite file in WAL mode, shared by every
+                        worker on the host
+    redis://host:port/0 any Redis-protocol server, shared by every instance
+
+:func:`from_url` builds one from the BITVIZ_CACHE setting.
+"""
+import json
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import unquote, urlparse
+
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class CacheBackend:
+    name = 'base'
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Entries for the keys that are present and unexpired."""
+        raise NotImplementedError
+
+    def set_many(self, entries: Dict[str, dict], ttl: Optional[float] = None):
+        """Store entries, each expiring after ttl seconds (None: never)."""
+        raise NotImplementedError
+
+    def get_raw_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Values stored with set_raw_many, for the keys present and unexpired."""
+        raise NotImplementedError
+
+    def set_raw_many(self, values: Dict[str, bytes], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, entry: dict, ttl: Optional[float] = None):
+        self.set_many({key: entry}, ttl)
+
+    def get_raw(self, key: str) -> Optional[bytes]:
+        return self.get_raw_many([key]).get(key)
+
+    def set_raw(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self.set_raw_many({key: value}, ttl)
+
+
+def open_sqlite(path: Path) -> sqlite3.Connection:
+    """Autocommit connection to a WAL-mode SQLite file, creating its directory.
+    Connections aren't shared between threads; keep one per thread."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def _expires_at(ttl: Optional[float]) -> Optional[float]:
+    return None if ttl is None else time.time() + ttl
+
+
+class MemoryBackend(CacheBackend):
+    """LRU dict of encoded entries. Entries are stored as JSON text so a
+    caller mutating what it got back can't change the cached copy."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        return {k: json.loads(v) for k, v in self._lookup(keys).items()}
+
+    def get_raw_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        return self._lookup(keys)
+
+    def _lookup(self, keys: Iterable[str]) -> dict:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                item = self._entries.get(key)
+                if item is None:
+                    continue
+                expires_at, text = item
+                if expires_at is not None and expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = text
+        return found
+
+    def set_many(self, entries: Dict[str, dict], ttl: Optional[float] = None):
+        self._store({k: json.dumps(v) for k, v in entries.items()}, ttl)
+
+    def set_raw_many(self, values: Dict[str, bytes], ttl: Optional[float] = None):
+        self._store(dict(values), ttl)
+
+    def _store(self, encoded: dict, ttl: Optional[float]):
+        expires_at = _expires_at(ttl)
+        with self._lock:
+            for key, text in encoded.items():
+                self._entries[key] = (expires_at, text)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileBackend(CacheBackend):
+    """``<directory>/<key>.cache.json`` per entry.
+
+    A TTL is recorded in the entry itself as ``expires_at`` (epoch seconds).
+    Raw values go in ``<key>.cache.bin``, after their expiry as a
+    little-endian double (0: never). Eviction drops the least recently
+    written files once there are more than max_entries. Only files with
+    these suffixes are counted or deleted, since the directory (api/data by
+    default) also holds files that aren't the cache's.
+    """
+
+    name = 'file'
+    ENTRY_SUFFIX = '.cache.json'
+    RAW_SUFFIX = '.cache.bin'
+
+    def __init__(self, directory: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}{self.ENTRY_SUFFIX}'
+
+    def _raw_path(self, key: str) -> Path:
+        return self.directory / f'{key}{self.RAW_SUFFIX}'
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        now = time.time()
+        out = {}
+        for key in keys:
+            path = self._path(key)
+            try:
+                entry = json.loads(path.read_text())
+            except Exception:
+                continue
+            expires_at = entry.pop('expires_at', None) if isinstance(entry, dict) else None
+            if expires_at is not None and expires_at <= now:
+                self.delete(key)
+                continue
+            out[key] = entry
+        return out
+
+    def get_raw_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        now = time.time()
+        out = {}
+        for key in keys:
+            try:
+                blob = self._raw_path(key).read_bytes()
+                (expires_at,) = struct.unpack_from('<d', blob)
+            except (OSError, struct.error):
+                continue
+            if expires_at and expires_at <= now:
+                self.delete(key)
+                continue
+            out[key] = blob[8:]
+        return out
+
+    def set_many(self, entries: Dict[str, dict], ttl: Optional[float] = None):
+        expires_at = _expires_at(ttl)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for key, entry in entries.items():
+            if expires_at is not None:
+                entry = dict(entry, expires_at=expires_at)
+            self._replace(self._path(key), json.dumps(entry).encode())
+        self._evict()
+
+    def set_raw_many(self, values: Dict[str, bytes], ttl: Optional[float] = None):
+        header = struct.pack('<d', _expires_at(ttl) or 0.0)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for key, value in values.items():
+            self._replace(self._raw_path(key), header + value)
+        self._evict()
+
+    @staticmethod
+    def _replace(path: Path, data: bytes):
+        # Write then rename, so a concurrent reader never sees half a file
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def delete(self, key: str):
+        for path in (self._path(key), self._raw_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        files = [p for p in self.directory.iterdir()
+                 if p.name.endswith((self.ENTRY_SUFFIX, self.RAW_SUFFIX)) and not p.name.startswith('.')]
+        excess = len(files) - self.max_entries
+        if excess <= 0:
+            return
+        def mtime(p: Path) -> int:
+            try:
+                return p.stat().st_mtime_ns
+            except OSError:
+                return 0
+        for p in sorted(files, key=mtime)[:excess]:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+
+class SQLiteBackend(CacheBackend):
+    """One table in a single SQLite file, opened in WAL mode so readers in
+    other workers never block on a writer. Eviction is by last access."""
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            accessed_at REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute(self.SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at)')
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        return {k: json.loads(v) for k, v in self._select(keys)}
+
+    def get_raw_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        return {k: v if isinstance(v, bytes) else v.encode('utf-8') for k, v in self._select(keys)}
+
+    def _select(self, keys: Iterable[str]) -> list:
+        keys = list(keys)
+        if not keys:
+            return []
+        now = time.time()
+        conn = self._conn()
+        marks = ','.join('?' * len(keys))
+        rows = conn.execute(
+            f'SELECT key, value FROM cache_entries WHERE key IN ({marks}) '
+            f'AND (expires_at IS NULL OR expires_at > ?)',
+            (*keys, now),
+        ).fetchall()
+        if rows:
+            conn.execute(
+                f'UPDATE cache_entries SET accessed_at = ? WHERE key IN ({",".join("?" * len(rows))})',
+                (now, *(k for k, _ in rows)),
+            )
+        return rows
+
+    def set_many(self, entries: Dict[str, dict], ttl: Optional[float] = None):
+        self._insert([(k, json.dumps(v)) for k, v in entries.items()], ttl)
+
+    def set_raw_many(self, values: Dict[str, bytes], ttl: Optional[float] = None):
+        self._insert(list(values.items()), ttl)
+
+    def _insert(self, items: list, ttl: Optional[float]):
+        if not items:
+            return
+        now = time.time()
+        expires_at = _expires_at(ttl)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [(k, v, expires_at, now) for k, v in items],
+            )
+            conn.execute('DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                ' SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespConnection:
+    """Just enough of the Redis serialization protocol (RESP2) for the cache:
+    send commands as arrays of bulk strings, read back simple strings,
+    errors, integers, bulk strings and arrays."""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for a in args:
+            if not isinstance(a, bytes):
+                a = str(a).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(a), a))
+        return b''.join(out)
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            return RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            return data[:-2]
+        if kind == b'*':
+            n = int(rest)
+            if n < 0:
+                return None
+            return [self._read() for _ in range(n)]
+        raise ConnectionError(f'unexpected reply: {line[:40]!r}')
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Send every command in one write, then read the replies in order."""
+        self.sock.sendall(b''.join(self._encode(c) for c in commands))
+        replies = [self._read() for _ in commands]
+        for r in replies:
+            if isinstance(r, RespError):
+                raise r
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(CacheBackend):
+    """Entries as plain string keys (``<prefix><key>``), TTLs as native
+    expiries, and a sorted set of last-access times used to trim the
+    keyspace to max_entries. One connection per process, guarded by a lock.
+
+    A server that can't be reached is treated as an empty cache and not
+    retried for RETRY_AFTER_S, so an outage costs one connect timeout rather
+    than one per lookup.
+    """
+
+    name = 'redis'
+    RETRY_AFTER_S = 30.0
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, prefix: str = 'bitviz:',
+                 max_entries: int = DEFAULT_MAX_ENTRIES, timeout: float = 1.0):
+        super().__init__(max_entries)
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self.prefix = prefix
+        self.index_key = f'{prefix}__lru__'
+        self.timeout = timeout
+        self._conn: Optional[RespConnection] = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    def _call(self, commands: List[tuple]) -> Optional[list]:
+        """Run a pipeline, or return None if the server is unavailable."""
+        with self._lock:
+            if time.monotonic() < self._down_until:
+                return None
+            try:
+                if self._conn is None:
+                    self._conn = RespConnection(self.host, self.port, self.db, self.password, self.timeout)
+                return self._conn.pipeline(commands)
+            except (OSError, ConnectionError, RespError, ValueError):
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self._down_until = time.monotonic() + self.RETRY_AFTER_S
+                return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, dict]:
+        out = {}
+        for key, raw in self.get_raw_many(keys).items():
+            try:
+                out[key] = json.loads(raw)
+            except ValueError:
+                continue
+        return out
+
+    def get_raw_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        replies = self._call([('MGET', *(self.prefix + k for k in keys))])
+        if not replies:
+            return {}
+        out = {key: raw for key, raw in zip(keys, replies[0]) if raw is not None}
+        if out:
+            now = time.time()
+            touch = []
+            for key in out:
+                touch += [now, key]
+            self._call([('ZADD', self.index_key, *touch)])
+        return out
+
+    def set_many(self, entries: Dict[str, dict], ttl: Optional[float] = None):
+        self.set_raw_many({k: json.dumps(v) for k, v in entries.items()}, ttl)
+
+    def set_raw_many(self, values: Dict[str, bytes], ttl: Optional[float] = None):
+        if not values:
+            return
+        now = time.time()
+        commands = []
+        touch = []
+        for key, value in values.items():
+            cmd = ('SET', self.prefix + key, value)
+            if ttl is not None:
+                cmd += ('PX', max(1, int(ttl * 1000)))
+            commands.append(cmd)
+            touch += [now, key]
+        commands.append(('ZADD', self.index_key, *touch))
+        commands.append(('ZCARD', self.index_key))
+        replies = self._call(commands)
+        if replies and replies[-1] > self.max_entries:
+            self._evict(replies[-1] - self.max_entries)
+
+    def _evict(self, excess: int):
+        replies = self._call([('ZRANGE', self.index_key, 0, excess - 1)])
+        if not replies or not replies[0]:
+            return
+        victims = [k.decode('utf-8') for k in replies[0]]
+        self._call([
+            ('DEL', *(self.prefix + k for k in victims)),
+            ('ZREM', self.index_key, *victims),
+        ])
+
+    def delete(self, key: str):
+        self._call([('DEL', self.prefix + key), ('ZREM', self.index_key, key)])
+
+
+def from_url(url: str, data_dir: Path, max_entries: int = DEFAULT_MAX_ENTRIES) -> CacheBackend:
+    """Backend for a BITVIZ_CACHE value: 'memory', 'file', 'sqlite',
+    'sqlite:///abs/path.db' or 'redis://[:password@]host[:port][/db]'."""
+    if '://' not in url:
+        url += '://'
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme == 'memory':
+        return MemoryBackend(max_entries)
+    if scheme == 'file':
+        return FileBackend(Path(parsed.path) if parsed.path else data_dir, max_entries)
+    if scheme == 'sqlite':
+        return SQLiteBackend(Path(parsed.path) if parsed.path else data_dir / 'cache.sqlite3', max_entries)
+    if scheme == 'redis':
+        db = parsed.path.strip('/')
+        return RedisBackend(
+            host=parsed.hostname or '127.0.0.1',
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+            max_entries=max_entries,
+        )
+    raise ValueError(f'unknown cache backend: {url!r}')
@@ -0,0 +1,123 @@
+"""BTC against other assets — /api/correlations.
+
+Every series is put on one monthly grid (the last observation of each
+month), turned into log returns, and compared over trailing windows with
+series.rolling_corr_beta, which works from prefix sums instead of looping
+over each window. The daily BTC and FX series and the monthly FTSE, gold
+and money-supply series are the stored ones other pages already load.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from flask import jsonify, request
+
+import derived
+from cache import cached_response, write_response
+from datasets import input_versions
+from series import rolling_corr_beta
+
+# (key, dataset, label); BTC first, everything else is compared with it
+CORRELATION_ASSETS = [
+    ('btc', 'btc_history_gbp', 'BTC (GBP)'),
+    ('ftse', 'ftse_monthly', 'FTSE 100'),
+    ('gold', 'gold_monthly_gbp', 'Gold (GBP/oz)'),
+    ('gbp_per_usd', 'fx_gbp_per_usd_daily', 'GBP per USD'),
+    ('us_m2', 'fred_m2sl', 'US M2'),
+    ('ez_m3', 'ecb_m3', 'Eurozone M3'),
+    ('uk_m4', 'boe_m4', 'UK M4'),
+]
+DEFAULT_WINDOW = 24
+MIN_WINDOW, MAX_WINDOW = 6, 120
+
+Month = Tuple[int, int]
+
+
+def _log_returns(values: List[Optional[float]]) -> List[Optional[float]]:
+    """Month-on-month log returns, aligned with values (None for the first
+    month and around gaps)."""
+    out: List[Optional[float]] = [None]
+    for prev, cur in zip(values, values[1:]):
+        out.append(math.log(cur / prev) if prev and cur and prev > 0 and cur > 0 else None)
+    return out
+
+
+def _compute_correlations(window: int) -> dict:
+    by_month = {key: derived.source(name).month_ends() for key, name, _ in CORRELATION_ASSETS}
+    if not by_month['btc']:
+        return {'error': 'BTC history unavailable'}
+    first, last = min(by_month['btc']), max(by_month['btc'])
+    grid: List[Month] = []
+    y, m = first
+    while (y, m) <= last:
+        grid.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+    keys = [key for key, _, _ in CORRELATION_ASSETS]
+    returns = {key: _log_returns([by_month[key].get(ym) for ym in grid]) for key in keys}
+
+    # Latest-window correlation for every pair, and BTC's rolling series against each
+    matrix: List[List[Optional[float]]] = [[None] * len(keys) for _ in keys]
+    rolling: Dict[str, dict] = {}
+    for a, ka in enumerate(keys):
+        matrix[a][a] = 1.0
+        for b in range(a + 1, len(keys)):
+            kb = keys[b]
+            corr, beta = rolling_corr_beta(returns[ka], returns[kb], window)
+            matrix[a][b] = matrix[b][a] = round(corr[-1], 3) if corr[-1] is not None else None
+            if ka == 'btc':
+                rolling[kb] = {
+                    'corr': [round(v, 3) if v is not None else None for v in corr],
+                    # BTC's monthly log return per unit of this asset's
+                    'beta': [round(v, 3) if v is not None else None for v in beta],
+                }
+
+    return {
+        'window_months': window,
+        'assets': [
+            {'key': key, 'label': label, 'months': sum(1 for ym in grid if ym in by_month[key])}
+            for key, _, label in CORRELATION_ASSETS
+        ],
+        'matrix': {'keys': keys, 'corr': matrix},
+        'btc': {
+            key: {'corr': series['corr'][-1], 'beta': series['beta'][-1]}
+            for key, series in rolling.items()
+        },
+        'series': {
+            'months': [f'{y:04d}-{m:02d}' for y, m in grid],
+            **rolling,
+        },
+        'as_of': f'{last[0]:04d}-{last[1]:02d}',
+    }
+
+
+def api_correlations():
+    """Rolling correlation and beta of BTC's monthly returns against FTSE,
+    gold, GBP/USD and money supply, plus the pairwise matrix for the latest
+    window.
+
+    Query params:
+        window      months per window, 6..120 (default 24)
+
+    Cached per window until one of the input series changes.
+    """
+    try:
+        try:
+            window = int(request.args.get('window', DEFAULT_WINDOW))
+            if not MIN_WINDOW <= window <= MAX_WINDOW:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': f'window must be {MIN_WINDOW}..{MAX_WINDOW} months'}), 400
+
+        # The default window is the registered (warmed) dataset; others sit beside it
+        base_key = 'correlations_cache'
+        cache_key = base_key if window == DEFAULT_WINDOW else f'correlations_{window}m_cache'
+        inputs = input_versions(base_key)
+        cached = cached_response(cache_key, inputs=inputs)
+        if cached:
+            return cached
+        payload = _compute_correlations(window)
+        if 'error' in payload:
+            return jsonify(payload), 502
+        return write_response(cache_key, payload, inputs=inputs)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,256 @@
+"""Cycle dashboard — /cycles."""
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from flask import jsonify, request
+
+import derived
+import formats
+from cache import cached_for, cached_response, write_cache
+from datasets import input_versions
+from series import DAY_MS, downsample_xy, to_ms
+
+# Bitcoin halving dates. Block-number based; calendar dates verified vs known
+# blocks 210000 / 420000 / 630000 / 840000. The fifth entry is the projected
+# next halving derived from /api/onchain-supply at request time.
+HALVING_DATES = [
+    ('Cycle 1', datetime(2012, 11, 28)),  # block 210,000
+    ('Cycle 2', datetime(2016, 7,  9)),   # block 420,000
+    ('Cycle 3', datetime(2020, 5,  11)),  # block 630,000
+    ('Cycle 4', datetime(2024, 4,  19)),  # block 840,000
+]
+
+# Named ?anchor= values; anything else is a comma-separated list of dates
+CYCLE_ANCHORS = ('halving', 'low', 'high')
+MAX_CUSTOM_ANCHORS = 12
+
+def _cycle_anchors(src: 'derived.Source', anchor: str) -> List[Tuple[str, datetime]]:
+    """(label, date) each cycle of the overlay starts from: the halvings,
+    the lowest / highest close between consecutive halvings, or the given
+    YYYY-MM-DD dates. Raises ValueError for anything else."""
+    if anchor == 'halving':
+        return HALVING_DATES
+    if anchor in ('low', 'high'):
+        def compute():
+            values = src.values
+            pick = min if anchor == 'low' else max
+            out = []
+            for i, (label, halving_dt) in enumerate(HALVING_DATES):
+                start = src.first_on_or_after(halving_dt)
+                stop = src.first_on_or_after(HALVING_DATES[i + 1][1]) if i + 1 < len(HALVING_DATES) else None
+                stop = len(values) if stop is None else stop
+                if start is None or start >= stop:
+                    continue
+                out.append((label, src.date(pick(range(start, stop), key=values.__getitem__))))
+            return out
+        return src.memo(('cycle_anchors', anchor), compute)
+    dates = sorted(datetime.strptime(d.strip(), '%Y-%m-%d') for d in anchor.split(','))
+    if len(dates) > MAX_CUSTOM_ANCHORS:
+        raise ValueError(f'at most {MAX_CUSTOM_ANCHORS} anchor dates')
+    return [(d.strftime('%Y-%m-%d'), d) for d in dates]
+
+def _cycle_overlay(src: 'derived.Source', anchors: List[Tuple[str, datetime]]) -> List[dict]:
+    """Each cycle as [day offset, multiple of the anchor-day price] from
+    its anchor up to and including the next one. Each cycle is one slice of
+    the shared arrays, found by bisecting the timestamps."""
+    ts_ms = src.series.ts_ms
+    values = src.values
+    out = []
+    for i, (label, anchor_dt) in enumerate(anchors):
+        # Anchor price: first data point on or after the anchor date
+        start = src.first_on_or_after(anchor_dt)
+        start_price = values[start] if start is not None else None
+        if not start_price:
+            continue
+        stop = src.first_after(anchors[i + 1][1]) if i + 1 < len(anchors) else len(values)
+        anchor_ms = to_ms(anchor_dt)
+        cycle_pts = [((t - anchor_ms) // DAY_MS, v / start_price)
+                     for t, v in zip(ts_ms[start:stop], values[start:stop])]
+        cycle_pts = downsample_xy(cycle_pts, 400)
+
+        # The halving that opened this anchor's epoch
+        halving_dt = next((h for _, h in reversed(HALVING_DATES) if h <= anchor_dt), None)
+        halving_idx = src.first_on_or_after(halving_dt) if halving_dt else None
+        out.append({
+            'label': label,
+            'anchor_date': anchor_dt.strftime('%Y-%m-%d'),
+            'anchor_price_usd': round(start_price, 2),
+            'halving_date': halving_dt.strftime('%Y-%m-%d') if halving_dt else None,
+            'halving_price_usd': round(values[halving_idx], 2) if halving_idx is not None else None,
+            'is_current': i == len(anchors) - 1,
+            'series': [[round(x, 1), round(y, 4)] for x, y in cycle_pts],
+        })
+    return out
+
+def api_cycle_data():
+    """Cycle dashboard payload: cycle overlay, Pi cycle, 200-week SMA,
+    Mayer multiple, current cycle position.
+
+    ?anchor= picks what the overlay's cycles are aligned on: 'halving' (the
+    default), 'low' or 'high' (each halving epoch's lowest / highest close),
+    or a comma-separated list of YYYY-MM-DD dates. The rest of the payload is
+    the same for every anchor.
+
+    ?format=columnar|binary picks a compact encoding (see formats.py).
+    """
+    try:
+        fmt = formats.requested()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        anchor = (request.args.get('anchor') or 'halving').strip().lower()
+        # Recomputed only when the price history changes
+        cache_key = 'cycle_data_cache'
+        inputs = input_versions(cache_key)
+        if anchor == 'halving' and fmt[0] == 'json':
+            # The default view goes out exactly as cached
+            cached = cached_response(cache_key, inputs=inputs)
+            if cached:
+                return cached
+        payload = cached_for(cache_key, inputs)
+        if not payload:
+            payload = _compute_cycle_data()
+            if 'error' in payload:
+                return jsonify(payload), 502
+            write_cache(cache_key, payload, inputs=inputs)
+        if anchor != 'halving':
+            src = derived.source('btc_daily_usd_all')
+            try:
+                anchors = _cycle_anchors(src, anchor)
+            except ValueError:
+                return jsonify({'error': 'anchor must be halving, low, high or YYYY-MM-DD[,YYYY-MM-DD...]'}), 400
+            if anchor in CYCLE_ANCHORS:
+                cycles = src.memo(('cycle_overlay', anchor), lambda: _cycle_overlay(src, anchors))
+            else:
+                cycles = _cycle_overlay(src, anchors)
+            payload = dict(payload, anchor=anchor, cycles=cycles)
+        return formats.respond(payload, fmt)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _compute_cycle_data() -> dict:
+    """Everything but non-halving overlays; cached against the price history."""
+    src = derived.source('btc_daily_usd_all')
+    n = len(src.series)
+    if not n:
+        return {'error': 'history unavailable'}
+
+    prices_sorted = src.values
+    last_date, last_price = src.date(-1), prices_sorted[-1]
+
+    def day(i: int) -> str:
+        return src.date(i).strftime('%Y-%m-%d')
+
+    def sampled(start: int) -> List[int]:
+        """Indices start..n-1, at most ~800 of them plus the last."""
+        if n - start <= 800:
+            return list(range(start, n))
+        return list(range(start, n, max(1, (n - start) // 800))) + [n - 1]
+
+    # ---------- Halving overlay ----------
+    cycles_out = _cycle_overlay(src, HALVING_DATES)
+
+    # ---------- Pi cycle (over last ~6 years, daily) ----------
+    recent_cutoff = last_date - timedelta(days=6 * 365 + 30)
+    # Index of first point in the recent window
+    first_recent_idx = src.first_on_or_after(recent_cutoff) or 0
+
+    # SMAs over the full history, shared with other endpoints, then
+    # trimmed to the recent window for the response
+    ma111 = src.sma(111)
+    ma350_x2 = [v * 2 if v is not None else None for v in src.sma(350)]
+
+    # Downsample the Pi cycle arrays (max ~800 points)
+    pi_idx = sampled(first_recent_idx)
+    pi_payload = {
+        'dates':      [day(i) for i in pi_idx],
+        'price':      [round(prices_sorted[i], 2) for i in pi_idx],
+        'ma_111':     [round(ma111[i], 2) if ma111[i] is not None else None for i in pi_idx],
+        'ma_350_x2':  [round(ma350_x2[i], 2) if ma350_x2[i] is not None else None for i in pi_idx],
+    }
+
+    # Latest Pi cycle status
+    latest_111 = next((v for v in reversed(ma111) if v is not None), None)
+    latest_350x2 = next((v for v in reversed(ma350_x2) if v is not None), None)
+    if latest_111 is not None and latest_350x2 is not None:
+        pi_status = {
+            'ma_111': round(latest_111, 2),
+            'ma_350_x2': round(latest_350x2, 2),
+            'crossed_above': latest_111 > latest_350x2,
+            'gap_pct': round(((latest_111 / latest_350x2) - 1.0) * 100.0, 2),
+        }
+    else:
+        pi_status = None
+
+    # ---------- 200-week SMA (=1400-day SMA) ----------
+    # Need 1400 days of context. Use the full series for the SMA, then trim to recent.
+    ma_200w_full = src.sma(1400)
+    # Trim to recent ~4 years
+    wma_idx = sampled(src.first_on_or_after(last_date - timedelta(days=4 * 365 + 30)))
+    wma_payload = {
+        'dates': [day(i) for i in wma_idx],
+        'price': [round(prices_sorted[i], 2) for i in wma_idx],
+        'ma_200w': [round(ma_200w_full[i], 2) if ma_200w_full[i] is not None else None for i in wma_idx],
+    }
+    latest_200w = next((v for v in reversed(ma_200w_full) if v is not None), None)
+    wma_status = None
+    if latest_200w is not None:
+        wma_status = {
+            'price': round(last_price, 2),
+            'ma_200w': round(latest_200w, 2),
+            'ratio': round(last_price / latest_200w, 3),
+            'distance_pct': round(((last_price / latest_200w) - 1.0) * 100.0, 2),
+        }
+
+    # ---------- Mayer multiple (200-day SMA based) ----------
+    ma200_full = src.sma(200)
+    latest_ma200 = next((v for v in reversed(ma200_full) if v is not None), None)
+    mayer = round(last_price / latest_ma200, 3) if latest_ma200 else None
+
+    # ---------- Current cycle stats ----------
+    current_halving = HALVING_DATES[-1][1]
+    days_since_halving = (last_date - current_halving).days
+    # Project the next halving 4 years out (refined below if /api/onchain-supply tells us better)
+    next_halving_est = current_halving + timedelta(days=4 * 365 + 1)
+    days_to_next_halving = (next_halving_est - last_date).days
+
+    # Find halving-day price for current cycle
+    current_idx = src.first_on_or_after(current_halving)
+    current_cycle_start_price = prices_sorted[current_idx] if current_idx is not None else None
+    pct_since_halving = ((last_price / current_cycle_start_price) - 1.0) * 100.0 if current_cycle_start_price else None
+
+    # Historical cycle peak comparisons (raw % gain at the same day_offset)
+    historical_at_same_day = []
+    for entry in cycles_out:
+        if entry.get('is_current'):
+            continue
+        xs = entry.get('series', [])
+        same = next((y for x, y in xs if x >= days_since_halving), None)
+        historical_at_same_day.append({
+            'label': entry['label'],
+            'multiple': round(same, 2) if same else None,
+        })
+
+    current_cycle = {
+        'halving_date': current_halving.strftime('%Y-%m-%d'),
+        'next_halving_estimate': next_halving_est.strftime('%Y-%m-%d'),
+        'days_since_halving': days_since_halving,
+        'days_to_next_halving': days_to_next_halving,
+        'cycle_progress_pct': round(min(100.0, days_since_halving / (4 * 365.25) * 100.0), 1),
+        'current_price_usd': round(last_price, 2),
+        'cycle_start_price_usd': round(current_cycle_start_price, 2) if current_cycle_start_price else None,
+        'pct_gain_since_halving': round(pct_since_halving, 1) if pct_since_halving is not None else None,
+        'historical_at_same_day': historical_at_same_day,
+    }
+
+    payload = {
+        'anchor': 'halving',
+        'cycles': cycles_out,
+        'pi_cycle': {'series': pi_payload, 'status': pi_status},
+        'two_hundred_wma': {'series': wma_payload, 'status': wma_status},
+        'mayer_multiple': mayer,
+        'current_cycle': current_cycle,
+        'as_of': last_date.strftime('%Y-%m-%d'),
+        'source': 'blockchain.info market-price',
+    }
+    return payload
@@ -1,89 +1,196 @@
-import requests
+"""Append missing daily BTC/GBP closes to bitcoin_historical.csv.
+
+Run daily by .github/workflows/update-bitcoin-data.yml. Only the tail of the
+CSV is read to find the last stored date; CoinGecko is asked for just the
+days after it, and the new rows are appended in a single write. Standard
+library plus `requests` (via api/upstream.py) only.
+"""
+import csv
+import io
+import os
+import sys
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from datetime import datetime, timedelta
-import time
-import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# Share the app's CoinGecko quota scheduler (api/upstream.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import upstream
+
+CSV_PATH = Path(__file__).resolve().parent / 'bitcoin_historical.csv'
+COLUMNS = ['Date', 'Close']
+FIRST_DATE = date(2014, 9, 17)  # start of the stored history
+TAIL_BYTES = 4096
+# CoinGecko's free API serves at most a year of daily prices
+MAX_FETCH_DAYS = 365
+
+
+def read_tail(csv_path: Path) -> Tuple[List[str], Optional[date], Optional[float], bool]:
+    """Header, last date, last close, and whether the file ends in a newline,
+    reading only the header line and the last few KB."""
+    with open(csv_path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]), [])
+        body_start = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(body_start, size - TAIL_BYTES))
+        tail = f.read()
+    if 'Date' not in header or 'Close' not in header:
+        raise ValueError(f'unexpected CSV header: {header}')
+    date_idx, close_idx = header.index('Date'), header.index('Close')
+    # The first line of the tail may be cut mid-row; walking backwards means
+    # we stop at the last complete one anyway.
+    for line in reversed(tail.decode('utf-8', errors='replace').splitlines()):
+        row = next(csv.reader([line]), [])
+        try:
+            return header, date.fromisoformat(row[date_idx]), float(row[close_idx]), tail.endswith(b'\n')
+        except (IndexError, ValueError):
+            continue
+    return header, None, None, tail.endswith(b'\n') or size == body_start
+
+
+def fetch_daily_closes(days: int) -> Dict[date, float]:
+    """{utc_date: price} for the last `days` days from CoinGecko. The first
+    point seen for a date wins, so a trailing intraday point never replaces
+    that day's 00:00 UTC close."""
+    r = upstream.get(
+        'coingecko',
+        'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
+        params={'vs_currency': 'gbp', 'days': str(days), 'interval': 'daily'},
+        headers={'User-Agent': 'Mozilla/5.0'},
+        timeout=30,
+        priority=upstream.BACKGROUND,
+    )
+    r.raise_for_status()
+    out: Dict[date, float] = {}
+    for pt in r.json().get('prices', []):
+        try:
+            d = datetime.utcfromtimestamp(int(pt[0]) / 1000).date()
+            out.setdefault(d, float(pt[1]))
+        except (TypeError, ValueError, IndexError):
+            continue
+    return out
+
+
+class GapTooWide(ValueError):
+    """The fetched window doesn't reach back to the last stored day."""
+
+
+def gap_filled_rows(prices: Dict[date, float], after: date, until: date,
+                    carry: Optional[float]) -> Tuple[List[Tuple[date, float]], int]:
+    """One pass over every day in (after, until), forward-filling days the
+    upstream skipped from the previous close. Returns (rows, filled_count).
+
+    Only gaps inside the fetched window are filled: if `prices` starts later
+    than the day after `after`, the days in between are unknown rather than
+    flat, and GapTooWide is raised instead of appending made-up closes.
+    """
+    if not prices:
+        return [], 0
+    first, last = min(prices), max(prices)
+    if first > after + timedelta(days=1):
+        raise GapTooWide(f'fetched prices start {first}, but the CSV ends {after}')
+    rows: List[Tuple[date, float]] = []
+    filled = 0
+    d = after + timedelta(days=1)
+    while d < until:
+        price = prices.get(d)
+        if price is None:
+            if d > last:
+                break  # nothing newer to fill towards; left for the next run
+            price = carry
+            filled += 1
+        if price is not None:
+            rows.append((d, price))
+            carry = price
+        d += timedelta(days=1)
+    return rows, filled
+
+
+def append_rows(csv_path: Path, header: List[str], rows: List[Tuple[date, float]], needs_newline: bool):
+    """Append rows with one O_APPEND write; on a short write the file is
+    truncated back so readers never see a partial row."""
+    buf = io.StringIO()
+    if needs_newline:
+        buf.write('\n')
+    writer = csv.writer(buf, lineterminator='\n')
+    date_idx, close_idx = header.index('Date'), header.index('Close')
+    for d, price in rows:
+        row = [''] * len(header)
+        row[date_idx] = d.isoformat()
+        row[close_idx] = repr(price)
+        writer.writerow(row)
+    data = buf.getvalue().encode('utf-8')
+
+    fd = os.open(csv_path, os.O_WRONLY | os.O_APPEND)
+    try:
+        size_before = os.fstat(fd).st_size
+        written = os.write(fd, data)
+        if written != len(data):
+            os.ftruncate(fd, size_before)
+            raise IOError(f'short write ({written}/{len(data)} bytes); append rolled back')
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def compact_csv(csv_path: Path):
+    """Rewrite the CSV as Date,Close with one row per date, streaming, and
+    swap it in atomically. Only needed once for files written by the old
+    pandas updater (extra 'Unnamed: 0' column, duplicated dates)."""
+    tmp_path = csv_path.with_suffix('.csv.tmp')
+    last_date = None
+    with open(csv_path, newline='') as src, open(tmp_path, 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.writer(dst, lineterminator='\n')
+        writer.writerow(COLUMNS)
+        for row in reader:
+            d = row.get('Date')
+            if not d or d == last_date:
+                continue
+            writer.writerow([d, row.get('Close')])
+            last_date = d
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, csv_path)
+
 
 def fetch_historical_data():
-    # CoinGecko API endpoint for Bitcoin historical data
-    url = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"
-    
-    # Parameters for the API request - get last year of data
-    params = {
-        'vs_currency': 'gbp',
-        'days': '365',  # Get last year of data
-        'interval': 'daily'
-    }
-    
-    # Add headers to mimic a browser request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
     try:
-        # Read existing CSV data
-        cwd = Path(__file__).resolve().parent
-        csv_path = cwd / 'bitcoin_historical.csv'
-        
-        if csv_path.exists():
-            df_historical = pd.read_csv(csv_path)
-            df_historical['Date'] = pd.to_datetime(df_historical['Date'])
-            df_historical = df_historical.sort_values('Date')
-            last_historical_date = df_historical['Date'].max()
-            print(f"Found existing data up to: {last_historical_date}")
-        else:
-            df_historical = pd.DataFrame(columns=['Date', 'Close'])
-            last_historical_date = datetime(2014, 9, 17)  # Bitcoin's early history
-            print("No existing data found, starting from:", last_historical_date)
-        
-        # Add a small delay to respect rate limits
-        time.sleep(1)
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Process the API data
-        api_prices = []
-        for timestamp, price in data['prices']:
-            date = datetime.fromtimestamp(timestamp / 1000)
-            api_prices.append([date, price])
-        
-        # Convert API data to DataFrame
-        df_recent = pd.DataFrame(api_prices, columns=['Date', 'Close'])
-        df_recent['Date'] = pd.to_datetime(df_recent['Date'])
-        df_recent = df_recent.sort_values('Date')
-        
-        print(f"Fetched recent data from {df_recent['Date'].min()} to {df_recent['Date'].max()}")
-        
-        # Merge historical and recent data
-        # Keep historical data up to the last historical date
-        df_historical = df_historical[df_historical['Date'] < last_historical_date]
-        
-        # Add recent data
-        df_combined = pd.concat([df_historical, df_recent])
-        
-        # Remove duplicates and sort
-        df_combined = df_combined.drop_duplicates(subset=['Date'], keep='last')
-        df_combined = df_combined.sort_values('Date')
-        
-        # Check for gaps in the data
-        date_range = pd.date_range(start=df_combined['Date'].min(), end=df_combined['Date'].max(), freq='D')
-        missing_dates = date_range.difference(df_combined['Date'])
-        
-        if not missing_dates.empty:
-            print(f"Found {len(missing_dates)} missing dates")
-            # Forward fill missing values
-            df_combined = df_combined.set_index('Date').reindex(date_range).fillna(method='ffill').reset_index()
-            df_combined = df_combined.rename(columns={'index': 'Date'})
-        
-        # Format dates to YYYY-MM-DD
-        df_combined['Date'] = df_combined['Date'].dt.strftime('%Y-%m-%d')
-        
-        # Save the combined data without index
-        df_combined.to_csv(csv_path, index=False)
-        print(f"Historical data updated successfully. Data range: {df_combined['Date'].min()} to {df_combined['Date'].max()}")
-        print(f"Total data points: {len(df_combined)}")
-        
+        if not CSV_PATH.exists():
+            with open(CSV_PATH, 'w', newline='') as f:
+                csv.writer(f, lineterminator='\n').writerow(COLUMNS)
+        header, last_date, last_close, ends_with_newline = read_tail(CSV_PATH)
+        if header != COLUMNS:
+            print(f"Compacting CSV (header was {header})")
+            compact_csv(CSV_PATH)
+            header, last_date, last_close, ends_with_newline = read_tail(CSV_PATH)
+
+        today = datetime.utcnow().date()
+        after = last_date or FIRST_DATE - timedelta(days=1)
+        missing = (today - after).days - 1
+        print(f"Existing data up to: {last_date or 'none'}; {max(missing, 0)} day(s) missing")
+        if missing <= 0:
+            print("Already up to date")
+            return
+        if missing + 1 > MAX_FETCH_DAYS:
+            # Rows are never rewritten, so filling this from the last close
+            # would store a flat line for good; backfill from a full source.
+            raise GapTooWide(f'{missing} day(s) missing, more than CoinGecko serves ({MAX_FETCH_DAYS})')
+
+        prices = fetch_daily_closes(min(missing + 1, MAX_FETCH_DAYS))
+        rows, filled = gap_filled_rows(prices, after, today, last_close)
+        if not rows:
+            print("No new data returned")
+            return
+        append_rows(CSV_PATH, header, rows, needs_newline=not ends_with_newline)
+        if filled:
+            print(f"Forward-filled {filled} missing date(s)")
+        print(f"Appended {len(rows)} row(s): {rows[0][0]} to {rows[-1][0]}")
+
+    except GapTooWide:
+        # Fail the run loudly rather than appending a fabricated stretch
+        raise
     except Exception as e:
         print(f"Error fetching data: {e}")
 
@@ -0,0 +1,307 @@
+"""Registry of every cached upstream dataset and derived payload.
+
+Each :class:`Dataset` names the cache key or stored series its data lives
+under, how long it stays fresh, the datasets it is computed from, and how to
+refresh it: an API path (served through the app, so its route deadline and
+caching apply as usual) or a 'module.function' loader. Sections read their
+TTLs from here with :func:`ttl` rather than hard-coding them.
+
+Derived payloads declared without a TTL are cached against the content
+versions of their inputs instead (:func:`input_versions`, cache.cached_for):
+they are recomputed when an input changes, and only then.
+
+:func:`warm` refreshes, inputs first, every dataset that expires within a
+lead time. Refreshing is done by calling the normal loaders inside
+cache.refresh_ahead, so they see the data as stale and fetch it again. It
+runs from /api/warm, meant to be hit by a scheduler, or every
+BITVIZ_WARM_EVERY seconds from a thread in long-running processes.
+/api/warm needs 'Authorization: Bearer <CRON_SECRET>', and is refused
+outright when CRON_SECRET isn't set.
+
+Warming only helps requests that share the warmed store, i.e. the same
+instance, or every instance when BITVIZ_CACHE points at a shared backend.
+"""
+import hmac
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, jsonify, request
+from werkzeug.utils import import_string
+
+import cache
+import deadline
+import timeseries
+from cache import backend, refresh_ahead, refresh_lead
+
+CACHE = 'cache'
+SERIES = 'series'
+FILE = 'file'
+# The current UTC date, for payloads that depend on it as well as their data
+CLOCK = 'clock'
+
+# /api/warm refreshes whatever expires within this, so a scheduler hitting it
+# at this interval keeps everything ahead of its TTL.
+WARM_LEAD = timedelta(minutes=10)
+# Longest ?lead_s /api/warm accepts; much more would refresh nearly
+# everything on every call.
+MAX_WARM_LEAD = 3 * WARM_LEAD
+# Upstream budget for a single loader, within the overall warm budget.
+WARM_CALL_BUDGET_S = 30.0
+
+
+class Dataset:
+    """One cache entry, stored series or file, how long it is fresh for and
+    how to refresh it. A dataset with no `refresh` is only fetched on demand
+    (e.g. a fallback source) and just has its TTL declared here; one with
+    no TTL is a derived payload keyed by its inputs' versions."""
+
+    def __init__(self, key: str, ttl: Optional[timedelta], refresh: Optional[str] = None,
+                 args: Tuple = (), depends_on: Tuple[str, ...] = (), store: str = CACHE,
+                 path: Optional[Path] = None):
+        self.key = key
+        self.ttl = ttl
+        self.refresh = refresh
+        self.args = args
+        self.depends_on = depends_on
+        self.store = store
+        self.path = path
+
+    def fetched_at(self) -> Optional[datetime]:
+        try:
+            if self.store == SERIES:
+                m = timeseries.info(self.key)
+                return datetime.fromisoformat(m['fetched_at']) if m and m['points'] else None
+            entry = backend().get(self.key)
+            return datetime.fromisoformat(entry['fetched_at']) if entry else None
+        except Exception:
+            return None
+
+    def version(self) -> Optional[str]:
+        """Content version of the data as currently stored."""
+        if self.store == SERIES:
+            return timeseries.version(self.key)
+        if self.store == FILE:
+            try:
+                st = self.path.stat()
+            except OSError:
+                return None
+            return f'{st.st_mtime_ns:x}-{st.st_size:x}'
+        if self.store == CLOCK:
+            return datetime.utcnow().strftime('%Y-%m-%d')
+        return cache.version(self.key)
+
+    def expires_within(self, lead: timedelta) -> bool:
+        if self.ttl is None:
+            try:
+                entry = backend().get(self.key)
+            except Exception:
+                entry = None
+            return not entry or entry.get('inputs') != input_versions(self.key)
+        fetched_at = self.fetched_at()
+        return fetched_at is None or datetime.utcnow() - fetched_at >= self.ttl - lead
+
+
+_BC_CHARTS = [
+    ('hash-rate', '1year'),
+    ('miners-revenue', '1year'),
+    ('transaction-fees-usd', '1year'),
+    ('n-unique-addresses', '30days'),
+    ('n-transactions', '30days'),
+    ('transaction-fees-usd', '30days'),
+    ('hash-rate', '30days'),
+]
+SPARKLINES = {
+    'price': (),
+    'hashrate': ('bc_hash-rate_30days',),
+    'active-addresses': ('bc_n-unique-addresses_30days',),
+    'transactions': ('bc_n-transactions_30days',),
+    'fx-gbpusd': (),
+}
+
+# Inputs are declared before the datasets computed from them.
+_DATASETS: List[Dataset] = [
+    Dataset('utc_date', None, store=CLOCK),
+    Dataset('bitcoin_historical_csv', None, store=FILE,
+            path=Path(__file__).parent / 'data' / 'bitcoin_historical.csv'),
+    # Upstream data
+    Dataset('tip_height_cache', timedelta(seconds=30), '/api/tip'),
+    Dataset('spot_gbp_cache', timedelta(minutes=5), 'history.get_spot_price_gbp_cached'),
+    Dataset('fx_usdgbp_cache', timedelta(hours=6), 'history.get_gbp_per_usd'),
+    Dataset('gold_oz_gbp_cache', timedelta(hours=1)),
+    Dataset('nodes_latest_cache', timedelta(hours=24), '/api/nodes-latest'),
+    Dataset('cg_supply_cache', timedelta(minutes=10)),
+    Dataset('macro_cpi_cache', timedelta(hours=24)),
+    Dataset('ons_uk_cpi_annual_cache', timedelta(hours=24), 'debasement._fetch_uk_cpi_annual'),
+    *[Dataset(f'bc_{chart}_{timespan}', timedelta(minutes=10), 'metrics._bc_chart', args=(chart, timespan))
+      for chart, timespan in _BC_CHARTS],
+    Dataset('btc_daily_usd_all', timedelta(hours=24), 'history.load_btc_daily_usd_all', store=SERIES),
+    Dataset('btc_history_gbp', timedelta(hours=1), 'history.load_btc_history_gbp', store=SERIES),
+    Dataset('ftse_monthly', timedelta(hours=24), 'priced_in._load_ftse_monthly_gbp', store=SERIES),
+    Dataset('gold_monthly_gbp', timedelta(hours=24), 'priced_in._load_gold_monthly_gbp', store=SERIES),
+    Dataset('fx_gbp_per_usd_daily', timedelta(hours=24), 'history.load_gbp_per_usd_daily', store=SERIES),
+    Dataset('fred_m2sl', timedelta(hours=24), 'debasement._fetch_fred_csv', args=('M2SL',), store=SERIES),
+    Dataset('fred_cpiaucsl', timedelta(hours=24), 'debasement._fetch_fred_csv', args=('CPIAUCSL',), store=SERIES),
+    Dataset('ecb_m3', timedelta(hours=24), 'debasement._fetch_ecb_m3', store=SERIES),
+    Dataset('boe_m4', timedelta(hours=24), 'debasement._fetch_boe_m4', store=SERIES),
+    # World Bank fallbacks for when FRED / BoE are down
+    Dataset('wb_usa_fm_lbl_bmny_cn', timedelta(hours=24), store=SERIES),
+    Dataset('wb_gbr_fm_lbl_bmny_cn', timedelta(hours=24), store=SERIES),
+    Dataset('wb_usa_fp_cpi_totl', timedelta(hours=24), store=SERIES),
+    # Derived payloads
+    Dataset('market_structure_cache', None, '/api/market-structure',
+            depends_on=('bitcoin_historical_csv', 'spot_gbp_cache')),
+    Dataset('onchain_supply_cache', timedelta(minutes=10), '/api/onchain-supply',
+            depends_on=('tip_height_cache', 'cg_supply_cache')),
+    Dataset('macro_context_cache', timedelta(hours=6), '/api/macro-context',
+            depends_on=('fx_usdgbp_cache', 'macro_cpi_cache')),
+    Dataset('adoption_usage_cache', timedelta(minutes=10), '/api/adoption-usage',
+            depends_on=('bc_n-unique-addresses_30days', 'bc_n-transactions_30days',
+                        'bc_transaction-fees-usd_30days')),
+    *[Dataset(f'sparkline_{key}', timedelta(minutes=15), f'/api/sparkline/{key}', depends_on=deps)
+      for key, deps in SPARKLINES.items()],
+    Dataset('priced_in_cache', timedelta(minutes=10), '/api/priced-in',
+            depends_on=('spot_gbp_cache', 'fx_usdgbp_cache', 'gold_oz_gbp_cache')),
+    Dataset('priced_in_history_cache', None, '/api/priced-in/history',
+            depends_on=('btc_history_gbp', 'ons_uk_cpi_annual_cache', 'gold_monthly_gbp')),
+    Dataset('cycle_data_cache', None, '/api/cycle-data', depends_on=('btc_daily_usd_all',)),
+    Dataset('correlations_cache', None, '/api/correlations',
+            depends_on=('btc_history_gbp', 'ftse_monthly', 'gold_monthly_gbp', 'fx_gbp_per_usd_daily',
+                        'fred_m2sl', 'ecb_m3', 'boe_m4')),
+    Dataset('debasement_cache', None, '/api/debasement',
+            depends_on=('utc_date', 'fred_m2sl', 'fred_cpiaucsl', 'ecb_m3', 'boe_m4', 'ons_uk_cpi_annual_cache',
+                        'wb_usa_fm_lbl_bmny_cn', 'wb_gbr_fm_lbl_bmny_cn', 'wb_usa_fp_cpi_totl',
+                        'btc_daily_usd_all')),
+]
+
+DATASETS: Dict[str, Dataset] = {}
+for _ds in _DATASETS:
+    _missing = [d for d in _ds.depends_on if d not in DATASETS]
+    if _missing:
+        raise ValueError(f'{_ds.key} depends on {_missing}, which must be declared before it')
+    DATASETS[_ds.key] = _ds
+
+
+def ttl(key: str) -> timedelta:
+    """How long the dataset stored under `key` stays fresh."""
+    return DATASETS[key].ttl
+
+
+def input_versions(key: str) -> Dict[str, Optional[str]]:
+    """Content versions of the inputs of the derived dataset stored under
+    `key`, after refreshing any input that has expired."""
+    versions = {}
+    for dep in DATASETS[key].depends_on:
+        ds = DATASETS[dep]
+        refresh_if_expired(ds)
+        versions[dep] = ds.version()
+    return versions
+
+
+def refresh_if_expired(ds: Dataset):
+    """Refresh a TTL'd dataset whose data has expired (or, when warming,
+    is about to). Failures leave the stale data in place."""
+    if ds.refresh and ds.ttl is not None and ds.expires_within(refresh_lead()):
+        try:
+            _run(ds, current_app)
+        except Exception:
+            pass
+
+
+def _run(ds: Dataset, app):
+    """Call a dataset's refresh under WARM_CALL_BUDGET_S, capped by what is
+    left of the caller's budget. An API path's view is called directly in
+    a fresh app context: a full dispatch would run the request hooks, which
+    replace the budget with the route's own deadline and clear the caller's
+    g.upstream_deadline on the way out."""
+    remaining = deadline.remaining()
+    token = deadline.start(WARM_CALL_BUDGET_S if remaining is None else min(WARM_CALL_BUDGET_S, remaining))
+    try:
+        if ds.refresh.startswith('/'):
+            with app.app_context(), app.test_request_context(ds.refresh) as ctx:
+                if ctx.request.routing_exception is not None:
+                    raise ctx.request.routing_exception
+                rule = ctx.request.url_rule
+                r = app.make_response(app.view_functions[rule.endpoint](**ctx.request.view_args))
+            if r.status_code >= 400:
+                raise RuntimeError(f'{ds.refresh} returned {r.status_code}')
+        else:
+            import_string(ds.refresh)(*ds.args)
+    finally:
+        deadline.clear(token)
+
+
+def warm(app, lead: timedelta = WARM_LEAD, budget_s: Optional[float] = None) -> Dict[str, dict]:
+    """Refresh every dataset that expires within `lead`, inputs first, for
+    up to budget_s seconds. Returns each dataset's outcome: 'fresh',
+    'refreshed', 'failed' (with the error), 'skipped' when out of budget,
+    or 'on_demand' for datasets without a refresh of their own, which are
+    refreshed by the loaders that use them."""
+    started = time.monotonic()
+    report: Dict[str, dict] = {}
+    with app.app_context(), refresh_ahead(lead):
+        for ds in _DATASETS:
+            if ds.refresh is None:
+                report[ds.key] = {'status': 'on_demand'}
+                continue
+            if not ds.expires_within(lead):
+                report[ds.key] = {'status': 'fresh'}
+                continue
+            if budget_s is not None and time.monotonic() - started >= budget_s:
+                report[ds.key] = {'status': 'skipped'}
+                continue
+            t0 = time.monotonic()
+            before = ds.fetched_at()
+            try:
+                _run(ds, app)
+                # Loaders swallow upstream errors and fall back to stale data
+                status = {'status': 'refreshed' if ds.fetched_at() != before else 'failed'}
+            except Exception as e:
+                status = {'status': 'failed', 'error': str(e)}
+            status['took_ms'] = round((time.monotonic() - t0) * 1000)
+            report[ds.key] = status
+    return report
+
+
+def warm_view():
+    """Refresh datasets that expire within ?lead_s (default WARM_LEAD, at
+    most MAX_WARM_LEAD)."""
+    secret = os.environ.get('CRON_SECRET')
+    if not secret:
+        return jsonify({'error': 'warming is disabled: CRON_SECRET is not set'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {secret}'.encode()):
+        return jsonify({'error': 'unauthorized'}), 401
+    try:
+        lead_s = float(request.args.get('lead_s', WARM_LEAD.total_seconds()))
+        if math.isnan(lead_s):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'lead_s must be a number'}), 400
+    lead = timedelta(seconds=min(max(lead_s, 0.0), MAX_WARM_LEAD.total_seconds()))
+    report = warm(current_app._get_current_object(), lead, deadline.remaining())
+    return jsonify({'lead_s': lead.total_seconds(), 'datasets': report})
+
+
+_scheduler: Optional[threading.Thread] = None
+
+
+def start_scheduler(app, every_s: float):
+    """Warm every every_s seconds from a daemon thread, refreshing what
+    would expire before the next run."""
+    global _scheduler
+
+    def loop():
+        while True:
+            try:
+                warm(app, timedelta(seconds=every_s))
+            except Exception:
+                pass
+            time.sleep(every_s)
+
+    if _scheduler is None:
+        _scheduler = threading.Thread(target=loop, name='dataset-warmer', daemon=True)
+        _scheduler.start()
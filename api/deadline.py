@@ -0,0 +1,47 @@
+"""Per-request time budget shared by every upstream call.
+
+Kept apart from upstream.py so the request hooks in index.py can start and
+clear a deadline without importing `requests` on every page hit.
+"""
+import contextvars
+import time
+from typing import Optional
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.exhausted = False
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+def start(seconds: float) -> contextvars.Token:
+    """Give every upstream call made from this context a shared time budget.
+    Pass the returned token to :func:`clear` when the request ends."""
+    return _deadline.set(Deadline(seconds))
+
+
+def clear(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+def current() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None when no deadline is set."""
+    d = _deadline.get()
+    return None if d is None else max(0.0, d.remaining())
+
+
+def exhausted() -> bool:
+    """True once a call in this context was refused or cut short by the
+    deadline, i.e. whatever was computed from upstream data may be partial."""
+    d = _deadline.get()
+    return d is not None and d.exhausted
@@ -0,0 +1,442 @@
+"""Fiat debasement — /debasement.
+
+Money supply (FRED, ECB, BoE, World Bank), UK CPI (ONS) and the BTC supply
+schedule, combined into one payload for the debasement page.
+"""
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple
+
+from flask import jsonify
+
+import derived
+import formats
+import timeseries
+import upstream
+from cache import cached_for, cached_json, cached_response, stale_json, write_cache, cache_and_respond
+from datasets import input_versions, ttl
+from series import DailySeries
+
+# Incremental refreshes re-request this much history before the last stored
+# observation, since recent monthly prints are often revised.
+REVISION_OVERLAP = timedelta(days=120)
+
+def _fetch_fred_csv(series_id: str) -> DailySeries:
+    """Fetch a monthly FRED series as CSV into the series store. Refreshed
+    every 24h, asking only for observations from `cosd` onwards."""
+    name = f'fred_{series_id.lower()}'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    since = timeseries.refresh_start(name, REVISION_OVERLAP)
+    params = {'id': series_id}
+    if since:
+        params['cosd'] = since.strftime('%Y-%m-%d')
+    try:
+        r = upstream.get(
+            'fred',
+            f'https://fred.stlouisfed.org/graph/fredgraph.csv',
+            params=params,
+            timeout=30,
+            headers={'User-Agent': 'Mozilla/5.0'},
+        )
+        if not r.ok:
+            return timeseries.read_series(name)
+        result: List[Tuple[datetime, float]] = []
+        lines = r.text.strip().split('\n')
+        # Header: observation_date,<SERIES_ID>
+        for line in lines[1:]:
+            parts = line.split(',')
+            if len(parts) < 2:
+                continue
+            try:
+                d = datetime.strptime(parts[0].strip(), '%Y-%m-%d')
+                val = float(parts[1].strip())
+                result.append((d, val))
+            except Exception:
+                continue
+        if result or since:
+            timeseries.upsert(name, result, source=f'FRED {series_id}', full=since is None)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def _fetch_worldbank_indicator(country: str, indicator: str) -> DailySeries:
+    """Fetch annual values for a World Bank indicator (e.g. broad money
+    FM.LBL.BMNY.CN). Returned series uses Jan 1 of each reporting year as
+    the date. Refreshed every 24h.
+    """
+    name = f'wb_{country.lower()}_{indicator.lower().replace(".", "_")}'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    try:
+        r = upstream.get(
+            'worldbank',
+            f'https://api.worldbank.org/v2/country/{country}/indicator/{indicator}',
+            params={'format': 'json', 'per_page': 200, 'date': '1990:2030'},
+            timeout=30,
+            headers={'User-Agent': 'Mozilla/5.0'},
+        )
+        if not r.ok:
+            return timeseries.read_series(name)
+        j = r.json()
+        rows = j[1] if isinstance(j, list) and len(j) >= 2 and j[1] else []
+        result: List[Tuple[datetime, float]] = []
+        for entry in rows:
+            try:
+                val = entry.get('value')
+                if val is None:
+                    continue
+                year = int(entry['date'])
+                result.append((datetime(year, 1, 1), float(val)))
+            except Exception:
+                continue
+        result.sort(key=lambda x: x[0])
+        if result:
+            timeseries.upsert(name, result, source=f'World Bank {country} {indicator}', full=True)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def _fetch_ecb_m3() -> DailySeries:
+    """Fetch ECB BSI M3 monthly stocks (euro area). Refreshed
+    every 24h, from `startPeriod` onwards."""
+    name = 'ecb_m3'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    since = timeseries.refresh_start(name, REVISION_OVERLAP)
+    params = {'format': 'csvdata'}
+    if since:
+        params['startPeriod'] = since.strftime('%Y-%m')
+    try:
+        r = upstream.get(
+            'ecb',
+            'https://data-api.ecb.europa.eu/service/data/BSI/M.U2.Y.V.M30.X.1.U2.2300.Z01.E',
+            params=params,
+            timeout=30,
+            headers={'User-Agent': 'Mozilla/5.0', 'Accept': 'text/csv'},
+        )
+        if since and r.status_code == 404:
+            # The ECB API answers "no results" for a window with no new data
+            timeseries.upsert(name, [], source='ECB BSI M3')
+            return timeseries.read_series(name)
+        if not r.ok:
+            return timeseries.read_series(name)
+        # CSV with TIME_PERIOD column (YYYY-MM) and OBS_VALUE column
+        lines = r.text.strip().split('\n')
+        header = lines[0].split(',')
+        try:
+            tp_idx = header.index('TIME_PERIOD')
+            val_idx = header.index('OBS_VALUE')
+        except ValueError:
+            return timeseries.read_series(name)
+        result: List[Tuple[datetime, float]] = []
+        for line in lines[1:]:
+            parts = line.split(',')
+            if len(parts) <= max(tp_idx, val_idx):
+                continue
+            try:
+                d = datetime.strptime(parts[tp_idx], '%Y-%m')
+                val = float(parts[val_idx])
+                result.append((d, val))
+            except Exception:
+                continue
+        if result or since:
+            timeseries.upsert(name, result, source='ECB BSI M3', full=since is None)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def _fetch_boe_m4() -> DailySeries:
+    """Fetch Bank of England M4 monthly level (LPMAUYM, GBP millions).
+    Refreshed every 24h, from `Datefrom` onwards."""
+    name = 'boe_m4'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    since = timeseries.refresh_start(name, REVISION_OVERLAP)
+    try:
+        r = upstream.get(
+            'boe',
+            'https://www.bankofengland.co.uk/boeapps/database/_iadb-fromshowcolumns.asp',
+            params={
+                'csv.x': 'yes',
+                'Datefrom': since.strftime('%d/%b/%Y') if since else '01/Jan/2008',
+                'Dateto': 'now',
+                'CSVF': 'TN',
+                'UsingCodes': 'Y',
+                'Filter': 'N',
+                'title': 'LPMAUYM',
+                'VPD': 'Y',
+                'VFD': 'N',
+                'CodeVer': 'new',
+                'SeriesCodes': 'LPMAUYM',
+            },
+            timeout=30,
+            headers={'User-Agent': 'Mozilla/5.0'},
+        )
+        if not r.ok:
+            return timeseries.read_series(name)
+        result: List[Tuple[datetime, float]] = []
+        lines = r.text.strip().split('\n')
+        # Header: DATE,LPMAUYM ; rows: "31 Jan 2008,1681358"
+        for line in lines[1:]:
+            parts = line.split(',')
+            if len(parts) < 2:
+                continue
+            try:
+                d = datetime.strptime(parts[0].strip(), '%d %b %Y')
+                val = float(parts[1].strip())
+                result.append((d, val))
+            except Exception:
+                continue
+        if result or since:
+            timeseries.upsert(name, result, source='BoE LPMAUYM', full=since is None)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def _fetch_uk_cpi_annual() -> dict:
+    """Fetch UK CPI annual % rates from ONS (D7G7). Returns {year_int: rate_pct}.
+    Cached 24h."""
+    cache_key = 'ons_uk_cpi_annual_cache'
+    def decode(cached: Optional[dict]) -> dict:
+        if cached and 'rates' in cached:
+            return {int(y): float(r) for y, r in cached['rates'].items()}
+        return {}
+    cached = decode(cached_json(cache_key, ttl(cache_key)))
+    if cached:
+        return cached
+    try:
+        r = upstream.get(
+            'ons',
+            'https://www.ons.gov.uk/economy/inflationandpriceindices/timeseries/d7g7/mm23/data',
+            timeout=20,
+            headers={'User-Agent': 'Mozilla/5.0'},
+        )
+        if not r.ok:
+            return decode(stale_json(cache_key))
+        j = r.json()
+        out: dict = {}
+        for entry in j.get('years', []):
+            try:
+                out[int(entry['date'])] = float(entry['value'])
+            except Exception:
+                continue
+        if out:
+            write_cache(cache_key, {'rates': {str(k): v for k, v in out.items()}})
+        return out
+    except Exception:
+        return decode(stale_json(cache_key))
+
+# Halving epoch -> subsidy per block
+def _subsidy_for_block(block_height: int) -> float:
+    return 50.0 / (2 ** (block_height // 210_000)) if block_height < 210_000 * 33 else 0.0
+
+# Approximate cumulative BTC supply at a given date.
+# Uses 144 blocks/day from Jan 3, 2009 (genesis). Accurate to ~1-2% which is
+# fine for visualising the supply curve trend.
+def _btc_supply_at(date_dt: datetime) -> float:
+    GENESIS = datetime(2009, 1, 3)
+    if date_dt <= GENESIS:
+        return 0.0
+    days = (date_dt - GENESIS).days
+    block_height = days * 144
+    # Sum subsidy for each epoch up to block_height
+    HALVING = 210_000
+    supply = 0.0
+    block = 0
+    epoch = 0
+    while block < block_height:
+        epoch_end = (epoch + 1) * HALVING
+        subsidy = 50.0 / (2 ** epoch)
+        blocks_this_epoch = min(epoch_end, block_height) - block
+        supply += blocks_this_epoch * subsidy
+        block = epoch_end
+        epoch += 1
+        if epoch >= 33:
+            break
+    return supply
+
+def _monthly_dates(start: datetime, end: datetime) -> List[datetime]:
+    out = []
+    cursor = start.replace(day=1)
+    while cursor <= end:
+        out.append(cursor)
+        if cursor.month == 12:
+            cursor = cursor.replace(year=cursor.year + 1, month=1)
+        else:
+            cursor = cursor.replace(month=cursor.month + 1)
+    return out
+
+def _index_to_base(series: DailySeries, base_dt: datetime, sample_dates: List[datetime]) -> List[Optional[float]]:
+    """Resample a series to sample_dates and rebase so the value at base_dt is 100."""
+    if not series:
+        return [None] * len(sample_dates)
+    base_value = series.value_at_or_before(base_dt)
+    if not base_value:
+        # Try first value if base is before series start
+        base_value = series.values[0]
+    if not base_value:
+        return [None] * len(sample_dates)
+    out: List[Optional[float]] = []
+    for d in sample_dates:
+        v = series.value_at_or_before(d)
+        out.append(round(v / base_value * 100.0, 2) if v else None)
+    return out
+
+def api_debasement():
+    """Combined fiat-debasement payload: money supply race, GBP purchasing
+    power decay, BTC supply curve, real BTC USD price.
+
+    ?format=columnar|binary picks a compact encoding (see formats.py)."""
+    try:
+        fmt = formats.requested()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        # Recomputed when an input series changes, or daily for the as-of date
+        cache_key = 'debasement_cache'
+        inputs = input_versions(cache_key)
+        if fmt[0] == 'json':
+            cached = cached_response(cache_key, inputs=inputs)
+            if cached:
+                return cached
+        else:
+            cached = cached_for(cache_key, inputs)
+            if cached:
+                return formats.respond(cached, fmt)
+
+        BASE_DT = datetime(2009, 1, 1)  # rebase year
+        END_DT = datetime.utcnow()
+        sample_dates = _monthly_dates(BASE_DT, END_DT)
+
+        # --- Money supply series ---
+        us_m2_full  = _fetch_fred_csv('M2SL')
+        # Fallback when FRED is unreachable (TLS quirks on some networks):
+        # World Bank annual "Broad money (current LCU)" for the USA.
+        us_m2_source = 'FRED M2SL'
+        if not us_m2_full:
+            us_m2_full = _fetch_worldbank_indicator('USA', 'FM.LBL.BMNY.CN')
+            if us_m2_full:
+                us_m2_source = 'World Bank FM.LBL.BMNY.CN (annual)'
+
+        eu_m3_full  = _fetch_ecb_m3()
+        uk_m4_full  = _fetch_boe_m4()
+        if not uk_m4_full:
+            uk_m4_full = _fetch_worldbank_indicator('GBR', 'FM.LBL.BMNY.CN')
+
+        us_m2_idx = _index_to_base(us_m2_full, BASE_DT, sample_dates)
+        eu_m3_idx = _index_to_base(eu_m3_full, BASE_DT, sample_dates)
+        uk_m4_idx = _index_to_base(uk_m4_full, BASE_DT, sample_dates)
+
+        # BTC supply: emit raw absolute values plus % of 21M cap. Skip
+        # "index to 2009" because supply was effectively zero then and the
+        # resulting percentage would be meaningless.
+        btc_supply_series = [_btc_supply_at(d) for d in sample_dates]
+        btc_supply_abs_m = [round(v / 1_000_000.0, 4) if v else None for v in btc_supply_series]
+        btc_supply_pct_cap = [round(v / 21_000_000.0 * 100.0, 2) if v else None for v in btc_supply_series]
+
+        # --- Latest values for headline stats ---
+        def latest(series: DailySeries) -> Optional[float]:
+            return series.values[-1] if series else None
+        def base(series: DailySeries) -> Optional[float]:
+            return series.value_at_or_before(BASE_DT) or (series.values[0] if series else None)
+
+        def growth_pct(series: DailySeries) -> Optional[float]:
+            lo = base(series)
+            hi = latest(series)
+            if lo and hi is not None and lo > 0:
+                return round((hi / lo - 1.0) * 100.0, 1)
+            return None
+
+        # --- UK CPI: compound annual rates from 2009 to today ---
+        cpi_rates = _fetch_uk_cpi_annual()
+        current_year = END_DT.year
+        gbp_power_series = []
+        cumulative = 1.0
+        for year in range(BASE_DT.year, current_year + 1):
+            rate = cpi_rates.get(year)
+            if rate is None and year == current_year:
+                # Final year not yet released; carry forward last
+                rate = cpi_rates.get(year - 1, 0.0)
+            if rate is None:
+                rate = 0.0
+            cumulative *= (1 + rate / 100.0)
+            gbp_power_series.append({
+                'year': year,
+                'price_multiplier': round(cumulative, 4),
+                'pound_buys': round(1.0 / cumulative, 4),
+            })
+        gbp_purchasing_power_now = round(1.0 / cumulative, 4) if cumulative else None
+
+        # --- Real BTC USD price (nominal / US CPI) ---
+        btc_usd = derived.source('btc_daily_usd_all').series
+        real_btc_series = []
+        # Try FRED CPI; fall back to World Bank annual US CPI index
+        us_cpi = _fetch_fred_csv('CPIAUCSL')
+        if not us_cpi:
+            wb_cpi = _fetch_worldbank_indicator('USA', 'FP.CPI.TOTL')
+            us_cpi = wb_cpi
+        if btc_usd and us_cpi:
+            base_cpi = us_cpi.value_at_or_before(BASE_DT)
+            if base_cpi:
+                btc_monthly = []
+                for d in sample_dates:
+                    p = btc_usd.value_at_or_before(d)
+                    cpi = us_cpi.value_at_or_before(d)
+                    if p and cpi:
+                        real = p * (base_cpi / cpi)
+                        btc_monthly.append([d.strftime('%Y-%m-%d'), round(p, 2), round(real, 2)])
+                real_btc_series = btc_monthly
+
+        # --- Build response ---
+        race_dates = [d.strftime('%Y-%m-%d') for d in sample_dates]
+
+        usd_m2_growth = growth_pct(us_m2_full)
+        eur_m3_growth = growth_pct(eu_m3_full)
+        gbp_m4_growth = growth_pct(uk_m4_full)
+        btc_supply_now = btc_supply_series[-1] if btc_supply_series else None
+        btc_supply_pct_now = round(btc_supply_now / 21_000_000.0 * 100.0, 2) if btc_supply_now else None
+
+        payload = {
+            'base_date': BASE_DT.strftime('%Y-%m-%d'),
+            'as_of': END_DT.strftime('%Y-%m-%d'),
+            'race': {
+                'dates': race_dates,
+                'usd_m2': us_m2_idx,
+                'eur_m3': eu_m3_idx,
+                'gbp_m4': uk_m4_idx,
+            },
+            'btc_supply': {
+                'dates': race_dates,
+                'absolute_millions': btc_supply_abs_m,
+                'pct_of_cap': btc_supply_pct_cap,
+                'cap_millions': 21,
+            },
+            'gbp_purchasing_power': {
+                'series': gbp_power_series,
+                'now': gbp_purchasing_power_now,  # what £1 from 2009 buys today
+            },
+            'real_btc': {
+                'series': real_btc_series,  # [date, nominal_usd, real_usd_2009]
+            },
+            'stats': {
+                'usd_m2_growth_pct_since_2009': usd_m2_growth,
+                'eur_m3_growth_pct_since_2009': eur_m3_growth,
+                'gbp_m4_growth_pct_since_2009': gbp_m4_growth,
+                'btc_supply_now': round(btc_supply_now, 0) if btc_supply_now else None,
+                'btc_supply_pct_of_cap_now': btc_supply_pct_now,
+                'gbp_purchasing_power_2009_in_today': gbp_purchasing_power_now,
+            },
+            'sources': {
+                'usd_m2': us_m2_source,
+                'eur_m3': 'ECB BSI M3 (U2)',
+                'gbp_m4': 'Bank of England LPMAUYM',
+                'uk_cpi': 'ONS D7G7 (annual % CPI)',
+                'us_cpi': 'FRED CPIAUCSL',
+                'btc_supply': 'Derived from halving schedule',
+                'btc_usd': 'blockchain.info market-price',
+            },
+        }
+        respond = None if fmt[0] == 'json' else (lambda p: formats.respond(p, fmt))
+        return cache_and_respond(cache_key, payload, inputs, respond=respond)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,190 @@
+"""Series derived from the stored price histories, computed once per version.
+
+:func:`source` returns the :class:`Source` for a dataset's current content
+version (see datasets.py), refreshing the dataset first if it has expired.
+Everything asked of a Source (the decoded series, daily returns, SMA(n),
+running ATH, drawdown, rolling volatility and extremes, holding-period
+returns, a rank index, a power-law fit) is computed on first use and
+shared by every endpoint and request on this instance until the data
+changes, when the next call to :func:`source` starts over with the new
+version. The rank index and the power-law fit are carried over and
+extended when the new version only appends days.
+
+Results are shared: callers must not modify the lists they get back.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from werkzeug.utils import import_string
+
+import timeseries
+from datasets import DATASETS, FILE, SERIES, refresh_if_expired
+from series import (DailySeries, OrderIndex, PowerLawFit,
+                    holding_returns as _holding_returns, rolling_extreme_index,
+                    rolling_volatility as _rolling_volatility, sma as _sma, to_ms)
+
+# Daily BTC closes behind an endpoint's ?currency= param
+CURRENCY_SOURCES = {
+    'gbp': 'btc_history_gbp',  # since 2014
+    'usd': 'btc_daily_usd_all',  # since 2010
+}
+
+_lock = threading.Lock()
+_sources: Dict[str, 'Source'] = {}
+
+
+class Source:
+    """One version of a series and the computations done on it so far."""
+
+    def __init__(self, name: str, version: Optional[str], previous: Optional['Source'] = None):
+        self.name = name
+        self.version = version
+        self.previous = previous
+        self._memo: dict = {}
+
+    def memo(self, key, compute: Callable):
+        """compute(), done once for this version. Also for endpoint-specific
+        computations; keep `key` to a bounded set of values."""
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = compute()
+            return value
+
+    @property
+    def series(self) -> DailySeries:
+        return self.memo('series', self._load)
+
+    def _load(self) -> DailySeries:
+        ds = DATASETS[self.name]
+        if ds.store == FILE:
+            from history import read_prices_from_csv
+            dates, closes = read_prices_from_csv(ds.path)
+            return DailySeries.from_pairs(sorted(zip(dates, closes), key=lambda x: x[0]))
+        if ds.store == SERIES:
+            series = timeseries.read_series(self.name)
+            if len(series) or not ds.refresh:
+                return series
+        # Store unavailable: use the loader's own result
+        return import_string(ds.refresh)(*ds.args)
+
+    @property
+    def values(self):
+        return self.series.values
+
+    def date(self, i: int) -> datetime:
+        """Point i's date; only the dates asked for are built."""
+        return self.series.date(i)
+
+    def month_ends(self) -> Dict[Tuple[int, int], float]:
+        """{(year, month): last value in that month} (DailySeries.month_ends)."""
+        return self.memo('month_ends', self.series.month_ends)
+
+    def returns(self) -> List[float]:
+        """Simple daily returns; returns[i] is from point i to i + 1."""
+        def compute():
+            v = self.values
+            out = []
+            for i in range(1, len(v)):
+                try:
+                    out.append(v[i] / v[i - 1] - 1.0)
+                except ZeroDivisionError:
+                    out.append(0.0)
+            return out
+        return self.memo('returns', compute)
+
+    def sma(self, window: int) -> List[Optional[float]]:
+        return self.memo(('sma', window), lambda: _sma(self.values, window))
+
+    def running_ath(self) -> List[float]:
+        def compute():
+            out = []
+            high = float('-inf')
+            for v in self.values:
+                high = max(high, v)
+                out.append(high)
+            return out
+        return self.memo('running_ath', compute)
+
+    def drawdown(self) -> List[float]:
+        """Percent below the running all-time high (<= 0)."""
+        return self.memo('drawdown', lambda: [
+            (v / ath - 1.0) * 100.0 if ath else 0.0 for v, ath in zip(self.values, self.running_ath())
+        ])
+
+    def rolling_volatility(self, window: int) -> List[Optional[float]]:
+        """Annualized volatility (%) of the `window` daily returns ending at
+        each point, None until there are enough."""
+        return self.memo(('rolling_volatility', window),
+                         lambda: [None] + _rolling_volatility(self.returns(), window) if len(self.values) else [])
+
+    def rolling_high_index(self, window: int) -> List[int]:
+        """Index of the highest value in the `window` points ending at each point."""
+        return self.memo(('rolling_high_index', window), lambda: rolling_extreme_index(self.values, window))
+
+    def rolling_low_index(self, window: int) -> List[int]:
+        return self.memo(('rolling_low_index', window),
+                         lambda: rolling_extreme_index(self.values, window, highest=False))
+
+    def holding_returns(self, hold_days: int) -> List[Tuple[int, float]]:
+        """(entry index, return) from buying at each point and holding
+        `hold_days` (series.holding_returns)."""
+        return self.memo(('holding_returns', hold_days), lambda: _holding_returns(self.series, hold_days))
+
+    def _carried(self, key: str, new: Callable, extend: Callable):
+        """The previous version's `key` result extended with the days this
+        version appended, when it only appended days; else built afresh.
+        extend(result, start) adds the points from index start onwards."""
+        prev = self.previous
+        start = 0
+        if prev is not None and key in prev._memo:
+            old, cur = prev.series, self.series
+            n = len(old)
+            if n <= len(cur) and cur.ts_ms[:n] == old.ts_ms and cur.values[:n] == old.values:
+                result = prev._memo[key].copy()
+                start = n
+        if not start:
+            result = new()
+        extend(result, start)
+        return result
+
+    def order_index(self) -> OrderIndex:
+        """Rank index over the values (see series.OrderIndex)."""
+        return self.memo('order_index', lambda: self._carried(
+            'order_index', OrderIndex, lambda index, start: index.extend(self.values[start:])))
+
+    def power_law_fit(self) -> PowerLawFit:
+        """Log-log trend fit over the whole series (see series.PowerLawFit)."""
+        return self.memo('power_law_fit', lambda: self._carried(
+            'power_law_fit', PowerLawFit,
+            lambda fit, start: fit.extend(self.series.ts_ms[start:], self.values[start:])))
+
+    def first_on_or_after(self, when: datetime) -> Optional[int]:
+        """Index of the first point dated on or after `when`, e.g. a
+        halving's anchor price, or None if there is none."""
+        ts_ms = self.series.ts_ms
+        i = bisect_left(ts_ms, to_ms(when))
+        return i if i < len(ts_ms) else None
+
+    def first_after(self, when: datetime) -> int:
+        """Index of the first point dated after `when` (len(self.series) if
+        none is), i.e. the stop of a slice ending on `when`."""
+        return bisect_right(self.series.ts_ms, to_ms(when))
+
+
+def source(name: str) -> Source:
+    """The current version of a registered dataset's series."""
+    ds = DATASETS[name]
+    refresh_if_expired(ds)
+    version = ds.version()
+    with _lock:
+        src = _sources.get(name)
+        if src is None or version is None or src.version != version:
+            if src is not None:
+                src.previous = None
+            src = Source(name, version, previous=src)
+            if version is not None:
+                _sources[name] = src
+    return src
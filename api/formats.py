@@ -0,0 +1,254 @@
+"""Alternative encodings for chart payloads, picked with ?format=.
+
+json (default)
+    The payload as-is, via jsonify.
+
+columnar (application/vnd.bitviz.columnar+json)
+    The same payload with its chart arrays re-encoded:
+
+    - a list of 'YYYY-MM-DD' dates becomes {"$axis": "date", "count": n,
+      "start": "2014-09-17", "step_days": 1}, or {"$axis": "date", "count":
+      n, "start": ..., "delta_days": [...]} when unevenly spaced
+      (delta_days[i] = days from point i to point i + 1);
+    - a list of equal-length rows such as [[ts_ms, price], ...] becomes
+      {"$rows": n, "columns": [col0, col1, ...]}, where an ascending
+      numeric first column is an axis {"$axis": "num", "count": n, "start":
+      x0, "step": dx} (x[i] = x0 + i * dx) or {..., "deltas": [...]}
+      (x[i + 1] = x[i] + deltas[i]), used only when that arithmetic gives
+      the values back exactly, and other columns are plain lists;
+    - a list of dicts with the same keys, such as [{"label": ...,
+      "series": [...]}, ...], becomes {"$records": n, "fields": {key:
+      column, ...}}, each column encoded by these same rules;
+    - any other list or dict is encoded item by item.
+
+binary (application/vnd.bitviz.columns)
+    The columnar payload as a manifest followed by raw columns:
+
+        bytes 0-3     b'BVC1'
+        bytes 4-7     manifest length M, uint32 little-endian; 8 + M is a
+                      multiple of 8 (the manifest is space-padded)
+        bytes 8..8+M  manifest: the columnar payload as UTF-8 JSON, with each
+                      numeric column replaced by {"$f64": [offset, count]}
+                      (or "$f32" for values with ?dtype=f32), or by
+                      {"$i32": [offset, count], "scale": 10**k} when every
+                      value is exactly int / scale, e.g. prices rounded to
+                      2 places (scale 100)
+        8+M..         the columns, little-endian, each at a multiple of 8
+                      bytes from 8 + M, which `offset` counts from; null is
+                      NaN, or -2**31 in an $i32 column
+
+    so a browser reads a column with new Float64Array(body, 8 + M + offset,
+    count), or with an Int32Array and a division by scale.
+
+Columnar and binary skip per-point [x, y] lists and repeated timestamps /
+dates; binary also skips number formatting and parsing entirely.
+"""
+import json
+import math
+import re
+import struct
+import sys
+from array import array
+from datetime import date
+from typing import Any, List, Optional
+
+from flask import Response, jsonify, request
+
+from series import DAY_MS, SeriesWindow
+
+FORMATS = ('json', 'columnar', 'binary')
+COLUMNAR_MIMETYPE = 'application/vnd.bitviz.columnar+json'
+BINARY_MIMETYPE = 'application/vnd.bitviz.columns'
+BINARY_MAGIC = b'BVC1'
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def requested() -> tuple:
+    """(format, dtype) asked for by the current request. Raises ValueError
+    with a message fit for a 400."""
+    fmt = (request.args.get('format') or 'json').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+    dtype = (request.args.get('dtype') or 'f64').lower()
+    if dtype not in ('f64', 'f32'):
+        raise ValueError('dtype must be f64 or f32')
+    return fmt, dtype
+
+
+def respond(payload: dict, requested_format: tuple = ('json', 'f64')):
+    """Response for payload in the format from requested()."""
+    fmt, dtype = requested_format
+    if fmt == 'columnar':
+        body = json.dumps(columnar(payload), separators=(',', ':'), sort_keys=True, default=_json_default)
+        return Response(body, mimetype=COLUMNAR_MIMETYPE)
+    if fmt == 'binary':
+        return Response(binary(payload, dtype), mimetype=BINARY_MIMETYPE)
+    return jsonify(_plain(payload))
+
+
+def _plain(node: Any) -> Any:
+    """Payload with any SeriesWindow as its [[ts_ms, value], ...] pairs."""
+    if isinstance(node, SeriesWindow):
+        return node.pairs()
+    if isinstance(node, dict):
+        return {k: _plain(v) for k, v in node.items()}
+    return node
+
+
+# --------------------------------------------------------------------------- #
+# Columnar
+# --------------------------------------------------------------------------- #
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _numeric(values: list) -> bool:
+    return bool(values) and all(v is None or _is_number(v) for v in values) and any(v is not None for v in values)
+
+
+def _num_axis(values) -> Optional[dict]:
+    """Ascending, gap-free numbers as an axis, or None (also when the
+    decoder's arithmetic wouldn't give them back exactly)."""
+    if len(values) < 2 or any(v is None for v in values):
+        return None
+    deltas = [b - a for a, b in zip(values, values[1:])]
+    if any(d <= 0 for d in deltas):
+        return None
+    start = values[0]
+    if all(d == deltas[0] for d in deltas) and all(start + i * deltas[0] == v for i, v in enumerate(values)):
+        return {'$axis': 'num', 'count': len(values), 'start': start, 'step': deltas[0]}
+    x = start
+    for d, v in zip(deltas, values[1:]):
+        x += d
+        if x != v:
+            return None
+    return {'$axis': 'num', 'count': len(values), 'start': start, 'deltas': deltas}
+
+
+def _date_axis(values: list) -> Optional[dict]:
+    if len(values) < 2 or not all(isinstance(v, str) and _DATE_RE.match(v) for v in values):
+        return None
+    days = [date.fromisoformat(v).toordinal() for v in values]
+    deltas = [b - a for a, b in zip(days, days[1:])]
+    if all(d == deltas[0] for d in deltas):
+        return {'$axis': 'date', 'count': len(values), 'start': values[0], 'step_days': deltas[0]}
+    return {'$axis': 'date', 'count': len(values), 'start': values[0], 'delta_days': deltas}
+
+
+def _window_columns(window: SeriesWindow) -> dict:
+    """{"$rows"} for a SeriesWindow, straight from its arrays."""
+    ts_ms, values = window.ts_ms, window.values
+    n = len(window)
+    if n < 2 or ts_ms[-1] - ts_ms[0] == (n - 1) * DAY_MS:
+        axis = {'$axis': 'num', 'count': n, 'start': ts_ms[0] if n else None, 'step': DAY_MS}
+    else:
+        axis = _num_axis(ts_ms.tolist()) or ts_ms.tolist()
+    # The values stay a typed array until binary() or JSON encoding needs them
+    return {'$rows': n, 'columns': [axis, values]}
+
+
+def columnar(node: Any) -> Any:
+    if isinstance(node, SeriesWindow):
+        return _window_columns(node)
+    if isinstance(node, dict):
+        return {k: columnar(v) for k, v in node.items()}
+    if not isinstance(node, list):
+        return node
+    if len(node) >= 2:
+        date_axis = _date_axis(node)
+        if date_axis:
+            return date_axis
+        width = len(node[0]) if isinstance(node[0], list) else 0
+        if width >= 2 and all(isinstance(r, list) and len(r) == width for r in node):
+            cols = [list(c) for c in zip(*node)]
+            if all(_numeric(c) or _date_axis(c) for c in cols):
+                first = _date_axis(cols[0]) or _num_axis(cols[0]) or cols[0]
+                return {'$rows': len(node), 'columns': [first] + [columnar(c) for c in cols[1:]]}
+        keys = list(node[0]) if isinstance(node[0], dict) else None
+        if keys and all(isinstance(r, dict) and list(r) == keys for r in node):
+            return {'$records': len(node), 'fields': {k: columnar([r[k] for r in node]) for k in keys}}
+    return [columnar(v) for v in node]
+
+
+def _json_default(o):
+    # SeriesWindow value columns are left as typed-array views
+    if isinstance(o, memoryview):
+        return o.tolist()
+    raise TypeError(f'{type(o).__name__} is not JSON serializable')
+
+
+# --------------------------------------------------------------------------- #
+# Binary
+# --------------------------------------------------------------------------- #
+
+class _Columns:
+    """Collects the binary columns and hands out their manifest entries."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, values, typecode: str) -> dict:
+        entry = {}
+        scale = _int_scale(values) if isinstance(values, list) else None
+        if scale is not None:
+            typecode, entry['scale'] = 'i', scale
+            a = array('i', (_I32_NULL if v is None else round(v * scale) for v in values))
+        elif isinstance(values, memoryview) and values.format == typecode:
+            # A series' own array: copied as bytes, no per-point work
+            a = array(typecode)
+            a.frombytes(values.tobytes())
+        else:
+            a = array(typecode, (math.nan if v is None else v for v in values))
+        if sys.byteorder == 'big':
+            a.byteswap()
+        raw = a.tobytes()
+        offset = self.size
+        pad = -len(raw) % 8
+        self.chunks.append(raw + b'\0' * pad)
+        self.size += len(raw) + pad
+        entry[{'d': '$f64', 'f': '$f32', 'i': '$i32'}[typecode]] = [offset, len(values)]
+        return entry
+
+
+_I32_NULL = -2 ** 31
+_MAX_SCALE_DIGITS = 6
+
+
+def _int_scale(values: list) -> Optional[int]:
+    """Smallest 10**k (k <= _MAX_SCALE_DIGITS) for which every value is
+    exactly an int32 over it, or None."""
+    finite = [v for v in values if v is not None]
+    if not all(math.isfinite(v) for v in finite):
+        return None
+    for k in range(_MAX_SCALE_DIGITS + 1):
+        scale = 10 ** k
+        if all(abs(round(v * scale)) < 2 ** 31 and round(v * scale) / scale == v for v in finite):
+            return scale
+    return None
+
+
+def _to_buffers(node: Any, cols: _Columns, value_typecode: str) -> Any:
+    if isinstance(node, dict):
+        if node.get('$axis') in ('num', 'date'):
+            out = dict(node)
+            for k in ('deltas', 'delta_days'):
+                if k in out:
+                    out[k] = cols.add(out[k], 'd')
+            return out
+        return {k: _to_buffers(v, cols, value_typecode) for k, v in node.items()}
+    if isinstance(node, memoryview) or (isinstance(node, list) and _numeric(node)):
+        return cols.add(node, value_typecode)
+    if isinstance(node, list):
+        return [_to_buffers(v, cols, value_typecode) for v in node]
+    return node
+
+
+def binary(payload: dict, dtype: str = 'f64') -> bytes:
+    cols = _Columns()
+    manifest = _to_buffers(columnar(payload), cols, 'f' if dtype == 'f32' else 'd')
+    text = json.dumps(manifest, separators=(',', ':'), sort_keys=True).encode()
+    text += b' ' * (-(8 + len(text)) % 8)
+    return BINARY_MAGIC + struct.pack('<I', len(text)) + text + b''.join(cols.chunks)
@@ -0,0 +1,187 @@
+"""BTC price history and FX loaders shared by several sections."""
+import csv
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+import timeseries
+import upstream
+from cache import cached_json, write_cache
+from datasets import ttl
+from series import DailySeries
+
+# Daily BTC/GBP closes since 2014, appended to daily by data/fetch_historical_data.py.
+# Ships with the code, so it is read from here even when DATA_DIR is relocated.
+CSV_PATH = Path(__file__).parent / 'data' / 'bitcoin_historical.csv'
+
+def read_prices_from_csv(csv_path: Path):
+    closes = []
+    dates = []
+    with open(csv_path, 'r') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                dates.append(datetime.strptime(row['Date'], '%Y-%m-%d'))
+                closes.append(float(row['Close']))
+            except Exception:
+                continue
+    return dates, closes
+
+def get_spot_price_gbp_cached():
+    cached = cached_json('spot_gbp_cache', ttl('spot_gbp_cache'))
+    if cached and 'gbp' in cached:
+        try:
+            return float(cached['gbp'])
+        except Exception:
+            pass
+    try:
+        resp = upstream.get('coingecko', 'https://api.coingecko.com/api/v3/simple/price', params={'ids':'bitcoin','vs_currencies':'gbp'}, timeout=15)
+        resp.raise_for_status()
+        spot = float(resp.json()['bitcoin']['gbp'])
+        write_cache('spot_gbp_cache', {'gbp': spot})
+        return spot
+    except Exception:
+        return None
+
+def get_gbp_per_usd() -> Optional[float]:
+    cache_key = 'fx_usdgbp_cache'
+    cached = cached_json(cache_key, ttl(cache_key))
+    if cached and 'gbp_per_usd' in cached:
+        try:
+            return float(cached['gbp_per_usd'])
+        except Exception:
+            pass
+    try:
+        r = upstream.get('exchangerate_host', 'https://api.exchangerate.host/latest', params={'base':'USD','symbols':'GBP'}, timeout=15)
+        r.raise_for_status()
+        j = r.json()
+        rate = float(j['rates']['GBP'])
+        write_cache(cache_key, {'gbp_per_usd': rate})
+        return rate
+    except Exception:
+        return None
+
+def load_gbp_per_usd_daily() -> DailySeries:
+    """Daily GBP per USD (ECB reference rates via frankfurter.app) since 2010.
+    Refreshed every 24h; only the days since the last stored one are
+    requested, with a full download once a week."""
+    name = 'fx_gbp_per_usd_daily'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    since = timeseries.refresh_start(name, timedelta(days=7))
+    start = (since or datetime(2010, 1, 1)).date()
+    try:
+        r = upstream.get(
+            'frankfurter',
+            f'https://api.frankfurter.app/{start.isoformat()}..{datetime.utcnow().date().isoformat()}',
+            params={'from': 'USD', 'to': 'GBP'},
+            timeout=30,
+        )
+        r.raise_for_status()
+        result: List[Tuple[datetime, float]] = []
+        for day, rates in sorted((r.json() or {}).get('rates', {}).items()):
+            try:
+                result.append((datetime.strptime(day, '%Y-%m-%d'), float(rates['GBP'])))
+            except Exception:
+                continue
+        if result or since:
+            timeseries.upsert(name, result, source='frankfurter.app USD/GBP', full=since is None)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def load_btc_daily_usd_all() -> DailySeries:
+    """Daily BTC/USD back to 2009 via blockchain.info market-price (sampled=false).
+    Refreshed every 24h; only the days since the last stored one are
+    requested, with a full `timespan=all` download once a week."""
+    name = 'btc_daily_usd_all'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    since = timeseries.refresh_start(name, timedelta(days=3))
+    timespan = f'{(datetime.utcnow() - since).days + 1}days' if since else 'all'
+    try:
+        r = upstream.get(
+            'blockchain_info',
+            'https://api.blockchain.info/charts/market-price',
+            params={'timespan': timespan, 'sampled': 'false', 'format': 'json', 'cors': 'true'},
+            timeout=45,
+        )
+        r.raise_for_status()
+        j = r.json()
+        result: List[Tuple[datetime, float]] = []
+        for pt in j.get('values', []):
+            try:
+                d = datetime.utcfromtimestamp(int(pt['x'])).replace(hour=0, minute=0, second=0, microsecond=0)
+                v = float(pt['y'])
+                if v > 0:
+                    result.append((d, v))
+            except Exception:
+                continue
+        if result or since:
+            timeseries.upsert(name, result, source='blockchain.info market-price', full=since is None)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def load_btc_history_gbp() -> DailySeries:
+    """Daily BTC/GBP history back to 2014.
+
+    Source: stitches the local bitcoin_historical.csv (GBP daily, 2014→2025)
+    with a CoinGecko days=365 fetch for the recent gap. CoinGecko's free API
+    caps history at 365 days, so we can't ask for `max` directly.
+    This is the canonical price history: every /api/bitcoin-historical range
+    is a slice of it. Refreshed hourly.
+    """
+    name = 'btc_history_gbp'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+
+    # 1) CSV foundation
+    by_date: dict = {}
+    if CSV_PATH.exists():
+        try:
+            with open(CSV_PATH, 'r') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    try:
+                        d = datetime.strptime(row['Date'], '%Y-%m-%d')
+                        by_date[d] = float(row['Close'])
+                    except Exception:
+                        continue
+        except Exception:
+            pass
+
+    # 2) Recent year from CoinGecko (overwrites any overlap with the CSV)
+    fetched = False
+    try:
+        r = upstream.get(
+            'coingecko',
+            'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
+            params={'vs_currency': 'gbp', 'days': '365', 'interval': 'daily'},
+            timeout=30,
+            priority=upstream.BACKGROUND,
+        )
+        if r.ok:
+            j = r.json()
+            for pt in j.get('prices', []):
+                try:
+                    ts_ms = int(pt[0])
+                    val = float(pt[1])
+                    # Normalize to midnight UTC so it merges cleanly with CSV daily dates
+                    d = datetime.utcfromtimestamp(ts_ms / 1000).replace(hour=0, minute=0, second=0, microsecond=0)
+                    by_date[d] = val
+                    fetched = True
+                except Exception:
+                    continue
+    except Exception:
+        pass
+
+    if not fetched:
+        # Don't store a CSV-only history over a complete one
+        stored = timeseries.read_series(name)
+        if stored:
+            return stored
+    result = sorted(by_date.items())
+    if result and fetched:
+        timeseries.upsert(name, result, source='bitcoin_historical.csv + CoinGecko market_chart', full=True)
+    return timeseries.read_series(name, fallback=result)
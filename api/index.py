@@ -1,59 +1,54 @@
-from flask import Flask, render_template, jsonify, request
-import csv
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, g
 from pathlib import Path
-import time
-import json
-import requests
-import math
-from typing import Optional, List, Tuple
+import os
+import sys
 
-app = Flask(__name__)
+from werkzeug.utils import cached_property, import_string
 
-# UK consumer reference values for /api/priced-in.
-# Hardcoded approximations sourced from public ONS / Land Registry / BBPA data;
-# refresh annually. Each entry includes an as_of label so the UI can show it.
-PRICED_IN_REFERENCES = [
-    {'key': 'milk_pint',     'gbp': 0.85,    'label': 'pint of milk',                  'plural': 'pints of milk',                  'as_of': '2025',     'source': 'ONS retail prices'},
-    {'key': 'bread_loaf',    'gbp': 1.40,    'label': 'loaf of bread',                 'plural': 'loaves of bread',                'as_of': '2025',     'source': 'ONS retail prices'},
-    {'key': 'weekly_shop',   'gbp': 55.0,    'label': 'weekly food shop (1 adult)',    'plural': 'weekly food shops',              'as_of': '2025',     'source': 'ONS LCFS (approx.)'},
-    {'key': 'pint_beer',     'gbp': 5.20,    'label': 'pint of beer (pub)',            'plural': 'pints of beer',                  'as_of': '2025',     'source': 'BBPA (approx.)'},
-    {'key': 'avg_uk_house',  'gbp': 290000,  'label': 'average UK house',              'plural': 'average UK houses',              'as_of': '2025',     'source': 'HM Land Registry HPI'},
-    {'key': 'median_salary', 'gbp': 37500,   'label': 'median UK annual salary',       'plural': 'median UK annual salaries',      'as_of': '2025',     'source': 'ONS ASHE'},
-]
+# Vercel loads this file by path; make sibling modules importable.
+sys.path.insert(0, str(Path(__file__).parent))
+import deadline
 
-def _read_prices_from_csv(csv_path: Path):
-    closes = []
-    dates = []
-    with open(csv_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                dates.append(datetime.strptime(row['Date'], '%Y-%m-%d'))
-                closes.append(float(row['Close']))
-            except Exception:
-                continue
-    return dates, closes
+app = Flask(__name__)
 
-def _get_spot_price_gbp_cached(cache_dir: Path):
-    cache_file = cache_dir / 'spot_gbp_cache.json'
-    now = datetime.utcnow()
-    if cache_file.exists():
-        try:
-            cached = json.loads(cache_file.read_text())
-            ts = datetime.fromisoformat(cached.get('fetched_at'))
-            if (now - ts) < timedelta(minutes=5) and 'gbp' in cached:
-                return float(cached['gbp'])
-        except Exception:
-            pass
-    try:
-        resp = requests.get('https://api.coingecko.com/api/v3/simple/price', params={'ids':'bitcoin','vs_currencies':'gbp'}, timeout=15)
-        resp.raise_for_status()
-        spot = float(resp.json()['bitcoin']['gbp'])
-        cache_file.write_text(json.dumps({'fetched_at': now.isoformat(), 'gbp': spot}))
-        return spot
-    except Exception:
-        return None
+# Upstream time budget per endpoint, in seconds. Every upstream call made
+# while serving the request gets min(remaining budget, its own timeout), so
+# a cold request finishes inside Vercel's function limit and falls back to
+# partial or stale data instead.
+DEFAULT_DEADLINE_S = 8.0
+ROUTE_DEADLINES = {
+    'tip_height': 3.0,
+    'fx_rate': 4.0,
+    'sparkline': 5.0,
+    'get_historical_data': 6.0,
+    'api_debasement': 9.0,
+    'api_cycle_data': 9.0,
+    'adoption_usage': 9.0,
+    'macro_context': 9.0,
+    'warm_view': 55.0,
+}
+
+# /api/stream holds a connection open per tab and runs a poller thread per
+# process: right for a long-running server, but on serverless functions
+# every tab would keep a function busy and every instance would poll
+# upstream. So it is off on Vercel (or with BITVIZ_STREAM=off), and pages
+# fall back to polling.
+app.config['STREAM_ENABLED'] = (
+    os.environ.get('BITVIZ_STREAM') or ('off' if os.environ.get('VERCEL') else 'on')) != 'off'
+
+@app.context_processor
+def _live_config():
+    return {'stream_enabled': app.config['STREAM_ENABLED']}
+
+@app.before_request
+def _start_upstream_deadline():
+    g.upstream_deadline = deadline.start(ROUTE_DEADLINES.get(request.endpoint, DEFAULT_DEADLINE_S))
+
+@app.teardown_request
+def _clear_upstream_deadline(exc):
+    token = g.pop('upstream_deadline', None)
+    if token is not None:
+        deadline.clear(token)
 
 @app.route('/')
 def home():
@@ -83,1712 +78,72 @@ def cycles_page():
 def debasement_page():
     return render_template('debasement.html')
 
-@app.route('/api/nodes-latest')
-def nodes_latest():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'nodes_latest_cache.json'
-        now = datetime.utcnow()
-
-        # Serve cache if fresh (<24h)
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    cached = json.load(f)
-                fetched_at = datetime.fromisoformat(cached.get('fetched_at'))
-                if (now - fetched_at) < timedelta(hours=24) and 'data' in cached:
-                    return jsonify(cached['data'])
-            except Exception:
-                pass
-
-        # Fetch from Bitnodes
-        resp = requests.get('https://bitnodes.io/api/v1/snapshots/latest/', timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Write cache
-        with open(cache_file, 'w') as f:
-            json.dump({'fetched_at': now.isoformat(), 'data': data}, f)
-
-        return jsonify(data)
-    except Exception as e:
-        # On failure, try stale cache
-        cache_file = Path(__file__).parent / 'data' / 'nodes_latest_cache.json'
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    cached = json.load(f)
-                if 'data' in cached:
-                    return jsonify(cached['data'])
-            except Exception:
-                pass
-        # Fallback: return empty structure so UI can render without error
-        return jsonify({'nodes': {}}), 200
-
-@app.route('/api/market-structure')
-def market_structure():
-    try:
-        data_dir = Path(__file__).parent / 'data'
-        csv_path = data_dir / 'bitcoin_historical.csv'
-        if not csv_path.exists():
-            return jsonify({'error':'historical csv not found'}), 404
-
-        # Output cache (5 minutes)
-        cache_file = data_dir / 'market_structure_cache.json'
-        now = datetime.utcnow()
-        if cache_file.exists():
-            try:
-                cached = json.loads(cache_file.read_text())
-                ts = datetime.fromisoformat(cached.get('fetched_at'))
-                if (now - ts) < timedelta(minutes=5) and 'metrics' in cached:
-                    return jsonify(cached['metrics'])
-            except Exception:
-                pass
-
-        dates, closes = _read_prices_from_csv(csv_path)
-        if len(closes) < 210:
-            return jsonify({'error':'not enough data'}), 400
-
-        # Sort by date just in case
-        combined = sorted(zip(dates, closes), key=lambda x: x[0])
-        dates = [d for d,_ in combined]
-        closes = [c for _,c in combined]
-
-        last_close = closes[-1]
-
-        # Spot price (GBP), fallback to last close
-        spot = _get_spot_price_gbp_cached(data_dir) or last_close
-
-        # Daily returns
-        rets = []
-        for i in range(1, len(closes)):
-            try:
-                rets.append((closes[i]/closes[i-1]) - 1.0)
-            except ZeroDivisionError:
-                rets.append(0.0)
-
-        # Volatility (annualized) over last 30/90 trading days
-        def ann_vol(window):
-            if len(rets) < window:
-                return None
-            window_rets = rets[-window:]
-            mean = sum(window_rets)/len(window_rets)
-            var = sum((r-mean)**2 for r in window_rets)/(len(window_rets)-1)
-            std = math.sqrt(var)
-            return std * math.sqrt(365) * 100.0
-
-        vol_30 = ann_vol(30)
-        vol_90 = ann_vol(90)
-
-        # ATH drawdown
-        ath = max(closes)
-        drawdown_pct = ((spot - ath)/ath) * 100.0
-
-        # Percent of days above current spot
-        days_above = sum(1 for c in closes if c > spot)
-        pct_days_above = (days_above/len(closes)) * 100.0
-
-        # 200D SMA and Mayer Multiple
-        sma200 = sum(closes[-200:]) / 200.0
-        mayer = spot / sma200
-        sma_dist_pct = ((spot - sma200)/sma200) * 100.0
-
-        # Cycle windows (approximate last 4 years)
-        window_days = 365 * 4
-        start_idx = max(0, len(closes) - window_days)
-        closes_4y = closes[start_idx:]
-        dates_4y = dates[start_idx:]
-        if closes_4y:
-            max_idx = max(range(len(closes_4y)), key=lambda i: closes_4y[i])
-            min_idx = min(range(len(closes_4y)), key=lambda i: closes_4y[i])
-            days_since_cycle_top = (dates[-1] - dates_4y[max_idx]).days
-            days_since_cycle_bottom = (dates[-1] - dates_4y[min_idx]).days
-        else:
-            days_since_cycle_top = None
-            days_since_cycle_bottom = None
-
-        metrics = {
-            'spot_gbp': round(spot, 2),
-            'ath_gbp': round(ath, 2),
-            'drawdown_from_ath_pct': round(drawdown_pct, 2),
-            'volatility_30d_annualized_pct': round(vol_30, 2) if vol_30 is not None else None,
-            'volatility_90d_annualized_pct': round(vol_90, 2) if vol_90 is not None else None,
-            'pct_days_above_current_pct': round(pct_days_above, 2),
-            'sma200_gbp': round(sma200, 2),
-            'mayer_multiple': round(mayer, 3),
-            'sma200_distance_pct': round(sma_dist_pct, 2),
-            'days_since_cycle_top': days_since_cycle_top,
-            'days_since_cycle_bottom': days_since_cycle_bottom,
-            'as_of_date': dates[-1].strftime('%Y-%m-%d'),
-        }
-
-        cache_file.write_text(json.dumps({'fetched_at': now.isoformat(), 'metrics': metrics}))
-        return jsonify(metrics)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-def _cached_json(path: Path, max_age: timedelta) -> Optional[dict]:
-    if not path.exists():
-        return None
-    try:
-        raw = json.loads(path.read_text())
-        ts = datetime.fromisoformat(raw.get('fetched_at'))
-        if datetime.utcnow() - ts < max_age and 'data' in raw:
-            return raw['data']
-    except Exception:
-        return None
-    return None
-
-def _write_cache(path: Path, data: dict):
-    try:
-        path.write_text(json.dumps({'fetched_at': datetime.utcnow().isoformat(), 'data': data}))
-    except Exception:
-        pass
-
-def _get_gbp_per_usd(cache_dir: Path) -> Optional[float]:
-    cache_file = cache_dir / 'fx_usdgbp_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=6))
-    if cached and 'gbp_per_usd' in cached:
-        try:
-            return float(cached['gbp_per_usd'])
-        except Exception:
-            pass
-    try:
-        r = requests.get('https://api.exchangerate.host/latest', params={'base':'USD','symbols':'GBP'}, timeout=15)
-        r.raise_for_status()
-        j = r.json()
-        rate = float(j['rates']['GBP'])
-        _write_cache(cache_file, {'gbp_per_usd': rate})
-        return rate
-    except Exception:
-        return None
-
-@app.route('/api/tip')
-def tip_height():
-    """Lightweight endpoint for the header block-height pill. Cached 30s."""
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'tip_height_cache.json'
-        now = datetime.utcnow()
-        # Reuse the existing tip_height_cache with a tighter staleness window
-        if cache_file.exists():
-            try:
-                cached = json.loads(cache_file.read_text())
-                ts = datetime.fromisoformat(cached.get('fetched_at'))
-                if (now - ts) < timedelta(seconds=30):
-                    data = cached.get('data') or {}
-                    h = data.get('height') if isinstance(data, dict) else None
-                    if isinstance(h, int):
-                        return jsonify({'height': h})
-            except Exception:
-                pass
-        try:
-            r = requests.get('https://mempool.space/api/blocks/tip/height', timeout=10)
-            r.raise_for_status()
-            height = int(r.text.strip())
-            cache_file.write_text(json.dumps({'fetched_at': now.isoformat(), 'data': {'height': height}}))
-            return jsonify({'height': height})
-        except Exception:
-            # Stale fallback
-            if cache_file.exists():
-                try:
-                    cached = json.loads(cache_file.read_text())
-                    data = cached.get('data') or {}
-                    h = data.get('height') if isinstance(data, dict) else None
-                    if isinstance(h, int):
-                        return jsonify({'height': h})
-                except Exception:
-                    pass
-            return jsonify({'height': None}), 200
-    except Exception:
-        return jsonify({'height': None}), 200
-
-@app.route('/api/onchain-supply')
-def onchain_supply():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        out_cache = cache_dir / 'onchain_supply_cache.json'
-
-        cached = _cached_json(out_cache, timedelta(minutes=10))
-        if cached:
-            return jsonify(cached)
-
-        # 1) Current height via mempool.space
-        height_cache = cache_dir / 'tip_height_cache.json'
-        height = None
-        cached_height = _cached_json(height_cache, timedelta(minutes=5))
-        if cached_height and isinstance(cached_height.get('height'), int):
-            height = cached_height['height']
-        else:
-            r = requests.get('https://mempool.space/api/blocks/tip/height', timeout=15)
-            r.raise_for_status()
-            height = int(r.text.strip())
-            _write_cache(height_cache, {'height': height})
-
-        # 2) Halving details
-        HALVING_INTERVAL = 210_000
-        epoch = height // HALVING_INTERVAL
-        next_halving_height = (epoch + 1) * HALVING_INTERVAL
-        blocks_to_halving = max(0, next_halving_height - height)
-        # Estimate using 10 minutes per block
-        minutes_to_halving = blocks_to_halving * 10
-        eta_utc = (datetime.utcnow() + timedelta(minutes=minutes_to_halving)).isoformat()
-        # Current subsidy (BTC)
-        current_subsidy = 50.0 / (2 ** epoch)
-        blocks_per_day = 144
-        annual_issuance_btc = current_subsidy * blocks_per_day * 365
-
-        # 3) Circulating / max supply via CoinGecko
-        cg_cache = cache_dir / 'cg_supply_cache.json'
-        cg = _cached_json(cg_cache, timedelta(minutes=10))
-        if not cg:
-            cg_resp = requests.get('https://api.coingecko.com/api/v3/coins/bitcoin', params={'localization':'false','tickers':'false','community_data':'false','developer_data':'false','sparkline':'false'}, timeout=20)
-            cg_resp.raise_for_status()
-            j = cg_resp.json()
-            market = j.get('market_data', {})
-            cg = {
-                'circulating_supply': market.get('circulating_supply'),
-                'max_supply': market.get('max_supply') or 21_000_000,
-            }
-            _write_cache(cg_cache, cg)
-
-        circ = float(cg.get('circulating_supply') or 0)
-        max_supply = float(cg.get('max_supply') or 21_000_000)
-        circ_pct = (circ / max_supply) * 100.0 if max_supply else None
-
-        payload = {
-            'height': height,
-            'epoch': epoch,
-            'next_halving_height': next_halving_height,
-            'blocks_to_halving': blocks_to_halving,
-            'minutes_to_halving': minutes_to_halving,
-            'eta_utc': eta_utc,
-            'current_subsidy_btc': round(current_subsidy, 8),
-            'annual_issuance_btc': round(annual_issuance_btc, 2),
-            'circulating_supply': round(circ, 0) if circ else None,
-            'max_supply': round(max_supply, 0) if max_supply else None,
-            'circulating_pct_of_max': round(circ_pct, 2) if circ_pct is not None else None,
-        }
-
-        _write_cache(out_cache, payload)
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-def _bc_chart(chart: str, timespan: str, cache_dir: Path, max_age_min=10) -> Optional[dict]:
-    cache_file = cache_dir / f'bc_{chart}_{timespan}.json'
-    cached = _cached_json(cache_file, timedelta(minutes=max_age_min))
-    if cached:
-        return cached
-    url = f'https://api.blockchain.info/charts/{chart}'
-    r = requests.get(url, params={'timespan': timespan, 'format': 'json', 'cors': 'true'}, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-    _write_cache(cache_file, data)
-    return data
-
-def _moving_average(series, window: int):
-    if not series or window <= 1:
-        return series
-    out = []
-    acc = 0.0
-    q = []
-    for v in series:
-        q.append(v)
-        acc += v
-        if len(q) > window:
-            acc -= q.pop(0)
-        out.append(acc / len(q))
-    return out
-
-@app.route('/api/miner-economics')
-def miner_economics():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        # Pull charts (10 min cache)
-        hr = _bc_chart('hash-rate', '1year', cache_dir, 10)
-        rev = _bc_chart('miners-revenue', '1year', cache_dir, 10)
-        fees = _bc_chart('transaction-fees-usd', '1year', cache_dir, 10)
-
-        # Extract y series aligned by date
-        def to_map(obj):
-            vals = obj.get('values', []) if obj else []
-            return {int(pt.get('x')): float(pt.get('y')) for pt in vals if 'x' in pt and 'y' in pt}
-
-        hr_map = to_map(hr)
-        rev_map = to_map(rev)
-        fees_map = to_map(fees)
-
-        # Build sorted date list present in hashrate
-        dates = sorted(hr_map.keys())
-        hr_series = [hr_map[d] for d in dates]
-        hr_ma7 = _moving_average(hr_series, 7)
-
-        latest_date = dates[-1] if dates else None
-        latest_hr_ma7 = hr_ma7[-1] if hr_ma7 else None
-        latest_rev = None
-        latest_fees = None
-        if latest_date:
-            # Select closest date available in revenue/fees not exceeding latest_date
-            def latest_not_after(m):
-                ks = [k for k in m.keys() if k <= latest_date]
-                return m[max(ks)] if ks else None
-            latest_rev = latest_not_after(rev_map)
-            latest_fees = latest_not_after(fees_map)
-
-        fees_pct = None
-        if latest_rev and latest_rev != 0 and latest_fees is not None:
-            fees_pct = (latest_fees / latest_rev) * 100.0
-
-        payload = {
-            'hashrate_7d_avg': round(latest_hr_ma7, 2) if latest_hr_ma7 is not None else None,
-            'miners_revenue_usd': round(latest_rev, 0) if latest_rev is not None else None,
-            'fees_usd': round(latest_fees, 0) if latest_fees is not None else None,
-            'fees_pct_of_revenue': round(fees_pct, 2) if fees_pct is not None else None,
-        }
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/fx-rate')
-def fx_rate():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        rate = _get_gbp_per_usd(cache_dir)
-        return jsonify({'gbp_per_usd': rate})
-    except Exception:
-        # Fallback conservative
-        return jsonify({'gbp_per_usd': 0.78}), 200
-
-@app.route('/api/macro-context')
-def macro_context():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'macro_context_cache.json'
-        cached = _cached_json(cache_file, timedelta(hours=6))
-        if cached:
-            return jsonify(cached)
-
-        # Prefer frankfurter.app timeseries (robust free source)
-        end = datetime.utcnow().date()
-        start_30 = end - timedelta(days=30)
-        start_365 = end - timedelta(days=365)
-        def ff_series(start_date):
-            url = f'https://api.frankfurter.app/{start_date.isoformat()}..{end.isoformat()}'
-            try:
-                r = requests.get(url, params={'from': 'USD', 'to': 'GBP'}, timeout=20)
-                if not r.ok:
-                    return None
-                j = r.json()
-                rates = j.get('rates', {})
-                if not rates:
-                    return None
-                # sorted by date
-                dates_sorted = sorted(rates.keys())
-                return [float(rates[d]['GBP']) for d in dates_sorted]
-            except Exception:
-                return None
-
-        series_30 = ff_series(start_30)
-        series_1y = ff_series(start_365)
-
-        def pct_change_from_series(series):
-            if not series or len(series) < 2:
-                return None
-            first, last = series[0], series[-1]
-            try:
-                return ((last/first) - 1.0) * 100.0
-            except Exception:
-                return None
-
-        change_30d = pct_change_from_series(series_30)
-        change_1y = pct_change_from_series(series_1y)
-
-        # Spot from frankfurter last rate if available, else helper
-        if series_1y and len(series_1y) > 0:
-            gbp_per_usd = series_1y[-1]
-        else:
-            gbp_per_usd = _get_gbp_per_usd(cache_dir) or 0.78
-
-        # 1y high/low and percentile position
-        one_y_high = max(series_1y) if series_1y else None
-        one_y_low = min(series_1y) if series_1y else None
-        pct_in_range = None
-        if series_1y and one_y_high is not None and one_y_low is not None and one_y_high != one_y_low:
-            pct_in_range = ((gbp_per_usd - one_y_low) / (one_y_high - one_y_low)) * 100.0
-
-        # Latest CPI YoY from World Bank (annual %). Cache separately for 24h within macro cache
-        wb_cache = cache_dir / 'macro_cpi_cache.json'
-        cpi_cached = _cached_json(wb_cache, timedelta(hours=24))
-        if cpi_cached is None:
-            def wb_latest(country):
-                url = f'https://api.worldbank.org/v2/country/{country}/indicator/FP.CPI.TOTL.ZG'
-                try:
-                    r = requests.get(url, params={'format':'json','per_page':1,'date':'2018:2035'}, timeout=20)
-                    if not r.ok:
-                        return None, None
-                except Exception:
-                    return None, None
-                j = r.json()
-                if isinstance(j, list) and len(j) == 2 and j[1]:
-                    entry = j[1][0]
-                    return entry.get('date'), entry.get('value')
-                return None, None
-            uk_date, uk_cpi = wb_latest('GBR')
-            us_date, us_cpi = wb_latest('USA')
-            cpi_data = {
-                'uk_cpi_yoy_date': uk_date,
-                'uk_cpi_yoy_pct': uk_cpi,
-                'us_cpi_yoy_date': us_date,
-                'us_cpi_yoy_pct': us_cpi,
-            }
-            _write_cache(wb_cache, cpi_data)
-        else:
-            cpi_data = cpi_cached
-
-        data = {
-            'gbp_per_usd': round(gbp_per_usd, 6),
-            'usd_per_gbp': round(1.0/gbp_per_usd, 6) if gbp_per_usd else None,
-            'gbp_per_usd_change_30d_pct': round(change_30d, 2) if change_30d is not None else None,
-            'gbp_per_usd_change_1y_pct': round(change_1y, 2) if change_1y is not None else None,
-            'gbp_per_usd_1y_high': round(one_y_high, 4) if one_y_high is not None else None,
-            'gbp_per_usd_1y_low': round(one_y_low, 4) if one_y_low is not None else None,
-            'gbp_per_usd_position_in_1y_range_pct': round(pct_in_range, 2) if pct_in_range is not None else None,
-        }
-        # Merge CPI fields only if available
-        if cpi_data:
-            data.update({
-                'uk_cpi_yoy_date': cpi_data.get('uk_cpi_yoy_date'),
-                'uk_cpi_yoy_pct': cpi_data.get('uk_cpi_yoy_pct'),
-                'us_cpi_yoy_date': cpi_data.get('us_cpi_yoy_date'),
-                'us_cpi_yoy_pct': cpi_data.get('us_cpi_yoy_pct'),
-            })
-        _write_cache(cache_file, data)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/adoption-usage')
-def adoption_usage():
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'adoption_usage_cache.json'
-        cached = _cached_json(cache_file, timedelta(minutes=10))
-        if cached:
-            return jsonify(cached)
-
-        # Active addresses and tx/day (30d window for recency)
-        aa = _bc_chart('n-unique-addresses', '30days', cache_dir, 10)
-        txd = _bc_chart('n-transactions', '30days', cache_dir, 10)
-        fees_usd = _bc_chart('transaction-fees-usd', '30days', cache_dir, 10)
-
-        def latest_value(chart_obj):
-            vals = chart_obj.get('values', []) if chart_obj else []
-            return float(vals[-1]['y']) if vals else None
-
-        active_addresses = latest_value(aa)
-        tx_per_day = latest_value(txd)
-        fees_usd_latest = latest_value(fees_usd)
-        avg_fee_per_tx_usd = None
-        if tx_per_day and tx_per_day != 0 and fees_usd_latest is not None:
-            avg_fee_per_tx_usd = fees_usd_latest / tx_per_day
-
-        # Lightning capacity
-        ln_capacity_btc = None
-        try:
-            # Primary: v1 lightning stats
-            r = requests.get('https://mempool.space/api/v1/lightning/stats', timeout=15)
-            if r.ok:
-                j = r.json()
-                cap_sats = j.get('capacity')
-                if isinstance(cap_sats, (int, float)):
-                    ln_capacity_btc = round(float(cap_sats) / 100_000_000.0, 2)
-            if ln_capacity_btc is None:
-                # Fallback: v2
-                r2 = requests.get('https://mempool.space/api/v2/lightning/statistics', timeout=15)
-                if r2.ok:
-                    j2 = r2.json()
-                    cap_sats2 = j2.get('total_capacity')
-                    if isinstance(cap_sats2, (int, float)):
-                        ln_capacity_btc = round(float(cap_sats2) / 100_000_000.0, 2)
-        except Exception:
-            pass
-
-        data = {
-            'active_addresses': round(active_addresses, 0) if active_addresses is not None else None,
-            'transactions_per_day': round(tx_per_day, 0) if tx_per_day is not None else None,
-            'avg_fee_per_tx_usd': round(avg_fee_per_tx_usd, 2) if avg_fee_per_tx_usd is not None else None,
-            'ln_capacity_btc': ln_capacity_btc,
-        }
-        _write_cache(cache_file, data)
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-def _downsample(values, max_points=60):
-    if not values or len(values) <= max_points:
-        return values
-    step = max(1, len(values) // max_points)
-    out = [values[i] for i in range(0, len(values), step)]
-    if out and out[-1] is not values[-1]:
-        out.append(values[-1])
-    return out
-
-@app.route('/api/sparkline/<key>')
-def sparkline(key):
-    """Return a small array of y-values for a given sparkline key.
-    Keys: price, hashrate, active-addresses, transactions, fx-gbpusd."""
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / f'sparkline_{key}.json'
-        now = datetime.utcnow()
-        cached = _cached_json(cache_file, timedelta(minutes=15))
-        if cached and 'values' in cached:
-            return jsonify(cached)
-
-        values = None
-        if key == 'price':
-            # CoinGecko market_chart for 30d, USD
-            r = requests.get(
-                'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
-                params={'vs_currency':'usd','days':'30','interval':'daily'},
-                timeout=20,
-            )
-            r.raise_for_status()
-            j = r.json()
-            prices = j.get('prices', [])
-            values = [float(p[1]) for p in prices if isinstance(p, list) and len(p) >= 2]
-        elif key in ('hashrate', 'active-addresses', 'transactions'):
-            chart_map = {
-                'hashrate': 'hash-rate',
-                'active-addresses': 'n-unique-addresses',
-                'transactions': 'n-transactions',
-            }
-            data = _bc_chart(chart_map[key], '30days', cache_dir, 15)
-            vals = (data or {}).get('values', [])
-            values = [float(pt['y']) for pt in vals if 'y' in pt]
-        elif key == 'fx-gbpusd':
-            end = now.date()
-            start = end - timedelta(days=30)
-            url = f'https://api.frankfurter.app/{start.isoformat()}..{end.isoformat()}'
-            r = requests.get(url, params={'from':'USD','to':'GBP'}, timeout=15)
-            r.raise_for_status()
-            rates = (r.json() or {}).get('rates', {})
-            keys_sorted = sorted(rates.keys())
-            values = [float(rates[d]['GBP']) for d in keys_sorted]
-        else:
-            return jsonify({'error': f'unknown sparkline key: {key}'}), 404
-
-        values = _downsample(values, 60) if values else []
-        payload = {'values': values}
-        _write_cache(cache_file, payload)
-        return jsonify(payload)
-    except Exception as e:
-        # Try stale cache
-        try:
-            cache_file = Path(__file__).parent / 'data' / f'sparkline_{key}.json'
-            if cache_file.exists():
-                cached = json.loads(cache_file.read_text())
-                d = cached.get('data') or {}
-                if 'values' in d:
-                    return jsonify(d)
-        except Exception:
-            pass
-        return jsonify({'values': [], 'error': str(e)}), 200
-
-@app.route('/api/bitcoin-historical/<range>')
-def get_historical_data(range):
-    """Historical BTC/GBP prices for the price page chart.
-
-    Short ranges (1M/3M/6M/1Y): CoinGecko market_chart in GBP.
-    ALL: merged CSV + recent CoinGecko via _load_btc_history_gbp, because
-    CoinGecko's free API caps `days=max` for non-Pro users.
-    """
-    range_to_days = {
-        '1M': '30',
-        '3M': '90',
-        '6M': '180',
-        '1Y': '365',
-    }
-    cache_dir = Path(__file__).parent / 'data'
-    cache_dir.mkdir(parents=True, exist_ok=True)
-
-    if range == 'ALL':
-        try:
-            hist = _load_btc_history_gbp(cache_dir)
-            if not hist:
-                return jsonify({'error': 'history unavailable'}), 502
-            prices = [[int(time.mktime(d.timetuple()) * 1000), p] for d, p in hist]
-            return jsonify({'prices': prices, 'source': 'csv+coingecko'})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 502
-
-    days = range_to_days.get(range)
-    if days is None:
-        return jsonify({'error': f'Invalid range: {range}'}), 400
-
-    cache_file = cache_dir / f'historical_{range}.json'
-    ttl = timedelta(minutes=15) if range in ('1M', '3M', '6M') else timedelta(hours=6)
-    cached = _cached_json(cache_file, ttl)
-    if cached and 'prices' in cached:
-        return jsonify(cached)
-
-    try:
-        r = requests.get(
-            'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
-            params={'vs_currency': 'gbp', 'days': days, 'interval': 'daily'},
-            timeout=20,
-        )
-        r.raise_for_status()
-        j = r.json()
-        prices = []
-        for pt in j.get('prices', []):
-            if isinstance(pt, list) and len(pt) >= 2:
-                try:
-                    prices.append([int(pt[0]), float(pt[1])])
-                except Exception:
-                    continue
-        if not prices:
-            raise RuntimeError('empty prices from upstream')
-        payload = {'prices': prices, 'source': 'coingecko'}
-        _write_cache(cache_file, payload)
-        return jsonify(payload)
-    except Exception as e:
-        # Stale cache fallback
-        if cache_file.exists():
-            try:
-                cached = json.loads(cache_file.read_text())
-                data = cached.get('data') or {}
-                if 'prices' in data:
-                    return jsonify(data)
-            except Exception:
-                pass
-        return jsonify({'error': str(e)}), 502
-
 # --------------------------------------------------------------------------- #
-# Fiat debasement — /debasement
+# API sections, imported on first use
 # --------------------------------------------------------------------------- #
 
-def _fetch_fred_csv(series_id: str, cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Fetch a monthly FRED series as CSV. Cached 24h."""
-    cache_file = cache_dir / f'fred_{series_id.lower()}_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'series' in cached:
-        out = []
-        for d, v in cached['series']:
-            try:
-                out.append((datetime.fromisoformat(d), float(v)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            f'https://fred.stlouisfed.org/graph/fredgraph.csv',
-            params={'id': series_id},
-            timeout=30,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return []
-        result: List[Tuple[datetime, float]] = []
-        lines = r.text.strip().split('\n')
-        # Header: observation_date,<SERIES_ID>
-        for line in lines[1:]:
-            parts = line.split(',')
-            if len(parts) < 2:
-                continue
-            try:
-                d = datetime.strptime(parts[0].strip(), '%Y-%m-%d')
-                val = float(parts[1].strip())
-                result.append((d, val))
-            except Exception:
-                continue
-        if result:
-            _write_cache(cache_file, {'series': [[d.isoformat(), v] for d, v in result]})
-        return result
-    except Exception:
-        return []
-
-def _fetch_worldbank_indicator(country: str, indicator: str, cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Fetch annual values for a World Bank indicator (e.g. broad money
-    FM.LBL.BMNY.CN). Returned series uses Jan 1 of each reporting year as
-    the date. Cached 24h.
-    """
-    cache_file = cache_dir / f'wb_{country.lower()}_{indicator.lower().replace(".", "_")}_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'series' in cached:
-        out = []
-        for d, v in cached['series']:
-            try:
-                out.append((datetime.fromisoformat(d), float(v)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            f'https://api.worldbank.org/v2/country/{country}/indicator/{indicator}',
-            params={'format': 'json', 'per_page': 200, 'date': '1990:2030'},
-            timeout=30,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return []
-        j = r.json()
-        rows = j[1] if isinstance(j, list) and len(j) >= 2 and j[1] else []
-        result: List[Tuple[datetime, float]] = []
-        for entry in rows:
-            try:
-                val = entry.get('value')
-                if val is None:
-                    continue
-                year = int(entry['date'])
-                result.append((datetime(year, 1, 1), float(val)))
-            except Exception:
-                continue
-        result.sort(key=lambda x: x[0])
-        if result:
-            _write_cache(cache_file, {'series': [[d.isoformat(), v] for d, v in result]})
-        return result
-    except Exception:
-        return []
-
-def _fetch_ecb_m3(cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Fetch ECB BSI M3 monthly stocks (euro area). Cached 24h."""
-    cache_file = cache_dir / 'ecb_m3_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'series' in cached:
-        out = []
-        for d, v in cached['series']:
-            try:
-                out.append((datetime.fromisoformat(d), float(v)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            'https://data-api.ecb.europa.eu/service/data/BSI/M.U2.Y.V.M30.X.1.U2.2300.Z01.E',
-            params={'format': 'csvdata'},
-            timeout=30,
-            headers={'User-Agent': 'Mozilla/5.0', 'Accept': 'text/csv'},
-        )
-        if not r.ok:
-            return []
-        # CSV with TIME_PERIOD column (YYYY-MM) and OBS_VALUE column
-        lines = r.text.strip().split('\n')
-        header = lines[0].split(',')
-        try:
-            tp_idx = header.index('TIME_PERIOD')
-            val_idx = header.index('OBS_VALUE')
-        except ValueError:
-            return []
-        result: List[Tuple[datetime, float]] = []
-        for line in lines[1:]:
-            parts = line.split(',')
-            if len(parts) <= max(tp_idx, val_idx):
-                continue
-            try:
-                d = datetime.strptime(parts[tp_idx], '%Y-%m')
-                val = float(parts[val_idx])
-                result.append((d, val))
-            except Exception:
-                continue
-        if result:
-            _write_cache(cache_file, {'series': [[d.isoformat(), v] for d, v in result]})
-        return result
-    except Exception:
-        return []
-
-def _fetch_boe_m4(cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Fetch Bank of England M4 monthly level (LPMAUYM, GBP millions). Cached 24h."""
-    cache_file = cache_dir / 'boe_m4_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'series' in cached:
-        out = []
-        for d, v in cached['series']:
-            try:
-                out.append((datetime.fromisoformat(d), float(v)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            'https://www.bankofengland.co.uk/boeapps/database/_iadb-fromshowcolumns.asp',
-            params={
-                'csv.x': 'yes',
-                'Datefrom': '01/Jan/2008',
-                'Dateto': 'now',
-                'CSVF': 'TN',
-                'UsingCodes': 'Y',
-                'Filter': 'N',
-                'title': 'LPMAUYM',
-                'VPD': 'Y',
-                'VFD': 'N',
-                'CodeVer': 'new',
-                'SeriesCodes': 'LPMAUYM',
-            },
-            timeout=30,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return []
-        result: List[Tuple[datetime, float]] = []
-        lines = r.text.strip().split('\n')
-        # Header: DATE,LPMAUYM ; rows: "31 Jan 2008,1681358"
-        for line in lines[1:]:
-            parts = line.split(',')
-            if len(parts) < 2:
-                continue
-            try:
-                d = datetime.strptime(parts[0].strip(), '%d %b %Y')
-                val = float(parts[1].strip())
-                result.append((d, val))
-            except Exception:
-                continue
-        if result:
-            _write_cache(cache_file, {'series': [[d.isoformat(), v] for d, v in result]})
-        return result
-    except Exception:
-        return []
-
-def _fetch_uk_cpi_annual(cache_dir: Path) -> dict:
-    """Fetch UK CPI annual % rates from ONS (D7G7). Returns {year_int: rate_pct}.
-    Cached 24h."""
-    cache_file = cache_dir / 'ons_uk_cpi_annual_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'rates' in cached:
-        return {int(y): float(r) for y, r in cached['rates'].items()}
-    try:
-        r = requests.get(
-            'https://www.ons.gov.uk/economy/inflationandpriceindices/timeseries/d7g7/mm23/data',
-            timeout=20,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return {}
-        j = r.json()
-        out: dict = {}
-        for entry in j.get('years', []):
-            try:
-                out[int(entry['date'])] = float(entry['value'])
-            except Exception:
-                continue
-        if out:
-            _write_cache(cache_file, {'rates': {str(k): v for k, v in out.items()}})
-        return out
-    except Exception:
-        return {}
-
-# Halving epoch -> subsidy per block
-def _subsidy_for_block(block_height: int) -> float:
-    return 50.0 / (2 ** (block_height // 210_000)) if block_height < 210_000 * 33 else 0.0
-
-# Approximate cumulative BTC supply at a given date.
-# Uses 144 blocks/day from Jan 3, 2009 (genesis). Accurate to ~1-2% which is
-# fine for visualising the supply curve trend.
-def _btc_supply_at(date_dt: datetime) -> float:
-    GENESIS = datetime(2009, 1, 3)
-    if date_dt <= GENESIS:
-        return 0.0
-    days = (date_dt - GENESIS).days
-    block_height = days * 144
-    # Sum subsidy for each epoch up to block_height
-    HALVING = 210_000
-    supply = 0.0
-    block = 0
-    epoch = 0
-    while block < block_height:
-        epoch_end = (epoch + 1) * HALVING
-        subsidy = 50.0 / (2 ** epoch)
-        blocks_this_epoch = min(epoch_end, block_height) - block
-        supply += blocks_this_epoch * subsidy
-        block = epoch_end
-        epoch += 1
-        if epoch >= 33:
-            break
-    return supply
-
-def _monthly_dates(start: datetime, end: datetime) -> List[datetime]:
-    out = []
-    cursor = start.replace(day=1)
-    while cursor <= end:
-        out.append(cursor)
-        if cursor.month == 12:
-            cursor = cursor.replace(year=cursor.year + 1, month=1)
-        else:
-            cursor = cursor.replace(month=cursor.month + 1)
-    return out
-
-def _index_to_base(series: List[Tuple[datetime, float]], base_dt: datetime, sample_dates: List[datetime]) -> List[Optional[float]]:
-    """Resample a series to sample_dates and rebase so the value at base_dt is 100."""
-    if not series:
-        return [None] * len(sample_dates)
-    base_value = _series_value_at_or_before(series, base_dt)
-    if not base_value:
-        # Try first value if base is before series start
-        base_value = series[0][1] if series else None
-    if not base_value:
-        return [None] * len(sample_dates)
-    out: List[Optional[float]] = []
-    for d in sample_dates:
-        v = _series_value_at_or_before(series, d)
-        out.append(round(v / base_value * 100.0, 2) if v else None)
-    return out
-
-@app.route('/api/debasement')
-def api_debasement():
-    """Combined fiat-debasement payload: money supply race, GBP purchasing
-    power decay, BTC supply curve, real BTC USD price."""
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'debasement_cache.json'
-        cached = _cached_json(cache_file, timedelta(hours=12))
-        if cached:
-            return jsonify(cached)
-
-        BASE_DT = datetime(2009, 1, 1)  # rebase year
-        END_DT = datetime.utcnow()
-        sample_dates = _monthly_dates(BASE_DT, END_DT)
-
-        # --- Money supply series ---
-        us_m2_full  = _fetch_fred_csv('M2SL', cache_dir)
-        # Fallback when FRED is unreachable (TLS quirks on some networks):
-        # World Bank annual "Broad money (current LCU)" for the USA.
-        us_m2_source = 'FRED M2SL'
-        if not us_m2_full:
-            us_m2_full = _fetch_worldbank_indicator('USA', 'FM.LBL.BMNY.CN', cache_dir)
-            if us_m2_full:
-                us_m2_source = 'World Bank FM.LBL.BMNY.CN (annual)'
-
-        eu_m3_full  = _fetch_ecb_m3(cache_dir)
-        uk_m4_full  = _fetch_boe_m4(cache_dir)
-        if not uk_m4_full:
-            uk_m4_full = _fetch_worldbank_indicator('GBR', 'FM.LBL.BMNY.CN', cache_dir)
-
-        us_m2_idx = _index_to_base(us_m2_full, BASE_DT, sample_dates)
-        eu_m3_idx = _index_to_base(eu_m3_full, BASE_DT, sample_dates)
-        uk_m4_idx = _index_to_base(uk_m4_full, BASE_DT, sample_dates)
-
-        # BTC supply: emit raw absolute values plus % of 21M cap. Skip
-        # "index to 2009" because supply was effectively zero then and the
-        # resulting percentage would be meaningless.
-        btc_supply_series = [_btc_supply_at(d) for d in sample_dates]
-        btc_supply_abs_m = [round(v / 1_000_000.0, 4) if v else None for v in btc_supply_series]
-        btc_supply_pct_cap = [round(v / 21_000_000.0 * 100.0, 2) if v else None for v in btc_supply_series]
-
-        # --- Latest values for headline stats ---
-        def latest(series: List[Tuple[datetime, float]]) -> Optional[Tuple[datetime, float]]:
-            return series[-1] if series else None
-        def base(series: List[Tuple[datetime, float]]) -> Optional[float]:
-            return _series_value_at_or_before(series, BASE_DT) or (series[0][1] if series else None)
-
-        def growth_pct(series: List[Tuple[datetime, float]]) -> Optional[float]:
-            lo = base(series)
-            hi = latest(series)
-            if lo and hi and lo > 0:
-                return round((hi[1] / lo - 1.0) * 100.0, 1)
-            return None
-
-        # --- UK CPI: compound annual rates from 2009 to today ---
-        cpi_rates = _fetch_uk_cpi_annual(cache_dir)
-        current_year = END_DT.year
-        gbp_power_series = []
-        cumulative = 1.0
-        for year in range(BASE_DT.year, current_year + 1):
-            rate = cpi_rates.get(year)
-            if rate is None and year == current_year:
-                # Final year not yet released; carry forward last
-                rate = cpi_rates.get(year - 1, 0.0)
-            if rate is None:
-                rate = 0.0
-            cumulative *= (1 + rate / 100.0)
-            gbp_power_series.append({
-                'year': year,
-                'price_multiplier': round(cumulative, 4),
-                'pound_buys': round(1.0 / cumulative, 4),
-            })
-        gbp_purchasing_power_now = round(1.0 / cumulative, 4) if cumulative else None
-
-        # --- Real BTC USD price (nominal / US CPI) ---
-        btc_usd = _load_btc_daily_usd_all(cache_dir)
-        real_btc_series = []
-        # Try FRED CPI; fall back to World Bank annual US CPI index
-        us_cpi = _fetch_fred_csv('CPIAUCSL', cache_dir)
-        if not us_cpi:
-            wb_cpi = _fetch_worldbank_indicator('USA', 'FP.CPI.TOTL', cache_dir)
-            us_cpi = wb_cpi
-        if btc_usd and us_cpi:
-            base_cpi = _series_value_at_or_before(us_cpi, BASE_DT)
-            if base_cpi:
-                btc_monthly = []
-                for d in sample_dates:
-                    p = _series_value_at_or_before(btc_usd, d)
-                    cpi = _series_value_at_or_before(us_cpi, d)
-                    if p and cpi:
-                        real = p * (base_cpi / cpi)
-                        btc_monthly.append([d.strftime('%Y-%m-%d'), round(p, 2), round(real, 2)])
-                real_btc_series = btc_monthly
-
-        # --- Build response ---
-        race_dates = [d.strftime('%Y-%m-%d') for d in sample_dates]
-
-        usd_m2_growth = growth_pct(us_m2_full)
-        eur_m3_growth = growth_pct(eu_m3_full)
-        gbp_m4_growth = growth_pct(uk_m4_full)
-        btc_supply_now = btc_supply_series[-1] if btc_supply_series else None
-        btc_supply_pct_now = round(btc_supply_now / 21_000_000.0 * 100.0, 2) if btc_supply_now else None
-
-        payload = {
-            'base_date': BASE_DT.strftime('%Y-%m-%d'),
-            'as_of': END_DT.strftime('%Y-%m-%d'),
-            'race': {
-                'dates': race_dates,
-                'usd_m2': us_m2_idx,
-                'eur_m3': eu_m3_idx,
-                'gbp_m4': uk_m4_idx,
-            },
-            'btc_supply': {
-                'dates': race_dates,
-                'absolute_millions': btc_supply_abs_m,
-                'pct_of_cap': btc_supply_pct_cap,
-                'cap_millions': 21,
-            },
-            'gbp_purchasing_power': {
-                'series': gbp_power_series,
-                'now': gbp_purchasing_power_now,  # what £1 from 2009 buys today
-            },
-            'real_btc': {
-                'series': real_btc_series,  # [date, nominal_usd, real_usd_2009]
-            },
-            'stats': {
-                'usd_m2_growth_pct_since_2009': usd_m2_growth,
-                'eur_m3_growth_pct_since_2009': eur_m3_growth,
-                'gbp_m4_growth_pct_since_2009': gbp_m4_growth,
-                'btc_supply_now': round(btc_supply_now, 0) if btc_supply_now else None,
-                'btc_supply_pct_of_cap_now': btc_supply_pct_now,
-                'gbp_purchasing_power_2009_in_today': gbp_purchasing_power_now,
-            },
-            'sources': {
-                'usd_m2': us_m2_source,
-                'eur_m3': 'ECB BSI M3 (U2)',
-                'gbp_m4': 'Bank of England LPMAUYM',
-                'uk_cpi': 'ONS D7G7 (annual % CPI)',
-                'us_cpi': 'FRED CPIAUCSL',
-                'btc_supply': 'Derived from halving schedule',
-                'btc_usd': 'blockchain.info market-price',
-            },
-        }
-        _write_cache(cache_file, payload)
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# --------------------------------------------------------------------------- #
-# Cycle dashboard — /cycles
-# --------------------------------------------------------------------------- #
-
-# Bitcoin halving dates. Block-number based; calendar dates verified vs known
-# blocks 210000 / 420000 / 630000 / 840000. The fifth entry is the projected
-# next halving derived from /api/onchain-supply at request time.
-HALVING_DATES = [
-    ('Cycle 1', datetime(2012, 11, 28)),  # block 210,000
-    ('Cycle 2', datetime(2016, 7,  9)),   # block 420,000
-    ('Cycle 3', datetime(2020, 5,  11)),  # block 630,000
-    ('Cycle 4', datetime(2024, 4,  19)),  # block 840,000
+class LazyView:
+    """View that imports its section module on the first request it serves,
+    so a cold instance rendering a page never loads `requests` or the
+    analytics code (Flask's "lazily loading views" pattern)."""
+
+    def __init__(self, import_name: str):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+# (rule, 'module.view'); the endpoint name is the view function's name.
+API_ROUTES = [
+    # live.py: polled by every page
+    ('/api/tip', 'live.tip_height'),
+    ('/api/fx-rate', 'live.fx_rate'),
+    ('/api/upstream-status', 'live.upstream_status'),
+    ('/api/series-status', 'live.series_status'),
+    # stream.py: server-sent tip and spot updates
+    ('/api/stream', 'stream.event_stream'),
+    # datasets.py: refresh caches ahead of expiry, for a scheduler
+    ('/api/warm', 'datasets.warm_view'),
+    # metrics.py: home and /bitcoin-metrics
+    ('/api/nodes-latest', 'metrics.nodes_latest'),
+    ('/api/market-structure', 'metrics.market_structure'),
+    ('/api/price-percentile', 'metrics.price_percentile'),
+    ('/api/rolling', 'metrics.rolling'),
+    ('/api/onchain-supply', 'metrics.onchain_supply'),
+    ('/api/miner-economics', 'metrics.miner_economics'),
+    ('/api/macro-context', 'metrics.macro_context'),
+    ('/api/adoption-usage', 'metrics.adoption_usage'),
+    ('/api/sparkline/<key>', 'metrics.sparkline'),
+    # price.py: /bitcoin-price
+    ('/api/bitcoin-historical/<range>', 'price.get_historical_data'),
+    # debasement.py, cycles.py, priced_in.py
+    ('/api/debasement', 'debasement.api_debasement'),
+    ('/api/cycle-data', 'cycles.api_cycle_data'),
+    ('/api/priced-in', 'priced_in.api_priced_in'),
+    ('/api/priced-in/history', 'priced_in.api_priced_in_history'),
+    ('/api/dca', 'priced_in.api_dca'),
+    ('/api/holding-returns', 'priced_in.api_holding_returns'),
+    ('/api/backtest', 'backtest.api_backtest'),
+    # correlations.py
+    ('/api/correlations', 'correlations.api_correlations'),
+    # models.py
+    ('/api/model/power-law', 'models.api_power_law'),
 ]
 
-def _load_btc_daily_usd_all(cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Daily BTC/USD back to 2009 via blockchain.info market-price (sampled=false).
-    Cached 24h."""
-    cache_file = cache_dir / 'btc_daily_usd_all_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'prices' in cached:
-        out: List[Tuple[datetime, float]] = []
-        for d, p in cached['prices']:
-            try:
-                out.append((datetime.fromisoformat(d), float(p)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            'https://api.blockchain.info/charts/market-price',
-            params={'timespan': 'all', 'sampled': 'false', 'format': 'json', 'cors': 'true'},
-            timeout=45,
-        )
-        r.raise_for_status()
-        j = r.json()
-        result: List[Tuple[datetime, float]] = []
-        for pt in j.get('values', []):
-            try:
-                d = datetime.utcfromtimestamp(int(pt['x'])).replace(hour=0, minute=0, second=0, microsecond=0)
-                v = float(pt['y'])
-                if v > 0:
-                    result.append((d, v))
-            except Exception:
-                continue
-        if result:
-            _write_cache(cache_file, {'prices': [[d.isoformat(), p] for d, p in result]})
-        return result
-    except Exception:
-        return []
-
-def _sma(values: List[Optional[float]], window: int) -> List[Optional[float]]:
-    """Simple moving average. Skips Nones at the window boundary."""
-    out: List[Optional[float]] = [None] * len(values)
-    if window <= 0 or window > len(values):
-        return out
-    s = 0.0
-    valid = 0
-    from collections import deque
-    q: 'deque' = deque()
-    for i, v in enumerate(values):
-        if v is None:
-            q.append(None)
-        else:
-            q.append(v)
-            s += v
-            valid += 1
-        if len(q) > window:
-            old = q.popleft()
-            if old is not None:
-                s -= old
-                valid -= 1
-        if len(q) == window and valid > 0:
-            out[i] = s / valid
-    return out
-
-def _downsample_xy(pairs: List[Tuple[float, float]], max_points: int = 600) -> List[Tuple[float, float]]:
-    """Even-stride downsample. Keeps the last point exactly."""
-    if not pairs or len(pairs) <= max_points:
-        return pairs
-    step = max(1, len(pairs) // max_points)
-    out = [pairs[i] for i in range(0, len(pairs), step)]
-    if out[-1] != pairs[-1]:
-        out.append(pairs[-1])
-    return out
-
-@app.route('/api/cycle-data')
-def api_cycle_data():
-    """Cycle dashboard payload: halving overlay, Pi cycle, 200-week SMA,
-    Mayer multiple, current cycle position."""
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'cycle_data_cache.json'
-        cached = _cached_json(cache_file, timedelta(hours=6))
-        if cached:
-            return jsonify(cached)
-
-        series = _load_btc_daily_usd_all(cache_dir)
-        if not series:
-            return jsonify({'error': 'history unavailable'}), 502
-
-        # Build a date -> price map for O(1) lookup later
-        date_to_price = {d.date(): p for d, p in series}
-        dates_sorted = [d for d, _ in series]
-        prices_sorted = [p for _, p in series]
-        last_date, last_price = series[-1]
-
-        # ---------- Halving overlay ----------
-        cycles_out = []
-        for i, (label, halving_dt) in enumerate(HALVING_DATES):
-            next_halving = HALVING_DATES[i + 1][1] if i + 1 < len(HALVING_DATES) else None
-            end_dt = next_halving if next_halving else last_date
-
-            # Find halving-day price (use first data point >= halving_dt)
-            start_price = None
-            for d, p in series:
-                if d >= halving_dt:
-                    start_price = p
-                    break
-            if not start_price:
-                continue
-
-            # Build (day_offset, pct_gain_x) series
-            cycle_pts: List[Tuple[float, float]] = []
-            for d, p in series:
-                if d < halving_dt:
-                    continue
-                if d > end_dt:
-                    break
-                day_offset = (d - halving_dt).days
-                cycle_pts.append((day_offset, p / start_price))
-
-            cycle_pts = _downsample_xy(cycle_pts, 400)
-
-            cycles_out.append({
-                'label': label,
-                'halving_date': halving_dt.strftime('%Y-%m-%d'),
-                'halving_price_usd': round(start_price, 2),
-                'is_current': i == len(HALVING_DATES) - 1,
-                'series': [[round(x, 1), round(y, 4)] for x, y in cycle_pts],
-            })
-
-        # ---------- Pi cycle (over last ~6 years, daily) ----------
-        recent_cutoff = last_date - timedelta(days=6 * 365 + 30)
-        # Index of first point in the recent window — use it as a lower bound
-        first_recent_idx = 0
-        for idx, d in enumerate(dates_sorted):
-            if d >= recent_cutoff:
-                first_recent_idx = idx
-                break
-
-        # Need 350 days of context before the recent window for the SMA to be valid
-        context_idx = max(0, first_recent_idx - 360)
-        ctx_dates = dates_sorted[context_idx:]
-        ctx_prices = prices_sorted[context_idx:]
-        ma111 = _sma(ctx_prices, 111)
-        ma350 = _sma(ctx_prices, 350)
-        ma350_x2 = [v * 2 if v is not None else None for v in ma350]
-
-        # Trim back to the recent window for the response
-        trim_offset = first_recent_idx - context_idx
-        recent_dates = ctx_dates[trim_offset:]
-        recent_prices = ctx_prices[trim_offset:]
-        ma111_r = ma111[trim_offset:]
-        ma350x2_r = ma350_x2[trim_offset:]
-
-        # Downsample the Pi cycle arrays (max ~600 points)
-        pi_pairs = list(zip(recent_dates, recent_prices, ma111_r, ma350x2_r))
-        if len(pi_pairs) > 800:
-            step = max(1, len(pi_pairs) // 800)
-            pi_pairs = [pi_pairs[i] for i in range(0, len(pi_pairs), step)] + [pi_pairs[-1]]
-
-        pi_payload = {
-            'dates':      [d.strftime('%Y-%m-%d') for d, _, _, _ in pi_pairs],
-            'price':      [round(p, 2) if p is not None else None for _, p, _, _ in pi_pairs],
-            'ma_111':     [round(v, 2) if v is not None else None for _, _, v, _ in pi_pairs],
-            'ma_350_x2':  [round(v, 2) if v is not None else None for _, _, _, v in pi_pairs],
-        }
-
-        # Latest Pi cycle status
-        latest_111 = next((v for v in reversed(ma111) if v is not None), None)
-        latest_350x2 = next((v for v in reversed(ma350_x2) if v is not None), None)
-        if latest_111 is not None and latest_350x2 is not None:
-            pi_status = {
-                'ma_111': round(latest_111, 2),
-                'ma_350_x2': round(latest_350x2, 2),
-                'crossed_above': latest_111 > latest_350x2,
-                'gap_pct': round(((latest_111 / latest_350x2) - 1.0) * 100.0, 2),
-            }
-        else:
-            pi_status = None
-
-        # ---------- 200-week SMA (=1400-day SMA) ----------
-        # Need 1400 days of context. Use the full series for the SMA, then trim to recent.
-        wma_window = 1400
-        ma_200w_full = _sma(prices_sorted, wma_window)
-        # Trim to recent ~4 years
-        wma_cutoff = last_date - timedelta(days=4 * 365 + 30)
-        wma_pairs = []
-        for d, p, w in zip(dates_sorted, prices_sorted, ma_200w_full):
-            if d >= wma_cutoff:
-                wma_pairs.append((d, p, w))
-        if len(wma_pairs) > 800:
-            step = max(1, len(wma_pairs) // 800)
-            wma_pairs = [wma_pairs[i] for i in range(0, len(wma_pairs), step)] + [wma_pairs[-1]]
-        wma_payload = {
-            'dates': [d.strftime('%Y-%m-%d') for d, _, _ in wma_pairs],
-            'price': [round(p, 2) if p is not None else None for _, p, _ in wma_pairs],
-            'ma_200w': [round(w, 2) if w is not None else None for _, _, w in wma_pairs],
-        }
-        latest_200w = next((v for v in reversed(ma_200w_full) if v is not None), None)
-        wma_status = None
-        if latest_200w is not None:
-            wma_status = {
-                'price': round(last_price, 2),
-                'ma_200w': round(latest_200w, 2),
-                'ratio': round(last_price / latest_200w, 3),
-                'distance_pct': round(((last_price / latest_200w) - 1.0) * 100.0, 2),
-            }
-
-        # ---------- Mayer multiple (200-day SMA based) ----------
-        ma200_full = _sma(prices_sorted, 200)
-        latest_ma200 = next((v for v in reversed(ma200_full) if v is not None), None)
-        mayer = round(last_price / latest_ma200, 3) if latest_ma200 else None
-
-        # ---------- Current cycle stats ----------
-        current_halving = HALVING_DATES[-1][1]
-        days_since_halving = (last_date - current_halving).days
-        # Project the next halving 4 years out (refined below if /api/onchain-supply tells us better)
-        next_halving_est = current_halving + timedelta(days=4 * 365 + 1)
-        days_to_next_halving = (next_halving_est - last_date).days
-
-        # Find halving-day price for current cycle
-        current_cycle_start_price = None
-        for d, p in series:
-            if d >= current_halving:
-                current_cycle_start_price = p
-                break
-        pct_since_halving = ((last_price / current_cycle_start_price) - 1.0) * 100.0 if current_cycle_start_price else None
-
-        # Historical cycle peak comparisons (raw % gain at the same day_offset)
-        historical_at_same_day = []
-        for entry in cycles_out:
-            if entry.get('is_current'):
-                continue
-            xs = entry.get('series', [])
-            same = next((y for x, y in xs if x >= days_since_halving), None)
-            historical_at_same_day.append({
-                'label': entry['label'],
-                'multiple': round(same, 2) if same else None,
-            })
-
-        current_cycle = {
-            'halving_date': current_halving.strftime('%Y-%m-%d'),
-            'next_halving_estimate': next_halving_est.strftime('%Y-%m-%d'),
-            'days_since_halving': days_since_halving,
-            'days_to_next_halving': days_to_next_halving,
-            'cycle_progress_pct': round(min(100.0, days_since_halving / (4 * 365.25) * 100.0), 1),
-            'current_price_usd': round(last_price, 2),
-            'cycle_start_price_usd': round(current_cycle_start_price, 2) if current_cycle_start_price else None,
-            'pct_gain_since_halving': round(pct_since_halving, 1) if pct_since_halving is not None else None,
-            'historical_at_same_day': historical_at_same_day,
-        }
-
-        payload = {
-            'cycles': cycles_out,
-            'pi_cycle': {'series': pi_payload, 'status': pi_status},
-            'two_hundred_wma': {'series': wma_payload, 'status': wma_status},
-            'mayer_multiple': mayer,
-            'current_cycle': current_cycle,
-            'as_of': last_date.strftime('%Y-%m-%d'),
-            'source': 'blockchain.info market-price',
-        }
-        _write_cache(cache_file, payload)
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# --------------------------------------------------------------------------- #
-# Saver's view — /priced-in
-# --------------------------------------------------------------------------- #
-
-def _get_gold_oz_gbp(cache_dir: Path, gbp_per_usd: float) -> Optional[float]:
-    """Latest gold price per troy ounce in GBP, derived from Yahoo GC=F * GBP/USD."""
-    cache_file = cache_dir / 'gold_oz_gbp_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=1))
-    if cached and 'gbp' in cached:
-        try:
-            return float(cached['gbp'])
-        except Exception:
-            pass
-    try:
-        r = requests.get(
-            'https://query2.finance.yahoo.com/v8/finance/chart/GC=F',
-            params={'range': '2d', 'interval': '1d'},
-            timeout=15,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return None
-        j = r.json()
-        result = (j.get('chart') or {}).get('result') or []
-        if not result:
-            return None
-        meta = result[0].get('meta') or {}
-        usd = meta.get('regularMarketPrice')
-        if usd is None:
-            return None
-        gbp = float(usd) * (gbp_per_usd or 0.78)
-        _write_cache(cache_file, {'gbp': gbp})
-        return gbp
-    except Exception:
-        return None
-
-def _load_btc_history_gbp(cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Daily BTC/GBP history back to 2014.
-
-    Source: stitches the local bitcoin_historical.csv (GBP daily, 2014→2025)
-    with a CoinGecko days=365 fetch for the recent gap. CoinGecko's free API
-    caps history at 365 days, so we can't ask for `max` directly.
-    Cached 24h.
-    """
-    cache_file = cache_dir / 'btc_history_gbp_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'prices' in cached:
-        out: List[Tuple[datetime, float]] = []
-        for d, p in cached['prices']:
-            try:
-                out.append((datetime.fromisoformat(d), float(p)))
-            except Exception:
-                continue
-        if out:
-            return out
-
-    # 1) CSV foundation
-    csv_path = cache_dir / 'bitcoin_historical.csv'
-    by_date: dict = {}
-    if csv_path.exists():
-        try:
-            with open(csv_path, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        d = datetime.strptime(row['Date'], '%Y-%m-%d')
-                        by_date[d] = float(row['Close'])
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-
-    # 2) Recent year from CoinGecko (overwrites any overlap with the CSV)
-    try:
-        r = requests.get(
-            'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
-            params={'vs_currency': 'gbp', 'days': '365', 'interval': 'daily'},
-            timeout=30,
-        )
-        if r.ok:
-            j = r.json()
-            for pt in j.get('prices', []):
-                try:
-                    ts_ms = int(pt[0])
-                    val = float(pt[1])
-                    # Normalize to midnight UTC so it merges cleanly with CSV daily dates
-                    d = datetime.utcfromtimestamp(ts_ms / 1000).replace(hour=0, minute=0, second=0, microsecond=0)
-                    by_date[d] = val
-                except Exception:
-                    continue
-    except Exception:
-        pass
-
-    result = sorted(by_date.items())
-    if result:
-        _write_cache(cache_file, {'prices': [[d.isoformat(), p] for d, p in result]})
-    return result
-
-def _load_ftse_monthly_gbp(cache_dir: Path) -> List[Tuple[datetime, float]]:
-    """Monthly FTSE 100 closes from Yahoo Finance (^FTSE). Cached 24h.
-
-    Yahoo's v8 chart endpoint caps `range=10y` at monthly resolution, which
-    is enough for the DCA calculator. For start dates earlier than ~10 years
-    ago, BTC contributions before Yahoo's window simply won't have a FTSE
-    counterpart; the DCA endpoint already treats that gracefully.
-    """
-    cache_file = cache_dir / 'ftse_monthly_cache.json'
-    cached = _cached_json(cache_file, timedelta(hours=24))
-    if cached and 'prices' in cached:
-        out: List[Tuple[datetime, float]] = []
-        for d, p in cached['prices']:
-            try:
-                out.append((datetime.fromisoformat(d), float(p)))
-            except Exception:
-                continue
-        if out:
-            return out
-    try:
-        r = requests.get(
-            'https://query2.finance.yahoo.com/v8/finance/chart/%5EFTSE',
-            params={'range': '10y', 'interval': '1mo'},
-            timeout=30,
-            headers={'User-Agent': 'Mozilla/5.0'},
-        )
-        if not r.ok:
-            return []
-        j = r.json()
-        result_arr = (j.get('chart') or {}).get('result') or []
-        if not result_arr:
-            return []
-        chart = result_arr[0]
-        timestamps = chart.get('timestamp') or []
-        quote = ((chart.get('indicators') or {}).get('quote') or [{}])[0]
-        closes = quote.get('close') or []
-        result: List[Tuple[datetime, float]] = []
-        for ts, close in zip(timestamps, closes):
-            if ts is None or close is None:
-                continue
-            try:
-                d = datetime.utcfromtimestamp(int(ts)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                result.append((d, float(close)))
-            except Exception:
-                continue
-        if result:
-            _write_cache(cache_file, {'prices': [[d.isoformat(), p] for d, p in result]})
-        return result
-    except Exception:
-        return []
-
-def _series_value_at_or_before(series: List[Tuple[datetime, float]], when: datetime) -> Optional[float]:
-    """Binary search the latest value <= when. Series must be sorted ascending."""
-    if not series:
-        return None
-    lo, hi = 0, len(series) - 1
-    if when < series[0][0]:
-        return None
-    while lo < hi:
-        mid = (lo + hi + 1) // 2
-        if series[mid][0] <= when:
-            lo = mid
-        else:
-            hi = mid - 1
-    return series[lo][1]
-
-@app.route('/api/priced-in')
-def api_priced_in():
-    """Snapshot of BTC priced in everyday UK reference goods + sats-per-£."""
-    try:
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / 'priced_in_cache.json'
-        cached = _cached_json(cache_file, timedelta(minutes=10))
-        if cached:
-            return jsonify(cached)
-
-        spot = _get_spot_price_gbp_cached(cache_dir)
-        fx = _get_gbp_per_usd(cache_dir) or 0.78
-        gold_gbp = _get_gold_oz_gbp(cache_dir, fx)
-
-        references = []
-        for ref in PRICED_IN_REFERENCES:
-            gbp = ref['gbp']
-            references.append({
-                'key': ref['key'],
-                'label': ref['label'],
-                'plural': ref['plural'],
-                'unit_price_gbp': gbp,
-                'units_per_btc': (spot / gbp) if (spot and gbp) else None,
-                'sats_per_unit': (gbp / spot * 100_000_000) if spot else None,
-                'as_of': ref['as_of'],
-                'source': ref['source'],
-            })
-        if gold_gbp:
-            references.append({
-                'key': 'gold_oz',
-                'label': 'ounce of gold',
-                'plural': 'ounces of gold',
-                'unit_price_gbp': round(gold_gbp, 2),
-                'units_per_btc': (spot / gold_gbp) if (spot and gold_gbp) else None,
-                'sats_per_unit': (gold_gbp / spot * 100_000_000) if spot else None,
-                'as_of': 'live',
-                'source': 'stooq XAUUSD × GBP/USD',
-            })
-
-        payload = {
-            'spot_btc_gbp': round(spot, 2) if spot else None,
-            'sats_per_pound': round(100_000_000 / spot, 0) if spot else None,
-            'gbp_per_usd': round(fx, 4),
-            'references': references,
-        }
-        _write_cache(cache_file, payload)
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/dca')
-def api_dca():
-    """Compute a Bitcoin DCA simulation and compare with cash + FTSE 100.
-
-    Query params:
-        monthly     £ contributed each month (default 100)
-        start       YYYY-MM start of contributions (default 2018-01)
-        cash_rate   Annual cash savings rate as %, default 3
-    """
-    try:
-        monthly = float(request.args.get('monthly', 100))
-        start_str = request.args.get('start', '2018-01')
-        cash_rate_pct = float(request.args.get('cash_rate', 3.0))
-        if monthly <= 0 or monthly > 1_000_000:
-            return jsonify({'error': 'monthly out of range'}), 400
-        try:
-            start_dt = datetime.strptime(start_str, '%Y-%m')
-        except ValueError:
-            return jsonify({'error': 'start must be YYYY-MM'}), 400
-        if start_dt < datetime(2013, 1, 1):
-            start_dt = datetime(2013, 1, 1)  # CoinGecko coverage limit
-        cash_rate = cash_rate_pct / 100.0
-
-        cache_dir = Path(__file__).parent / 'data'
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        btc_hist = _load_btc_history_gbp(cache_dir)
-        ftse_hist = _load_ftse_monthly_gbp(cache_dir)
-
-        if not btc_hist:
-            return jsonify({'error': 'BTC history unavailable'}), 502
-
-        # Generate monthly contribution dates from start to now (inclusive)
-        end_dt = datetime.utcnow().replace(day=1)
-        months: List[datetime] = []
-        cursor = start_dt.replace(day=1)
-        while cursor <= end_dt:
-            months.append(cursor)
-            if cursor.month == 12:
-                cursor = cursor.replace(year=cursor.year + 1, month=1)
-            else:
-                cursor = cursor.replace(month=cursor.month + 1)
-
-        btc_accum = 0.0
-        ftse_shares = 0.0
-        invested = 0.0
-        btc_invested = 0.0
-        ftse_invested = 0.0
-        for m in months:
-            invested += monthly
-            p_btc = _series_value_at_or_before(btc_hist, m)
-            if p_btc:
-                btc_accum += monthly / p_btc
-                btc_invested += monthly
-            p_ftse = _series_value_at_or_before(ftse_hist, m)
-            if p_ftse:
-                ftse_shares += monthly / p_ftse
-                ftse_invested += monthly
-
-        # Latest values
-        spot_btc = btc_hist[-1][1] if btc_hist else None
-        spot_ftse = ftse_hist[-1][1] if ftse_hist else None
-
-        btc_value = btc_accum * spot_btc if spot_btc else 0
-        ftse_value = ftse_shares * spot_ftse if spot_ftse else 0
-
-        # Cash: monthly compounding, contribution at end of month
-        m_rate = cash_rate / 12.0
-        cash_value = 0.0
-        for _ in months:
-            cash_value = cash_value * (1 + m_rate) + monthly
+for _rule, _import_name in API_ROUTES:
+    _view = LazyView(_import_name)
+    app.add_url_rule(_rule, endpoint=_view.__name__, view_func=_view)
 
-        payload = {
-            'monthly': monthly,
-            'start': start_dt.strftime('%Y-%m'),
-            'months': len(months),
-            'invested': round(invested, 2),
-            'btc': {
-                'accumulated': round(btc_accum, 8),
-                'value_gbp': round(btc_value, 2),
-                'multiplier': round(btc_value / invested, 2) if invested else None,
-            },
-            'cash': {
-                'rate_pct': cash_rate_pct,
-                'value_gbp': round(cash_value, 2),
-                'multiplier': round(cash_value / invested, 2) if invested else None,
-            },
-            'ftse': {
-                'value_gbp': round(ftse_value, 2) if spot_ftse else None,
-                'multiplier': round(ftse_value / invested, 2) if invested and spot_ftse else None,
-                'available': spot_ftse is not None,
-            },
-            'as_of_btc': btc_hist[-1][0].isoformat() if btc_hist else None,
-            'as_of_ftse': ftse_hist[-1][0].isoformat() if ftse_hist else None,
-            'spot_btc_gbp': round(spot_btc, 2) if spot_btc else None,
-        }
-        return jsonify(payload)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+# Long-running processes can keep caches warm themselves instead of relying
+# on something hitting /api/warm.
+if os.environ.get('BITVIZ_WARM_EVERY'):
+    from datasets import start_scheduler
+    start_scheduler(app, float(os.environ['BITVIZ_WARM_EVERY']))
 
 if __name__ == '__main__':
-    app.run(threaded=True)
\ No newline at end of file
+    app.run(threaded=True)
@@ -0,0 +1,47 @@
+"""Cheap live endpoints polled by every page: block tip, FX rate, upstream
+and stored-series health."""
+from flask import jsonify
+
+import timeseries
+import upstream
+from cache import cached_json, stale_json, write_cache
+from datasets import ttl
+from history import get_gbp_per_usd
+
+def tip_height():
+    """Lightweight endpoint for the header block-height pill. Cached 30s."""
+    try:
+        # Reuse the existing tip_height_cache with a tighter staleness window
+        cached = cached_json('tip_height_cache', ttl('tip_height_cache'))
+        if cached and isinstance(cached.get('height'), int):
+            return jsonify({'height': cached['height']})
+        try:
+            r = upstream.get('mempool', 'https://mempool.space/api/blocks/tip/height', timeout=10)
+            r.raise_for_status()
+            height = int(r.text.strip())
+            write_cache('tip_height_cache', {'height': height})
+            return jsonify({'height': height})
+        except Exception:
+            # Stale fallback
+            stale = stale_json('tip_height_cache')
+            if stale and isinstance(stale.get('height'), int):
+                return jsonify({'height': stale['height']})
+            return jsonify({'height': None}), 200
+    except Exception:
+        return jsonify({'height': None}), 200
+
+def fx_rate():
+    try:
+        rate = get_gbp_per_usd()
+        return jsonify({'gbp_per_usd': rate})
+    except Exception:
+        # Fallback conservative
+        return jsonify({'gbp_per_usd': 0.78}), 200
+
+def upstream_status():
+    """Breakers, rate-limit quota and recent upstream calls for this instance."""
+    return jsonify(upstream.status())
+
+def series_status():
+    """Source, last refresh and date range of every stored series."""
+    return jsonify(timeseries.status())
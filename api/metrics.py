@@ -0,0 +1,588 @@
+"""Dashboard metrics for the home and /bitcoin-metrics pages."""
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import jsonify, request
+
+import derived
+import upstream
+from cache import cached_json, cached_response, stale_json, write_cache, write_response, cache_and_respond
+from datasets import SPARKLINES, input_versions, ttl
+from history import CSV_PATH, get_spot_price_gbp_cached, get_gbp_per_usd
+from series import downsample_xy, rolling_extreme_index, rolling_volatility
+
+def nodes_latest():
+    try:
+        # Serve cache if fresh (<24h)
+        cached = cached_response('nodes_latest_cache', ttl('nodes_latest_cache'))
+        if cached:
+            return cached
+
+        # Fetch from Bitnodes
+        resp = upstream.get('bitnodes', 'https://bitnodes.io/api/v1/snapshots/latest/', timeout=20)
+        resp.raise_for_status()
+        data = resp.json()
+
+        return write_response('nodes_latest_cache', data)
+    except Exception as e:
+        # On failure, try stale cache
+        stale = stale_json('nodes_latest_cache')
+        if stale:
+            return jsonify(stale)
+        # Fallback: return empty structure so UI can render without error
+        return jsonify({'nodes': {}}), 200
+
+def market_structure():
+    try:
+        csv_path = CSV_PATH
+        if not csv_path.exists():
+            return jsonify({'error':'historical csv not found'}), 404
+
+        # Recomputed when the CSV or the spot price changes
+        cache_key = 'market_structure_cache'
+        inputs = input_versions(cache_key)
+        cached = cached_response(cache_key, inputs=inputs)
+        if cached:
+            return cached
+
+        # Sorted closes and everything derived from them, shared until the CSV changes
+        src = derived.source('bitcoin_historical_csv')
+        closes = src.values
+        if len(closes) < 210:
+            return jsonify({'error':'not enough data'}), 400
+
+        last_close = closes[-1]
+
+        # Spot price (GBP), fallback to last close
+        spot = get_spot_price_gbp_cached() or last_close
+
+        # Volatility (annualized) over last 30/90 trading days
+        vol_30 = src.rolling_volatility(30)[-1]
+        vol_90 = src.rolling_volatility(90)[-1]
+
+        # ATH drawdown
+        ath = src.running_ath()[-1]
+        drawdown_pct = ((spot - ath)/ath) * 100.0
+
+        # Percent of days above current spot
+        days_above = src.order_index().count_above(spot)
+        pct_days_above = (days_above/len(closes)) * 100.0
+
+        # 200D SMA and Mayer Multiple
+        sma200 = src.sma(200)[-1]
+        mayer = spot / sma200
+        sma_dist_pct = ((spot - sma200)/sma200) * 100.0
+
+        # Cycle windows (approximate last 4 years)
+        window_days = 365 * 4
+        days_since_cycle_top = (src.date(-1) - src.date(src.rolling_high_index(window_days)[-1])).days
+        days_since_cycle_bottom = (src.date(-1) - src.date(src.rolling_low_index(window_days)[-1])).days
+
+        metrics = {
+            'spot_gbp': round(spot, 2),
+            'ath_gbp': round(ath, 2),
+            'drawdown_from_ath_pct': round(drawdown_pct, 2),
+            'volatility_30d_annualized_pct': round(vol_30, 2) if vol_30 is not None else None,
+            'volatility_90d_annualized_pct': round(vol_90, 2) if vol_90 is not None else None,
+            'pct_days_above_current_pct': round(pct_days_above, 2),
+            'sma200_gbp': round(sma200, 2),
+            'mayer_multiple': round(mayer, 3),
+            'sma200_distance_pct': round(sma_dist_pct, 2),
+            'days_since_cycle_top': days_since_cycle_top,
+            'days_since_cycle_bottom': days_since_cycle_bottom,
+            'as_of_date': src.date(-1).strftime('%Y-%m-%d'),
+        }
+
+        return write_response(cache_key, metrics, inputs=inputs)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def price_percentile():
+    """Where a price sits among historical daily closes.
+
+    Query params:
+        price       price to rank (default: the latest close)
+        currency    gbp (default, since 2014) or usd (since 2010)
+        days        only the last N days of history, e.g. 1460 for ~4 years
+        start, end  or only closes between these YYYY-MM-DD dates (inclusive)
+    """
+    try:
+        currency = (request.args.get('currency') or 'gbp').lower()
+        if currency not in derived.CURRENCY_SOURCES:
+            return jsonify({'error': 'currency must be gbp or usd'}), 400
+        src = derived.source(derived.CURRENCY_SOURCES[currency])
+        n = len(src.series)
+        if not n:
+            return jsonify({'error': 'history unavailable'}), 502
+
+        try:
+            price = float(request.args['price']) if 'price' in request.args else src.values[-1]
+            if not math.isfinite(price):
+                raise ValueError
+            lo, hi = 0, n
+            if 'days' in request.args:
+                days = int(request.args['days'])
+                if days <= 0:
+                    raise ValueError
+                i = src.first_on_or_after(src.date(-1) - timedelta(days=days - 1))
+                lo = 0 if i is None else i
+            if 'start' in request.args:
+                # Index 0 is a match: a start on or before the first close
+                i = src.first_on_or_after(datetime.strptime(request.args['start'], '%Y-%m-%d'))
+                lo = max(lo, n if i is None else i)
+            if 'end' in request.args:
+                hi = src.first_after(datetime.strptime(request.args['end'], '%Y-%m-%d'))
+        except ValueError:
+            return jsonify({'error': 'price must be a finite number, days a positive integer, start/end YYYY-MM-DD'}), 400
+        if lo >= hi:
+            return jsonify({'error': 'no closes in the requested window'}), 404
+
+        total = hi - lo
+        above = src.order_index().count_above(price, lo, hi)
+        at_or_below = total - above
+        return jsonify({
+            'price': price,
+            'currency': currency,
+            'start': src.date(lo).strftime('%Y-%m-%d'),
+            'end': src.date(hi - 1).strftime('%Y-%m-%d'),
+            'days': total,
+            'days_above': above,
+            'pct_days_above': round(above / total * 100.0, 2),
+            # Share of days that closed at or below the price
+            'percentile': round(at_or_below / total * 100.0, 2),
+            # 1 = highest close in the window
+            'rank': above + 1,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Windows whose rolling series are kept per data version; any other window
+# up to MAX_ROLLING_WINDOW is computed per request
+ROLLING_WINDOWS = (7, 30, 90, 200, 365, 1460)
+MAX_ROLLING_WINDOW = 2000
+MAX_ROLLING_POINTS = 5000
+
+def rolling():
+    """Full-history rolling series for one window: annualized volatility of
+    daily returns, rolling high / low close, and drawdown from the running
+    all-time high.
+
+    Query params:
+        window      days per window, 2..2000 (default 30)
+        currency    gbp (default) or usd
+        points      downsample to about this many points (default 600)
+    """
+    try:
+        currency = (request.args.get('currency') or 'gbp').lower()
+        if currency not in derived.CURRENCY_SOURCES:
+            return jsonify({'error': 'currency must be gbp or usd'}), 400
+        try:
+            window = int(request.args.get('window', 30))
+            points = int(request.args.get('points', 600))
+            if not 2 <= window <= MAX_ROLLING_WINDOW or not 2 <= points <= MAX_ROLLING_POINTS:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': f'window must be 2..{MAX_ROLLING_WINDOW} and points 2..{MAX_ROLLING_POINTS}'}), 400
+
+        src = derived.source(derived.CURRENCY_SOURCES[currency])
+        values = src.values
+        if not len(values):
+            return jsonify({'error': 'history unavailable'}), 502
+        if window in ROLLING_WINDOWS:
+            vol = src.rolling_volatility(window)
+            high_idx = src.rolling_high_index(window)
+            low_idx = src.rolling_low_index(window)
+        else:
+            vol = [None] + rolling_volatility(src.returns(), window)
+            high_idx = rolling_extreme_index(values, window)
+            low_idx = rolling_extreme_index(values, window, highest=False)
+        drawdown = src.drawdown()
+
+        def r2(v):
+            return round(v, 2) if v is not None else None
+
+        idx = downsample_xy(list(range(len(values))), points)
+        return jsonify({
+            'currency': currency,
+            'window': window,
+            'dates': [src.date(i).strftime('%Y-%m-%d') for i in idx],
+            'price': [round(values[i], 2) for i in idx],
+            'volatility_annualized_pct': [r2(vol[i]) for i in idx],
+            'rolling_high': [round(values[high_idx[i]], 2) for i in idx],
+            'rolling_low': [round(values[low_idx[i]], 2) for i in idx],
+            'drawdown_from_ath_pct': [round(drawdown[i], 2) for i in idx],
+            'as_of': src.date(-1).strftime('%Y-%m-%d'),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def onchain_supply():
+    try:
+        out_cache = 'onchain_supply_cache'
+
+        cached = cached_response(out_cache, ttl(out_cache))
+        if cached:
+            return cached
+
+        # 1) Current height via mempool.space
+        height_cache = 'tip_height_cache'
+        height = None
+        cached_height = cached_json(height_cache, timedelta(minutes=5))
+        if cached_height and isinstance(cached_height.get('height'), int):
+            height = cached_height['height']
+        else:
+            r = upstream.get('mempool', 'https://mempool.space/api/blocks/tip/height', timeout=15)
+            r.raise_for_status()
+            height = int(r.text.strip())
+            write_cache(height_cache, {'height': height})
+
+        # 2) Halving details
+        HALVING_INTERVAL = 210_000
+        epoch = height // HALVING_INTERVAL
+        next_halving_height = (epoch + 1) * HALVING_INTERVAL
+        blocks_to_halving = max(0, next_halving_height - height)
+        # Estimate using 10 minutes per block
+        minutes_to_halving = blocks_to_halving * 10
+        eta_utc = (datetime.utcnow() + timedelta(minutes=minutes_to_halving)).isoformat()
+        # Current subsidy (BTC)
+        current_subsidy = 50.0 / (2 ** epoch)
+        blocks_per_day = 144
+        annual_issuance_btc = current_subsidy * blocks_per_day * 365
+
+        # 3) Circulating / max supply via CoinGecko
+        cg_cache = 'cg_supply_cache'
+        cg = cached_json(cg_cache, ttl(cg_cache))
+        if not cg:
+            cg_resp = upstream.get('coingecko', 'https://api.coingecko.com/api/v3/coins/bitcoin', params={'localization':'false','tickers':'false','community_data':'false','developer_data':'false','sparkline':'false'}, timeout=20, priority=upstream.BACKGROUND)
+            cg_resp.raise_for_status()
+            j = cg_resp.json()
+            market = j.get('market_data', {})
+            cg = {
+                'circulating_supply': market.get('circulating_supply'),
+                'max_supply': market.get('max_supply') or 21_000_000,
+            }
+            write_cache(cg_cache, cg)
+
+        circ = float(cg.get('circulating_supply') or 0)
+        max_supply = float(cg.get('max_supply') or 21_000_000)
+        circ_pct = (circ / max_supply) * 100.0 if max_supply else None
+
+        payload = {
+            'height': height,
+            'epoch': epoch,
+            'next_halving_height': next_halving_height,
+            'blocks_to_halving': blocks_to_halving,
+            'minutes_to_halving': minutes_to_halving,
+            'eta_utc': eta_utc,
+            'current_subsidy_btc': round(current_subsidy, 8),
+            'annual_issuance_btc': round(annual_issuance_btc, 2),
+            'circulating_supply': round(circ, 0) if circ else None,
+            'max_supply': round(max_supply, 0) if max_supply else None,
+            'circulating_pct_of_max': round(circ_pct, 2) if circ_pct is not None else None,
+        }
+
+        return write_response(out_cache, payload)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _bc_chart(chart: str, timespan: str) -> Optional[dict]:
+    cache_key = f'bc_{chart}_{timespan}'
+    cached = cached_json(cache_key, ttl(cache_key))
+    if cached:
+        return cached
+    url = f'https://api.blockchain.info/charts/{chart}'
+    r = upstream.get('blockchain_info', url, params={'timespan': timespan, 'format': 'json', 'cors': 'true'}, timeout=20)
+    r.raise_for_status()
+    data = r.json()
+    write_cache(cache_key, data)
+    return data
+
+def _moving_average(series, window: int):
+    if not series or window <= 1:
+        return series
+    out = []
+    acc = 0.0
+    q = []
+    for v in series:
+        q.append(v)
+        acc += v
+        if len(q) > window:
+            acc -= q.pop(0)
+        out.append(acc / len(q))
+    return out
+
+def miner_economics():
+    try:
+
+        hr = _bc_chart('hash-rate', '1year')
+        rev = _bc_chart('miners-revenue', '1year')
+        fees = _bc_chart('transaction-fees-usd', '1year')
+
+        # Extract y series aligned by date
+        def to_map(obj):
+            vals = obj.get('values', []) if obj else []
+            return {int(pt.get('x')): float(pt.get('y')) for pt in vals if 'x' in pt and 'y' in pt}
+
+        hr_map = to_map(hr)
+        rev_map = to_map(rev)
+        fees_map = to_map(fees)
+
+        # Build sorted date list present in hashrate
+        dates = sorted(hr_map.keys())
+        hr_series = [hr_map[d] for d in dates]
+        hr_ma7 = _moving_average(hr_series, 7)
+
+        latest_date = dates[-1] if dates else None
+        latest_hr_ma7 = hr_ma7[-1] if hr_ma7 else None
+        latest_rev = None
+        latest_fees = None
+        if latest_date:
+            # Select closest date available in revenue/fees not exceeding latest_date
+            def latest_not_after(m):
+                ks = [k for k in m.keys() if k <= latest_date]
+                return m[max(ks)] if ks else None
+            latest_rev = latest_not_after(rev_map)
+            latest_fees = latest_not_after(fees_map)
+
+        fees_pct = None
+        if latest_rev and latest_rev != 0 and latest_fees is not None:
+            fees_pct = (latest_fees / latest_rev) * 100.0
+
+        payload = {
+            'hashrate_7d_avg': round(latest_hr_ma7, 2) if latest_hr_ma7 is not None else None,
+            'miners_revenue_usd': round(latest_rev, 0) if latest_rev is not None else None,
+            'fees_usd': round(latest_fees, 0) if latest_fees is not None else None,
+            'fees_pct_of_revenue': round(fees_pct, 2) if fees_pct is not None else None,
+        }
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def macro_context():
+    try:
+        cache_key = 'macro_context_cache'
+        cached = cached_response(cache_key, ttl(cache_key))
+        if cached:
+            return cached
+
+        # Prefer frankfurter.app timeseries (robust free source)
+        end = datetime.utcnow().date()
+        start_30 = end - timedelta(days=30)
+        start_365 = end - timedelta(days=365)
+        def ff_series(start_date):
+            url = f'https://api.frankfurter.app/{start_date.isoformat()}..{end.isoformat()}'
+            try:
+                r = upstream.get('frankfurter', url, params={'from': 'USD', 'to': 'GBP'}, timeout=20)
+                if not r.ok:
+                    return None
+                j = r.json()
+                rates = j.get('rates', {})
+                if not rates:
+                    return None
+                # sorted by date
+                dates_sorted = sorted(rates.keys())
+                return [float(rates[d]['GBP']) for d in dates_sorted]
+            except Exception:
+                return None
+
+        series_30 = ff_series(start_30)
+        series_1y = ff_series(start_365)
+
+        def pct_change_from_series(series):
+            if not series or len(series) < 2:
+                return None
+            first, last = series[0], series[-1]
+            try:
+                return ((last/first) - 1.0) * 100.0
+            except Exception:
+                return None
+
+        change_30d = pct_change_from_series(series_30)
+        change_1y = pct_change_from_series(series_1y)
+
+        # Spot from frankfurter last rate if available, else helper
+        if series_1y and len(series_1y) > 0:
+            gbp_per_usd = series_1y[-1]
+        else:
+            gbp_per_usd = get_gbp_per_usd() or 0.78
+
+        # 1y high/low and percentile position
+        one_y_high = max(series_1y) if series_1y else None
+        one_y_low = min(series_1y) if series_1y else None
+        pct_in_range = None
+        if series_1y and one_y_high is not None and one_y_low is not None and one_y_high != one_y_low:
+            pct_in_range = ((gbp_per_usd - one_y_low) / (one_y_high - one_y_low)) * 100.0
+
+        # Latest CPI YoY from World Bank (annual %), cached separately from the macro payload
+        wb_cache = 'macro_cpi_cache'
+        cpi_cached = cached_json(wb_cache, ttl(wb_cache))
+        if cpi_cached is None:
+            def wb_latest(country):
+                url = f'https://api.worldbank.org/v2/country/{country}/indicator/FP.CPI.TOTL.ZG'
+                try:
+                    r = upstream.get('worldbank', url, params={'format':'json','per_page':1,'date':'2018:2035'}, timeout=20)
+                    if not r.ok:
+                        return None, None
+                except Exception:
+                    return None, None
+                j = r.json()
+                if isinstance(j, list) and len(j) == 2 and j[1]:
+                    entry = j[1][0]
+                    return entry.get('date'), entry.get('value')
+                return None, None
+            uk_date, uk_cpi = wb_latest('GBR')
+            us_date, us_cpi = wb_latest('USA')
+            cpi_data = {
+                'uk_cpi_yoy_date': uk_date,
+                'uk_cpi_yoy_pct': uk_cpi,
+                'us_cpi_yoy_date': us_date,
+                'us_cpi_yoy_pct': us_cpi,
+            }
+            write_cache(wb_cache, cpi_data)
+        else:
+            cpi_data = cpi_cached
+
+        data = {
+            'gbp_per_usd': round(gbp_per_usd, 6),
+            'usd_per_gbp': round(1.0/gbp_per_usd, 6) if gbp_per_usd else None,
+            'gbp_per_usd_change_30d_pct': round(change_30d, 2) if change_30d is not None else None,
+            'gbp_per_usd_change_1y_pct': round(change_1y, 2) if change_1y is not None else None,
+            'gbp_per_usd_1y_high': round(one_y_high, 4) if one_y_high is not None else None,
+            'gbp_per_usd_1y_low': round(one_y_low, 4) if one_y_low is not None else None,
+            'gbp_per_usd_position_in_1y_range_pct': round(pct_in_range, 2) if pct_in_range is not None else None,
+        }
+        # Merge CPI fields only if available
+        if cpi_data:
+            data.update({
+                'uk_cpi_yoy_date': cpi_data.get('uk_cpi_yoy_date'),
+                'uk_cpi_yoy_pct': cpi_data.get('uk_cpi_yoy_pct'),
+                'us_cpi_yoy_date': cpi_data.get('us_cpi_yoy_date'),
+                'us_cpi_yoy_pct': cpi_data.get('us_cpi_yoy_pct'),
+            })
+        return cache_and_respond(cache_key, data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def adoption_usage():
+    try:
+        cache_key = 'adoption_usage_cache'
+        cached = cached_response(cache_key, ttl(cache_key))
+        if cached:
+            return cached
+
+        # Active addresses and tx/day (30d window for recency)
+        aa = _bc_chart('n-unique-addresses', '30days')
+        txd = _bc_chart('n-transactions', '30days')
+        fees_usd = _bc_chart('transaction-fees-usd', '30days')
+
+        def latest_value(chart_obj):
+            vals = chart_obj.get('values', []) if chart_obj else []
+            return float(vals[-1]['y']) if vals else None
+
+        active_addresses = latest_value(aa)
+        tx_per_day = latest_value(txd)
+        fees_usd_latest = latest_value(fees_usd)
+        avg_fee_per_tx_usd = None
+        if tx_per_day and tx_per_day != 0 and fees_usd_latest is not None:
+            avg_fee_per_tx_usd = fees_usd_latest / tx_per_day
+
+        # Lightning capacity. v1 and v2 are tried independently so an open
+        # breaker on one still lets the other through.
+        ln_capacity_btc = None
+        try:
+            # Primary: v1 lightning stats
+            r = upstream.get('mempool_ln_v1', 'https://mempool.space/api/v1/lightning/stats', timeout=15)
+            if r.ok:
+                j = r.json()
+                cap_sats = j.get('capacity')
+                if isinstance(cap_sats, (int, float)):
+                    ln_capacity_btc = round(float(cap_sats) / 100_000_000.0, 2)
+        except Exception:
+            pass
+        if ln_capacity_btc is None:
+            try:
+                # Fallback: v2
+                r2 = upstream.get('mempool_ln_v2', 'https://mempool.space/api/v2/lightning/statistics', timeout=15)
+                if r2.ok:
+                    j2 = r2.json()
+                    cap_sats2 = j2.get('total_capacity')
+                    if isinstance(cap_sats2, (int, float)):
+                        ln_capacity_btc = round(float(cap_sats2) / 100_000_000.0, 2)
+            except Exception:
+                pass
+
+        data = {
+            'active_addresses': round(active_addresses, 0) if active_addresses is not None else None,
+            'transactions_per_day': round(tx_per_day, 0) if tx_per_day is not None else None,
+            'avg_fee_per_tx_usd': round(avg_fee_per_tx_usd, 2) if avg_fee_per_tx_usd is not None else None,
+            'ln_capacity_btc': ln_capacity_btc,
+        }
+        return cache_and_respond(cache_key, data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _downsample(values, max_points=60):
+    if not values or len(values) <= max_points:
+        return values
+    step = max(1, len(values) // max_points)
+    out = [values[i] for i in range(0, len(values), step)]
+    if out and out[-1] is not values[-1]:
+        out.append(values[-1])
+    return out
+
+def sparkline(key):
+    """Return a small array of y-values for a given sparkline key.
+    Keys: price, hashrate, active-addresses, transactions, fx-gbpusd."""
+    if key not in SPARKLINES:
+        return jsonify({'error': f'unknown sparkline key: {key}'}), 404
+    try:
+        cache_key = f'sparkline_{key}'
+        now = datetime.utcnow()
+        cached = cached_response(cache_key, ttl(cache_key))
+        if cached:
+            return cached
+
+        values = None
+        if key == 'price':
+            # CoinGecko market_chart for 30d, USD
+            r = upstream.get(
+                'coingecko',
+                'https://api.coingecko.com/api/v3/coins/bitcoin/market_chart',
+                params={'vs_currency':'usd','days':'30','interval':'daily'},
+                timeout=20,
+                priority=upstream.BACKGROUND,
+            )
+            r.raise_for_status()
+            j = r.json()
+            prices = j.get('prices', [])
+            values = [float(p[1]) for p in prices if isinstance(p, list) and len(p) >= 2]
+        elif key in ('hashrate', 'active-addresses', 'transactions'):
+            chart_map = {
+                'hashrate': 'hash-rate',
+                'active-addresses': 'n-unique-addresses',
+                'transactions': 'n-transactions',
+            }
+            data = _bc_chart(chart_map[key], '30days')
+            vals = (data or {}).get('values', [])
+            values = [float(pt['y']) for pt in vals if 'y' in pt]
+        elif key == 'fx-gbpusd':
+            end = now.date()
+            start = end - timedelta(days=30)
+            url = f'https://api.frankfurter.app/{start.isoformat()}..{end.isoformat()}'
+            r = upstream.get('frankfurter', url, params={'from':'USD','to':'GBP'}, timeout=15)
+            r.raise_for_status()
+            rates = (r.json() or {}).get('rates', {})
+            keys_sorted = sorted(rates.keys())
+            values = [float(rates[d]['GBP']) for d in keys_sorted]
+        else:
+            return jsonify({'error': f'unknown sparkline key: {key}'}), 404
+
+        values = _downsample(values, 60) if values else []
+        return write_response(cache_key, {'values': values})
+    except Exception as e:
+        # Try stale cache
+        stale = stale_json(f'sparkline_{key}')
+        if stale and 'values' in stale:
+            return jsonify(stale)
+        return jsonify({'values': [], 'error': str(e)}), 200
@@ -0,0 +1,107 @@
+"""Long-run trend models — /api/model/*.
+
+The power-law model is a straight line through log10(price) against
+log10(days since the genesis block). The fit lives on the derived.Source
+(derived.Source.power_law_fit), which keeps running sums rather than
+refitting, so a new day costs O(1); this module only evaluates it.
+"""
+import math
+from datetime import timedelta
+from typing import Optional
+
+from flask import jsonify, request
+
+import derived
+from series import DAY_MS, PowerLawFit, downsample_xy
+
+# Bands drawn at these multiples of the residual standard deviation
+POWER_LAW_BANDS = (-2, -1, 1, 2)
+DEFAULT_POINTS = 600
+MAX_POINTS = 5000
+MAX_PROJECT_DAYS = 3650
+
+
+def _power_law_payload(src: 'derived.Source', points: int, project_days: int) -> Optional[dict]:
+    fit = src.power_law_fit().params()
+    if fit is None:
+        return None
+    slope, intercept, sigma, r2 = fit
+
+    def fair(t: float, k: float = 0.0) -> float:
+        return 10 ** (intercept + slope * math.log10(PowerLawFit.days(t)) + k * sigma)
+
+    ts_ms, values = src.series.ts_ms, src.values
+    idx = downsample_xy(list(range(len(values))), points)
+    xs = [ts_ms[i] for i in idx]
+    labels = [src.date(i).strftime('%Y-%m-%d') for i in idx]
+    prices = [round(values[i], 2) for i in idx]
+    # Past the last close: model only, spaced like the downsampled history
+    if project_days:
+        step = max(1, len(values) // max(points, 1))
+        for d in list(range(step, project_days, step)) + [project_days]:
+            xs.append(ts_ms[-1] + d * DAY_MS)
+            labels.append((src.date(-1) + timedelta(days=d)).strftime('%Y-%m-%d'))
+            prices.append(None)
+
+    last_price = values[-1]
+    last_fair = fair(ts_ms[-1])
+    deviation = math.log10(last_price / last_fair)
+    return {
+        'model': 'power-law',
+        'fit': {
+            'slope': round(slope, 4),
+            'intercept': round(intercept, 4),
+            'sigma_log10': round(sigma, 4),
+            'r2': round(r2, 4),
+            'points': src.power_law_fit().n,
+        },
+        'current': {
+            'date': src.date(-1).strftime('%Y-%m-%d'),
+            'price': round(last_price, 2),
+            'fair_value': round(last_fair, 2),
+            'deviation_pct': round((last_price / last_fair - 1.0) * 100.0, 2),
+            # Distance from the trend in residual standard deviations
+            'sigma': round(deviation / sigma, 2) if sigma else None,
+        },
+        'series': {
+            'dates': labels,
+            'price': prices,
+            'fair_value': [round(fair(t), 2) for t in xs],
+            'bands': {str(k): [round(fair(t, k), 2) for t in xs] for k in POWER_LAW_BANDS},
+        },
+    }
+
+
+def api_power_law():
+    """Power-law fair value and ±1σ / ±2σ bands over the full daily history.
+
+    Query params:
+        currency    usd (default, since 2010) or gbp (since 2014)
+        points      downsample the series to about this many points (default 600)
+        project     also extend the model this many days past the last close (default 0)
+    """
+    try:
+        currency = (request.args.get('currency') or 'usd').lower()
+        if currency not in derived.CURRENCY_SOURCES:
+            return jsonify({'error': 'currency must be usd or gbp'}), 400
+        try:
+            points = int(request.args.get('points', DEFAULT_POINTS))
+            project_days = int(request.args.get('project', 0))
+            if not 2 <= points <= MAX_POINTS or not 0 <= project_days <= MAX_PROJECT_DAYS:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': f'points must be 2..{MAX_POINTS} and project 0..{MAX_PROJECT_DAYS}'}), 400
+
+        src = derived.source(derived.CURRENCY_SOURCES[currency])
+        if not len(src.values):
+            return jsonify({'error': 'history unavailable'}), 502
+        if (points, project_days) == (DEFAULT_POINTS, 0):
+            # The default view: once per data version
+            payload = src.memo('power_law_payload', lambda: _power_law_payload(src, points, project_days))
+        else:
+            payload = _power_law_payload(src, points, project_days)
+        if payload is None:
+            return jsonify({'error': 'not enough data'}), 502
+        return jsonify(dict(payload, currency=currency))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,62 @@
+"""Price chart data for /bitcoin-price."""
+import json
+from typing import Iterable
+
+from flask import Response, jsonify
+
+import derived
+import formats
+
+# Ranges with more points than this are streamed rather than jsonify'd
+STREAM_MIN_POINTS = 1000
+
+def stream_json(fields: dict, key: str, chunks: Iterable[str]) -> Response:
+    """JSON object response whose `key` member is sent as `chunks` of JSON
+    text are produced (e.g. SeriesWindow.iter_json) instead of being built
+    in memory first. Keys come out sorted, as jsonify sorts them."""
+    def generate():
+        yield '{'
+        for i, k in enumerate(sorted({**fields, key: None})):
+            yield (',' if i else '') + json.dumps(k) + ':'
+            if k == key:
+                yield from chunks
+            else:
+                yield json.dumps(fields[k], separators=(',', ':'))
+        yield '}\n'
+    return Response(generate(), mimetype='application/json')
+
+def get_historical_data(range):
+    """Historical BTC/GBP prices for the price page chart.
+
+    Every range, ALL included, is a slice of the one canonical daily series
+    from load_btc_history_gbp (CSV + recent CoinGecko), so the ranges share
+    a single upstream refresh and always agree with each other.
+
+    ?format=columnar|binary picks a compact encoding (see formats.py).
+    """
+    range_to_days = {
+        '1M': 30,
+        '3M': 90,
+        '6M': 180,
+        '1Y': 365,
+    }
+    if range != 'ALL' and range not in range_to_days:
+        return jsonify({'error': f'Invalid range: {range}'}), 400
+    try:
+        fmt = formats.requested()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        series = derived.source('btc_history_gbp').series
+        if not len(series):
+            return jsonify({'error': 'history unavailable'}), 502
+        window = series.window() if range == 'ALL' else series.last_days(range_to_days[range])
+        if fmt[0] != 'json':
+            return formats.respond({'prices': window, 'source': 'csv+coingecko'}, fmt)
+        if len(window) > STREAM_MIN_POINTS:
+            # Straight from the typed arrays, a chunk at a time
+            return stream_json({'source': 'csv+coingecko'}, 'prices', window.iter_json())
+        return jsonify({'prices': window.pairs(), 'source': 'csv+coingecko'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
@@ -0,0 +1,454 @@
+"""Saver's view — /priced-in: BTC in everyday goods, the DCA calculator and
+holding-period returns."""
+import calendar
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
+
+from flask import jsonify, request
+
+import debasement
+import derived
+import timeseries
+import upstream
+from cache import cached_json, cached_response, stale_json, write_cache, write_response, cache_and_respond
+from datasets import input_versions, ttl
+from history import get_spot_price_gbp_cached, get_gbp_per_usd
+from series import DailySeries, downsample_xy
+
+# UK consumer reference values for /api/priced-in.
+# Hardcoded approximations sourced from public ONS / Land Registry / BBPA data;
+# refresh annually. Each entry includes an as_of label so the UI can show it.
+PRICED_IN_REFERENCES = [
+    {'key': 'milk_pint',     'gbp': 0.85,    'label': 'pint of milk',                  'plural': 'pints of milk',                  'as_of': '2025',     'source': 'ONS retail prices'},
+    {'key': 'bread_loaf',    'gbp': 1.40,    'label': 'loaf of bread',                 'plural': 'loaves of bread',                'as_of': '2025',     'source': 'ONS retail prices'},
+    {'key': 'weekly_shop',   'gbp': 55.0,    'label': 'weekly food shop (1 adult)',    'plural': 'weekly food shops',              'as_of': '2025',     'source': 'ONS LCFS (approx.)'},
+    {'key': 'pint_beer',     'gbp': 5.20,    'label': 'pint of beer (pub)',            'plural': 'pints of beer',                  'as_of': '2025',     'source': 'BBPA (approx.)'},
+    {'key': 'avg_uk_house',  'gbp': 290000,  'label': 'average UK house',              'plural': 'average UK houses',              'as_of': '2025',     'source': 'HM Land Registry HPI'},
+    {'key': 'median_salary', 'gbp': 37500,   'label': 'median UK annual salary',       'plural': 'median UK annual salaries',      'as_of': '2025',     'source': 'ONS ASHE'},
+]
+
+def _get_gold_oz_gbp(gbp_per_usd: float) -> Optional[float]:
+    """Latest gold price per troy ounce in GBP, derived from Yahoo GC=F * GBP/USD."""
+    cache_key = 'gold_oz_gbp_cache'
+    cached = cached_json(cache_key, ttl(cache_key))
+    if cached and 'gbp' in cached:
+        try:
+            return float(cached['gbp'])
+        except Exception:
+            pass
+    try:
+        r = upstream.get(
+            'yahoo',
+            'https://query2.finance.yahoo.com/v8/finance/chart/GC=F',
+            params={'range': '2d', 'interval': '1d'},
+            timeout=15,
+            headers={'User-Agent': 'Mozilla/5.0'},
+        )
+        r.raise_for_status()
+        j = r.json()
+        result = (j.get('chart') or {}).get('result') or []
+        if not result:
+            return None
+        meta = result[0].get('meta') or {}
+        usd = meta.get('regularMarketPrice')
+        if usd is None:
+            return None
+        gbp = float(usd) * (gbp_per_usd or 0.78)
+        write_cache(cache_key, {'gbp': gbp})
+        return gbp
+    except Exception:
+        stale = stale_json(cache_key)
+        return float(stale['gbp']) if stale and 'gbp' in stale else None
+
+def _yahoo_monthly_closes(symbol: str, range_: str) -> Optional[List[Tuple[datetime, float]]]:
+    """[(first of month, close), ...] from Yahoo's v8 chart endpoint, or None
+    if Yahoo had nothing for us."""
+    r = upstream.get(
+        'yahoo',
+        f'https://query2.finance.yahoo.com/v8/finance/chart/{symbol}',
+        params={'range': range_, 'interval': '1mo'},
+        timeout=30,
+        headers={'User-Agent': 'Mozilla/5.0'},
+    )
+    if not r.ok:
+        return None
+    j = r.json()
+    result_arr = (j.get('chart') or {}).get('result') or []
+    if not result_arr:
+        return None
+    chart = result_arr[0]
+    timestamps = chart.get('timestamp') or []
+    quote = ((chart.get('indicators') or {}).get('quote') or [{}])[0]
+    closes = quote.get('close') or []
+    result: List[Tuple[datetime, float]] = []
+    for ts, close in zip(timestamps, closes):
+        if ts is None or close is None:
+            continue
+        try:
+            d = datetime.utcfromtimestamp(int(ts)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            result.append((d, float(close)))
+        except Exception:
+            continue
+    return result
+
+def _load_ftse_monthly_gbp() -> DailySeries:
+    """Monthly FTSE 100 closes from Yahoo Finance (^FTSE). Refreshed every 24h.
+
+    Yahoo's v8 chart endpoint caps `range=10y` at monthly resolution, which
+    is enough for the DCA calculator. For start dates earlier than ~10 years
+    ago, BTC contributions before Yahoo's window simply won't have a FTSE
+    counterpart; the DCA endpoint already treats that gracefully.
+    """
+    name = 'ftse_monthly'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    try:
+        result = _yahoo_monthly_closes('%5EFTSE', '10y')
+        if result is None:
+            return timeseries.read_series(name)
+        if result:
+            timeseries.upsert(name, result, source='Yahoo ^FTSE monthly', full=True)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def _load_gold_monthly_gbp() -> DailySeries:
+    """Monthly gold closes per troy ounce in GBP: Yahoo GC=F (USD) over
+    GBPUSD=X for the same month. Refreshed every 24h."""
+    name = 'gold_monthly_gbp'
+    if timeseries.fresh(name, ttl(name)):
+        return timeseries.read_series(name)
+    try:
+        gold_usd = _yahoo_monthly_closes('GC%3DF', 'max')
+        usd_per_gbp = dict(_yahoo_monthly_closes('GBPUSD%3DX', 'max') or [])
+        if not gold_usd or not usd_per_gbp:
+            return timeseries.read_series(name)
+        result = [(d, usd / usd_per_gbp[d]) for d, usd in gold_usd if usd_per_gbp.get(d)]
+        if result:
+            timeseries.upsert(name, result, source='Yahoo GC=F / GBPUSD=X monthly', full=True)
+        return timeseries.read_series(name, fallback=result)
+    except Exception:
+        return timeseries.read_series(name)
+
+def api_priced_in():
+    """Snapshot of BTC priced in everyday UK reference goods + sats-per-£."""
+    try:
+        cache_key = 'priced_in_cache'
+        cached = cached_response(cache_key, ttl(cache_key))
+        if cached:
+            return cached
+
+        spot = get_spot_price_gbp_cached()
+        fx = get_gbp_per_usd() or 0.78
+        gold_gbp = _get_gold_oz_gbp(fx)
+
+        references = []
+        for ref in PRICED_IN_REFERENCES:
+            gbp = ref['gbp']
+            references.append({
+                'key': ref['key'],
+                'label': ref['label'],
+                'plural': ref['plural'],
+                'unit_price_gbp': gbp,
+                'units_per_btc': (spot / gbp) if (spot and gbp) else None,
+                'sats_per_unit': (gbp / spot * 100_000_000) if spot else None,
+                'as_of': ref['as_of'],
+                'source': ref['source'],
+            })
+        if gold_gbp:
+            references.append({
+                'key': 'gold_oz',
+                'label': 'ounce of gold',
+                'plural': 'ounces of gold',
+                'unit_price_gbp': round(gold_gbp, 2),
+                'units_per_btc': (spot / gold_gbp) if (spot and gold_gbp) else None,
+                'sats_per_unit': (gold_gbp / spot * 100_000_000) if spot else None,
+                'as_of': 'live',
+                'source': 'stooq XAUUSD × GBP/USD',
+            })
+
+        payload = {
+            'spot_btc_gbp': round(spot, 2) if spot else None,
+            'sats_per_pound': round(100_000_000 / spot, 0) if spot else None,
+            'gbp_per_usd': round(fx, 4),
+            'references': references,
+        }
+        return cache_and_respond(cache_key, payload)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _cpi_levels(rates: Dict[int, float], anchor_year: int) -> Dict[int, float]:
+    """Annual average UK price level per year relative to anchor_year (1.0),
+    chained from the ONS annual CPI rates; years without a rate count as 0%."""
+    if not rates:
+        return {anchor_year: 1.0}
+    levels = {anchor_year: 1.0}
+    for y in range(anchor_year, min(rates) - 1, -1):
+        levels[y - 1] = levels[y] / (1.0 + rates.get(y, 0.0) / 100.0)
+    for y in range(anchor_year + 1, max(rates) + 1):
+        levels[y] = levels[y - 1] * (1.0 + rates.get(y, 0.0) / 100.0)
+    return levels
+
+def _daily_levels(dates: List[datetime], levels: Dict[int, float]) -> List[float]:
+    """Price level on each date: annual levels placed mid-year and
+    interpolated geometrically between, flat beyond the first / last year."""
+    first, last = min(levels), max(levels)
+    out = []
+    for d in dates:
+        days_in_year = 366 if calendar.isleap(d.year) else 365
+        t = d.year + (d.timetuple().tm_yday - 0.5) / days_in_year - 0.5
+        y = int(t // 1)
+        if y < first:
+            out.append(levels[first])
+        elif y >= last:
+            out.append(levels[last])
+        else:
+            out.append(levels[y] * (levels[y + 1] / levels[y]) ** (t - y))
+    return out
+
+def _compute_priced_in_history() -> dict:
+    src = derived.source('btc_history_gbp')
+    ts_ms, btc = src.series.ts_ms, src.values
+    if not btc:
+        return {'error': 'BTC history unavailable'}
+    cpi_rates = debasement._fetch_uk_cpi_annual()
+    gold = derived.source('gold_monthly_gbp').series
+
+    # Only the sampled days are priced, so only their dates are built
+    idx = downsample_xy(list(range(len(btc))), 600)
+    dates = [src.date(i) for i in idx]
+    # Every reference is priced as of the same year, so one CPI path serves all
+    anchor_year = int(PRICED_IN_REFERENCES[0]['as_of'])
+    level = _daily_levels(dates, _cpi_levels(cpi_rates, anchor_year))
+
+    units = {
+        ref['key']: [round(btc[i] / (ref['gbp'] * lv), 4) for i, lv in zip(idx, level)]
+        for ref in PRICED_IN_REFERENCES
+    }
+    if gold:
+        # Latest monthly gold close on or before each sampled day
+        gold_at, g = [], -1
+        for i in idx:
+            while g + 1 < len(gold) and gold.ts_ms[g + 1] <= ts_ms[i]:
+                g += 1
+            gold_at.append(round(btc[i] / gold.values[g], 4) if g >= 0 else None)
+        units['gold_oz'] = gold_at
+
+    references = [
+        {'key': ref['key'], 'label': ref['label'], 'plural': ref['plural'],
+         'unit_price_gbp': ref['gbp'], 'as_of': ref['as_of'], 'source': ref['source']}
+        for ref in PRICED_IN_REFERENCES
+    ]
+    if gold:
+        references.append({'key': 'gold_oz', 'label': 'ounce of gold', 'plural': 'ounces of gold',
+                           'unit_price_gbp': round(gold.values[-1], 2), 'as_of': gold.date(-1).strftime('%Y-%m'),
+                           'source': 'Yahoo GC=F / GBPUSD=X monthly'})
+    return {
+        'dates': [d.strftime('%Y-%m-%d') for d in dates],
+        'btc_gbp': [round(btc[i], 2) for i in idx],
+        'units_per_btc': units,
+        'references': references,
+        'cpi': {
+            'source': 'ONS D7G7 (annual CPI rate)',
+            'anchor_year': anchor_year,
+            'years': [min(cpi_rates), max(cpi_rates)] if cpi_rates else None,
+        },
+        'as_of': src.date(-1).strftime('%Y-%m-%d'),
+    }
+
+def api_priced_in_history():
+    """BTC measured in everyday goods since 2014: daily BTC/GBP over each
+    PRICED_IN_REFERENCES price, deflated back through ONS CPI from its as_of
+    year, plus ounces of gold. Downsampled; recomputed only when the BTC
+    history, CPI rates or gold series change."""
+    try:
+        cache_key = 'priced_in_history_cache'
+        inputs = input_versions(cache_key)
+        cached = cached_response(cache_key, inputs=inputs)
+        if cached:
+            return cached
+        payload = _compute_priced_in_history()
+        if 'error' in payload:
+            return jsonify(payload), 502
+        return write_response(cache_key, payload, inputs=inputs)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def api_dca():
+    """Compute a Bitcoin DCA simulation and compare with cash + FTSE 100.
+
+    Query params:
+        monthly     £ contributed each month (default 100)
+        start       YYYY-MM start of contributions (default 2018-01)
+        cash_rate   Annual cash savings rate as %, default 3
+    """
+    try:
+        monthly = float(request.args.get('monthly', 100))
+        start_str = request.args.get('start', '2018-01')
+        cash_rate_pct = float(request.args.get('cash_rate', 3.0))
+        if monthly <= 0 or monthly > 1_000_000:
+            return jsonify({'error': 'monthly out of range'}), 400
+        try:
+            start_dt = datetime.strptime(start_str, '%Y-%m')
+        except ValueError:
+            return jsonify({'error': 'start must be YYYY-MM'}), 400
+        if start_dt < datetime(2013, 1, 1):
+            start_dt = datetime(2013, 1, 1)  # CoinGecko coverage limit
+        cash_rate = cash_rate_pct / 100.0
+
+
+        btc_hist = derived.source('btc_history_gbp').series
+        ftse_hist = derived.source('ftse_monthly').series
+
+        if not btc_hist:
+            return jsonify({'error': 'BTC history unavailable'}), 502
+
+        # Generate monthly contribution dates from start to now (inclusive)
+        end_dt = datetime.utcnow().replace(day=1)
+        months: List[datetime] = []
+        cursor = start_dt.replace(day=1)
+        while cursor <= end_dt:
+            months.append(cursor)
+            if cursor.month == 12:
+                cursor = cursor.replace(year=cursor.year + 1, month=1)
+            else:
+                cursor = cursor.replace(month=cursor.month + 1)
+
+        btc_accum = 0.0
+        ftse_shares = 0.0
+        invested = 0.0
+        btc_invested = 0.0
+        ftse_invested = 0.0
+        for m in months:
+            invested += monthly
+            p_btc = btc_hist.value_at_or_before(m)
+            if p_btc:
+                btc_accum += monthly / p_btc
+                btc_invested += monthly
+            p_ftse = ftse_hist.value_at_or_before(m)
+            if p_ftse:
+                ftse_shares += monthly / p_ftse
+                ftse_invested += monthly
+
+        # Latest values
+        spot_btc = btc_hist.values[-1] if btc_hist else None
+        spot_ftse = ftse_hist.values[-1] if ftse_hist else None
+
+        btc_value = btc_accum * spot_btc if spot_btc else 0
+        ftse_value = ftse_shares * spot_ftse if spot_ftse else 0
+
+        # Cash: monthly compounding, contribution at end of month
+        m_rate = cash_rate / 12.0
+        cash_value = 0.0
+        for _ in months:
+            cash_value = cash_value * (1 + m_rate) + monthly
+
+        payload = {
+            'monthly': monthly,
+            'start': start_dt.strftime('%Y-%m'),
+            'months': len(months),
+            'invested': round(invested, 2),
+            'btc': {
+                'accumulated': round(btc_accum, 8),
+                'value_gbp': round(btc_value, 2),
+                'multiplier': round(btc_value / invested, 2) if invested else None,
+            },
+            'cash': {
+                'rate_pct': cash_rate_pct,
+                'value_gbp': round(cash_value, 2),
+                'multiplier': round(cash_value / invested, 2) if invested else None,
+            },
+            'ftse': {
+                'value_gbp': round(ftse_value, 2) if spot_ftse else None,
+                'multiplier': round(ftse_value / invested, 2) if invested and spot_ftse else None,
+                'available': spot_ftse is not None,
+            },
+            'as_of_btc': btc_hist.date(-1).isoformat() if btc_hist else None,
+            'as_of_ftse': ftse_hist.date(-1).isoformat() if ftse_hist else None,
+            'spot_btc_gbp': round(spot_btc, 2) if spot_btc else None,
+        }
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ?years= accepted by /api/holding-returns; whole years keep the per-version memo bounded
+HOLDING_YEARS = range(1, 11)
+HOLDING_METRICS = ('total', 'cagr')
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (0..100) of an ascending list."""
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+def _holding_period(src: 'derived.Source', years: int, metric: str) -> Optional[dict]:
+    """Distribution of returns from buying on each day and holding `years`."""
+    hold_days = round(years * 365.25)
+    entries = src.holding_returns(hold_days)
+    if not entries:
+        return None
+    rets = [r for _, r in entries]
+    if metric == 'cagr':
+        rets = [(1.0 + r) ** (1.0 / years) - 1.0 for r in rets]
+    pct = [r * 100.0 for r in rets]
+    ranked = sorted(pct)
+    idx = downsample_xy(list(range(len(pct))), 400)
+    return {
+        'years': years,
+        'hold_days': hold_days,
+        'entries': len(pct),
+        'first_entry': src.date(entries[0][0]).strftime('%Y-%m-%d'),
+        'last_entry': src.date(entries[-1][0]).strftime('%Y-%m-%d'),
+        'summary': {
+            'mean_pct': round(sum(pct) / len(pct), 2),
+            'min_pct': round(ranked[0], 2),
+            'p10_pct': round(_percentile(ranked, 10), 2),
+            'p25_pct': round(_percentile(ranked, 25), 2),
+            'median_pct': round(_percentile(ranked, 50), 2),
+            'p75_pct': round(_percentile(ranked, 75), 2),
+            'p90_pct': round(_percentile(ranked, 90), 2),
+            'max_pct': round(ranked[-1], 2),
+            'pct_positive': round(sum(1 for v in pct if v > 0) / len(pct) * 100.0, 2),
+        },
+        # [entry date, return %] by entry date
+        'series': [[src.date(entries[i][0]).strftime('%Y-%m-%d'), round(pct[i], 2)] for i in idx],
+    }
+
+def api_holding_returns():
+    """If you'd bought BTC (GBP) on any day and held N years: the spread of
+    outcomes over every entry day with a full holding period behind it.
+
+    Query params:
+        years       comma-separated whole years, 1..10 (default 1,2,4)
+        metric      total (return over the whole hold, default) or cagr
+    """
+    try:
+        metric = (request.args.get('metric') or 'total').lower()
+        if metric not in HOLDING_METRICS:
+            return jsonify({'error': 'metric must be total or cagr'}), 400
+        try:
+            years_list = sorted({int(y) for y in (request.args.get('years') or '1,2,4').split(',')})
+            if not all(y in HOLDING_YEARS for y in years_list):
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': 'years must be whole numbers 1..10, comma-separated'}), 400
+
+        src = derived.source('btc_history_gbp')
+        if not len(src.values):
+            return jsonify({'error': 'BTC history unavailable'}), 502
+
+        periods = []
+        for years in years_list:
+            # Once per data version for each period and metric
+            period = src.memo(('holding_period', years, metric), lambda: _holding_period(src, years, metric))
+            if period:
+                periods.append(period)
+        return jsonify({
+            'metric': metric,
+            'currency': 'gbp',
+            'periods': periods,
+            'as_of': src.date(-1).strftime('%Y-%m-%d'),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
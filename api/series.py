@@ -0,0 +1,445 @@
+"""Daily price series held as parallel typed arrays.
+
+A :class:`DailySeries` is built once per upstream refresh; every chart range
+is then a slice of it, found by bisecting the timestamp array, so ranges
+share one copy of the data and always agree with each other. Large slices
+can be serialized a chunk at a time (:meth:`SeriesWindow.iter_json`).
+
+:meth:`DailySeries.to_bytes` packs a series into a compact binary form
+(little-endian typed arrays, optionally zlib-compressed) that
+:meth:`DailySeries.from_bytes` turns straight back into arrays, with no
+per-point Python objects; the series store keeps one per series. Lookups
+by date (:meth:`DailySeries.value_at_or_before`, :meth:`DailySeries.month_ends`)
+bisect the timestamp array, so only the dates asked about become datetimes.
+
+:class:`OrderIndex` answers "how many days closed above x" over any range
+of a series without scanning it; :class:`PowerLawFit` keeps a log-log trend
+fit that grows with the series.
+
+Also home to the small helpers shared by the sections that work on
+[(datetime, value), ...] lists: SMA, rolling extremes, volatility and
+correlation, holding-period returns and downsampling.
+"""
+import calendar
+import math
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DAY_MS = 86_400_000
+# 2009-01-03, the genesis block
+GENESIS_MS = 1_230_940_800_000
+
+# magic, flags, point count, first timestamp (ms)
+_PACK_HEADER = struct.Struct('<4sBIq')
+_PACK_MAGIC = b'BVS1'
+_PACK_DENSE = 1  # one point per day: timestamps are implied by the first one
+_PACK_ZLIB = 2
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+
+def to_ms(when: datetime) -> int:
+    """Epoch milliseconds of a naive UTC datetime."""
+    return (when - _EPOCH) // _MS
+
+
+def from_ms(ts_ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=ts_ms)
+
+
+def _le_bytes(a: array) -> bytes:
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le_bytes(typecode: str, data: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+class DailySeries:
+    """Ascending epoch-millisecond timestamps with one value per timestamp."""
+
+    def __init__(self, ts_ms: array, values: array):
+        self.ts_ms = ts_ms
+        self.values = values
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[datetime, float]]) -> 'DailySeries':
+        ts_ms = array('q')
+        values = array('d')
+        for d, v in pairs:
+            ts_ms.append(calendar.timegm(d.timetuple()) * 1000)
+            values.append(v)
+        return cls(ts_ms, values)
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
+
+    def date(self, i: int) -> datetime:
+        """Point i's timestamp as a naive UTC datetime."""
+        return from_ms(self.ts_ms[i])
+
+    def value_at_or_before(self, when: datetime) -> Optional[float]:
+        """Latest value dated on or before `when`, or None."""
+        i = bisect_right(self.ts_ms, to_ms(when)) - 1
+        return self.values[i] if i >= 0 else None
+
+    def month_ends(self) -> Dict[Tuple[int, int], float]:
+        """{(year, month): last value in that month}, from one bisect per
+        calendar month."""
+        out: Dict[Tuple[int, int], float] = {}
+        if not len(self):
+            return out
+        first, last = self.date(0), self.date(-1)
+        y, m = first.year, first.month
+        lo = 0
+        while (y, m) <= (last.year, last.month):
+            ny, nm = (y + 1, 1) if m == 12 else (y, m + 1)
+            hi = bisect_left(self.ts_ms, to_ms(datetime(ny, nm, 1)), lo)
+            if hi > lo:
+                out[(y, m)] = self.values[hi - 1]
+            lo, y, m = hi, ny, nm
+        return out
+
+    def to_bytes(self, compress: bool = True) -> bytes:
+        """Header, then the timestamps (omitted when the series has exactly
+        one point per day) and the values as little-endian int64 / float64."""
+        n = len(self)
+        first = self.ts_ms[0] if n else 0
+        flags = 0
+        body = b''
+        if n and self.ts_ms[-1] - first == (n - 1) * DAY_MS:
+            flags |= _PACK_DENSE
+        else:
+            body = _le_bytes(self.ts_ms)
+        body += _le_bytes(self.values)
+        if compress:
+            packed = zlib.compress(body, 6)
+            if len(packed) < len(body):
+                flags |= _PACK_ZLIB
+                body = packed
+        return _PACK_HEADER.pack(_PACK_MAGIC, flags, n, first) + body
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'DailySeries':
+        magic, flags, n, first = _PACK_HEADER.unpack_from(blob)
+        if magic != _PACK_MAGIC:
+            raise ValueError('not a packed DailySeries')
+        body = blob[_PACK_HEADER.size:]
+        if flags & _PACK_ZLIB:
+            body = zlib.decompress(body)
+        if flags & _PACK_DENSE:
+            ts_ms = array('q', range(first, first + n * DAY_MS, DAY_MS))
+        else:
+            ts_ms = _from_le_bytes('q', body[:n * 8])
+            body = body[n * 8:]
+        values = _from_le_bytes('d', body[:n * 8])
+        if len(ts_ms) != n or len(values) != n:
+            raise ValueError('truncated packed DailySeries')
+        return cls(ts_ms, values)
+
+    def window(self, start: int = 0, stop: Optional[int] = None) -> 'SeriesWindow':
+        return SeriesWindow(self, start, len(self) if stop is None else stop)
+
+    def last_days(self, days: int) -> 'SeriesWindow':
+        """Points within `days` days of the latest one (inclusive)."""
+        if not self.ts_ms:
+            return self.window()
+        start = bisect_left(self.ts_ms, self.ts_ms[-1] - days * DAY_MS)
+        return self.window(start)
+
+
+class SeriesWindow:
+    """A [start, stop) view onto a DailySeries; no data is copied until the
+    window is serialized."""
+
+    def __init__(self, series: DailySeries, start: int, stop: int):
+        self.series = series
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @property
+    def ts_ms(self) -> memoryview:
+        return memoryview(self.series.ts_ms)[self.start:self.stop]
+
+    @property
+    def values(self) -> memoryview:
+        return memoryview(self.series.values)[self.start:self.stop]
+
+    def pairs(self) -> List[List[float]]:
+        """[[ts_ms, value], ...] as the chart endpoints return them."""
+        return [list(p) for p in zip(self.ts_ms.tolist(), self.values.tolist())]
+
+    def iter_json(self, chunk_points: int = 2048) -> Iterator[str]:
+        """pairs() as compact JSON text, a chunk of points at a time, so a
+        response can be sent as it is encoded without building the whole
+        list or string first."""
+        ts_ms, values = self.series.ts_ms, self.series.values
+        yield '['
+        for lo in range(self.start, self.stop, chunk_points):
+            hi = min(lo + chunk_points, self.stop)
+            body = ','.join(f'[{t},{v!r}]' for t, v in zip(ts_ms[lo:hi], values[lo:hi]))
+            yield body if lo == self.start else ',' + body
+        yield ']'
+
+
+class OrderIndex:
+    """Rank queries over value ranges of a series: how many of the values at
+    positions [lo, hi) are above x, in O(log^2 n).
+
+    A merge-sort tree kept bottom-up: level j holds every complete, aligned
+    run of 2**j values, each run sorted. Appending a value completes at most
+    one run per level, which is merged from the two halves below, so the
+    index grows with the series at O(log n) amortized per point instead of
+    being rebuilt.
+    """
+
+    def __init__(self):
+        self.levels: List[array] = [array('d')]
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    def copy(self) -> 'OrderIndex':
+        other = OrderIndex()
+        other.levels = [array('d', level) for level in self.levels]
+        return other
+
+    def extend(self, values: Iterable[float]):
+        levels = self.levels
+        for v in values:
+            levels[0].append(v)
+            n = len(levels[0])
+            j = 1
+            while n % (1 << j) == 0:
+                if j == len(levels):
+                    levels.append(array('d'))
+                half = 1 << (j - 1)
+                below = levels[j - 1]
+                left, right = below[n - 2 * half:n - half], below[n - half:n]
+                # Timsort merges the two sorted runs in linear time
+                levels[j].extend(sorted(left + right))
+                j += 1
+
+    def count_above(self, x: float, lo: int = 0, hi: Optional[int] = None) -> int:
+        """Number of values at positions [lo, hi) greater than x."""
+        hi = len(self) if hi is None else min(hi, len(self))
+        count = 0
+        while lo < hi:
+            # Largest aligned, complete run starting at lo and ending by hi
+            j = 0
+            while (j + 1 < len(self.levels) and lo % (2 << j) == 0 and lo + (2 << j) <= hi
+                   and lo + (2 << j) <= len(self.levels[j + 1])):
+                j += 1
+            size = 1 << j
+            count += lo + size - bisect_right(self.levels[j], x, lo, lo + size)
+            lo += size
+        return count
+
+
+class PowerLawFit:
+    """Least-squares fit of log10(price) against log10(days since the
+    genesis block), i.e. price = 10**intercept * days**slope.
+
+    Only the running sums behind the normal equations are kept, so adding a
+    day is O(1) and a fit over the whole history can be extended as days
+    arrive instead of being refitted.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+
+    def copy(self) -> 'PowerLawFit':
+        other = PowerLawFit()
+        other.__dict__.update(self.__dict__)
+        return other
+
+    @staticmethod
+    def days(ts_ms: float) -> float:
+        return (ts_ms - GENESIS_MS) / DAY_MS
+
+    def extend(self, ts_ms: Iterable[int], values: Iterable[float]):
+        """Add points; those before genesis or without a positive price are skipped."""
+        for t, v in zip(ts_ms, values):
+            if t <= GENESIS_MS or v <= 0:
+                continue
+            x = math.log10(self.days(t))
+            y = math.log10(v)
+            self.n += 1
+            self.sx += x
+            self.sy += y
+            self.sxx += x * x
+            self.sxy += x * y
+            self.syy += y * y
+
+    def params(self) -> Optional[Tuple[float, float, float, float]]:
+        """(slope, intercept, residual std dev in log10 units, r²), or None
+        with fewer than three points."""
+        n = self.n
+        if n < 3:
+            return None
+        vxx = self.sxx - self.sx * self.sx / n
+        vxy = self.sxy - self.sx * self.sy / n
+        vyy = self.syy - self.sy * self.sy / n
+        if vxx <= 0 or vyy <= 0:
+            return None
+        slope = vxy / vxx
+        intercept = (self.sy - slope * self.sx) / n
+        sse = max(vyy - slope * vxy, 0.0)
+        return slope, intercept, math.sqrt(sse / (n - 2)), 1.0 - sse / vyy
+
+
+def sma(values: List[Optional[float]], window: int) -> List[Optional[float]]:
+    """Simple moving average. Skips Nones at the window boundary."""
+    out: List[Optional[float]] = [None] * len(values)
+    if window <= 0 or window > len(values):
+        return out
+    s = 0.0
+    valid = 0
+    q: 'deque' = deque()
+    for i, v in enumerate(values):
+        if v is None:
+            q.append(None)
+        else:
+            q.append(v)
+            s += v
+            valid += 1
+        if len(q) > window:
+            old = q.popleft()
+            if old is not None:
+                s -= old
+                valid -= 1
+        if len(q) == window and valid > 0:
+            out[i] = s / valid
+    return out
+
+
+def rolling_extreme_index(values: List[float], window: int, highest: bool = True) -> List[int]:
+    """Index of the highest (or lowest) value over each trailing window of
+    up to `window` points, earliest on ties. One pass with a monotonic deque."""
+    out: List[int] = []
+    q: 'deque' = deque()
+    for i, v in enumerate(values):
+        if highest:
+            while q and values[q[-1]] < v:
+                q.pop()
+        else:
+            while q and values[q[-1]] > v:
+                q.pop()
+        q.append(i)
+        if q[0] <= i - window:
+            q.popleft()
+        out.append(q[0])
+    return out
+
+
+def rolling_volatility(returns: List[float], window: int, periods_per_year: int = 365) -> List[Optional[float]]:
+    """Annualized standard deviation (%) of each trailing `window` of
+    returns, None until the first window is full. Welford's update, with
+    the oldest return removed as each new one arrives."""
+    out: List[Optional[float]] = [None] * len(returns)
+    if window < 2:
+        return out
+    scale = (periods_per_year ** 0.5) * 100.0
+    mean = 0.0
+    m2 = 0.0
+    for i, x in enumerate(returns):
+        if i < window:
+            d = x - mean
+            mean += d / (i + 1)
+            m2 += d * (x - mean)
+        else:
+            y = returns[i - window]
+            old_mean = mean
+            mean += (x - y) / window
+            m2 += (x - y) * (x - mean + y - old_mean)
+        if i >= window - 1:
+            out[i] = (max(m2, 0.0) / (window - 1)) ** 0.5 * scale
+    return out
+
+
+_VARIANCE_EPS = 1e-9
+
+
+def rolling_corr_beta(xs: List[Optional[float]], ys: List[Optional[float]], window: int,
+                      min_points: int = 3) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """Correlation of xs with ys, and the beta of xs on ys, over each trailing
+    `window` of positions, skipping positions where either is None. Built
+    from prefix sums, so each window is O(1) however long it is. None where
+    a window has fewer than min_points usable pairs or no variance."""
+    n = len(xs)
+    # Prefix sums over the usable pairs: count, x, y, x², y², xy
+    c = [[0.0] * (n + 1) for _ in range(6)]
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        ok = x is not None and y is not None
+        row = (1.0, x, y, x * x, y * y, x * y) if ok else (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        for k in range(6):
+            c[k][i + 1] = c[k][i] + row[k]
+    corr: List[Optional[float]] = [None] * n
+    beta: List[Optional[float]] = [None] * n
+    for i in range(n):
+        lo = max(0, i + 1 - window)
+        m, sx, sy, sxx, syy, sxy = (c[k][i + 1] - c[k][lo] for k in range(6))
+        if m < min_points:
+            continue
+        vx = m * sxx - sx * sx
+        vy = m * syy - sy * sy
+        cov = m * sxy - sx * sy
+        # The differences cancel to rounding noise, not zero, over a window
+        # of equal values; that still counts as no variance
+        if vy > _VARIANCE_EPS * m * syy:
+            beta[i] = cov / vy
+            if vx > _VARIANCE_EPS * m * sxx:
+                corr[i] = max(-1.0, min(1.0, cov / math.sqrt(vx * vy)))
+    return corr, beta
+
+
+def holding_returns(series: DailySeries, hold_days: int) -> List[Tuple[int, float]]:
+    """(entry index, simple return) from buying at each point and selling at
+    the first point at least `hold_days` later; only entries with such an
+    exit are included, so the entries cover a prefix of the series. Entries
+    where either price is zero or missing are skipped rather than given a
+    made-up return. One pass: entry and exit indices both only move forward."""
+    ts_ms, values = series.ts_ms, series.values
+    hold_ms = hold_days * DAY_MS
+    n = len(ts_ms)
+    out: List[Tuple[int, float]] = []
+    j = 0
+    for i in range(n):
+        target = ts_ms[i] + hold_ms
+        while j < n and ts_ms[j] < target:
+            j += 1
+        if j == n:
+            break
+        if values[i] > 0 and values[j] > 0:
+            out.append((i, values[j] / values[i] - 1.0))
+    return out
+
+
+def downsample_xy(pairs: List[Tuple[float, float]], max_points: int = 600) -> List[Tuple[float, float]]:
+    """Even-stride downsample. Keeps the last point exactly."""
+    if not pairs or len(pairs) <= max_points:
+        return pairs
+    step = max(1, len(pairs) // max_points)
+    out = [pairs[i] for i in range(0, len(pairs), step)]
+    if out[-1] != pairs[-1]:
+        out.append(pairs[-1])
+    return out
+
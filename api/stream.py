@@ -0,0 +1,194 @@
+"""Server-sent events for the header tip pill and the spot price widgets.
+
+One poller thread per instance fetches the block tip and spot price and
+publishes an event whenever either changes; every open /api/stream
+response relays those events, so idle tabs cost one upstream call per
+instance rather than one per tab. The poller starts with the first
+subscriber and stops once nobody has listened for IDLE_STOP_S.
+
+Each event id is '<instance>-<seq>'. A client that reconnects with a
+Last-Event-ID from this instance is sent whatever it missed from a short
+backlog; anyone else (new client, different instance, backlog overrun)
+gets the latest value of each event type. Responses end after
+STREAM_MAX_S; EventSource then reconnects by itself and resumes from its
+last id.
+
+The feed is meant for single-process deployments (`python index.py`, a
+long-running WSGI server). With STREAM_ENABLED off, as on Vercel, where
+each open stream would hold a function instance and each instance would
+run its own poller, the endpoint answers 204, which tells EventSource not
+to reconnect, and the pages don't open it in the first place.
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from flask import Response, current_app, request
+
+import upstream
+from cache import write_cache
+
+HEARTBEAT_S = 15.0
+STREAM_MAX_S = 55.0
+RETRY_MS = 3000
+TIP_POLL_S = 20.0
+SPOT_POLL_S = 30.0
+IDLE_STOP_S = 120.0
+BACKLOG = 64
+
+Event = Tuple[int, str, dict]
+
+
+class Broadcaster:
+    """Sequenced events with a bounded backlog, plus the latest event of
+    each type for clients that can't be resumed."""
+
+    def __init__(self, backlog: int = BACKLOG):
+        self.instance = format(int(time.time() * 1000), 'x')
+        self.seq = 0
+        self.backlog: deque = deque(maxlen=backlog)
+        self.latest: dict = {}
+        self.cond = threading.Condition()
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+
+    def publish(self, kind: str, data: dict):
+        """Record and wake subscribers, unless data is unchanged."""
+        with self.cond:
+            prev = self.latest.get(kind)
+            if prev is not None and prev[2] == data:
+                return
+            self.seq += 1
+            event = (self.seq, kind, data)
+            self.backlog.append(event)
+            self.latest[kind] = event
+            self.cond.notify_all()
+
+    def resume(self, last_event_id: Optional[str]) -> Tuple[List[Event], int]:
+        """Events to send a client first, and the seq to wait after."""
+        with self.cond:
+            try:
+                instance, seq = (last_event_id or '').rsplit('-', 1)
+                seq = int(seq)
+            except ValueError:
+                instance, seq = None, -1
+            oldest = self.backlog[0][0] if self.backlog else self.seq + 1
+            if instance == self.instance and oldest - 1 <= seq <= self.seq:
+                return [e for e in self.backlog if e[0] > seq], self.seq
+            return sorted(self.latest.values()), self.seq
+
+    def wait(self, after: int, timeout: float) -> Tuple[List[Event], int]:
+        """Events published after seq `after`, waiting up to timeout for one."""
+        with self.cond:
+            if self.seq <= after:
+                self.cond.wait(timeout)
+            return [e for e in self.backlog if e[0] > after], self.seq
+
+    def subscribe(self, delta: int):
+        with self.cond:
+            self.subscribers += delta
+            self.last_active = time.monotonic()
+
+    def idle_for(self) -> float:
+        with self.cond:
+            return 0.0 if self.subscribers else time.monotonic() - self.last_active
+
+
+broadcaster = Broadcaster()
+_poller: Optional[threading.Thread] = None
+_poller_lock = threading.Lock()
+
+
+def _poll_tip():
+    try:
+        r = upstream.get('mempool', 'https://mempool.space/api/blocks/tip/height', timeout=10)
+        r.raise_for_status()
+        height = int(r.text.strip())
+    except Exception:
+        return
+    write_cache('tip_height_cache', {'height': height})
+    broadcaster.publish('tip', {'height': height})
+
+
+def _poll_spot():
+    try:
+        r = upstream.get(
+            'coingecko',
+            'https://api.coingecko.com/api/v3/simple/price',
+            params={'ids': 'bitcoin', 'vs_currencies': 'gbp,usd', 'include_24hr_change': 'true'},
+            timeout=15,
+            priority=upstream.BACKGROUND,
+        )
+        r.raise_for_status()
+        spot = {k: float(v) for k, v in r.json()['bitcoin'].items() if v is not None}
+    except Exception:
+        return
+    if 'gbp' in spot:
+        write_cache('spot_gbp_cache', {'gbp': spot['gbp']})
+    broadcaster.publish('spot', spot)
+
+
+def _poll_loop():
+    global _poller
+    next_tip = next_spot = time.monotonic()
+    while True:
+        with _poller_lock:
+            if broadcaster.idle_for() > IDLE_STOP_S:
+                _poller = None
+                return
+        now = time.monotonic()
+        if now >= next_tip:
+            _poll_tip()
+            next_tip = now + TIP_POLL_S
+        if now >= next_spot:
+            _poll_spot()
+            next_spot = now + SPOT_POLL_S
+        time.sleep(max(0.0, min(next_tip, next_spot) - time.monotonic()))
+
+
+def _ensure_poller():
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = threading.Thread(target=_poll_loop, name='stream-poller', daemon=True)
+            _poller.start()
+
+
+def _format(event: Event) -> str:
+    seq, kind, data = event
+    return f'id: {broadcaster.instance}-{seq}\nevent: {kind}\ndata: {json.dumps(data)}\n\n'
+
+
+def event_stream():
+    """SSE feed of `tip` ({height}) and `spot` ({gbp, usd, gbp_24h_change,
+    usd_24h_change}) events, with a comment heartbeat every HEARTBEAT_S."""
+    if not current_app.config.get('STREAM_ENABLED', True):
+        return Response(status=204)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+
+    def events():
+        broadcaster.subscribe(+1)
+        try:
+            _ensure_poller()
+            yield f'retry: {RETRY_MS}\n\n'
+            pending, cursor = broadcaster.resume(last_event_id)
+            ends_at = time.monotonic() + STREAM_MAX_S
+            while True:
+                for event in pending:
+                    yield _format(event)
+                left = ends_at - time.monotonic()
+                if left <= 0:
+                    return
+                pending, seq = broadcaster.wait(cursor, min(HEARTBEAT_S, left))
+                if not pending:
+                    yield ': ping\n\n'
+                cursor = seq
+        finally:
+            broadcaster.subscribe(-1)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
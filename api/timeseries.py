@@ -0,0 +1,281 @@
+"""Local store for the long daily / monthly series (prices, money supply, CPI).
+
+Each series lives in its own SQLite table keyed by epoch day (an INTEGER
+PRIMARY KEY, so range queries walk the table's own B-tree), next to a
+``series_meta`` row recording where it came from and when it was last
+refreshed. A refresh upserts observations: only new days and revised values
+are written, and a read can ask for just a date range instead of decoding
+the whole history.
+
+Refreshes are incremental: :func:`refresh_start` tells a loader which date
+to ask its upstream for (the last stored observation minus an overlap that
+catches recent revisions), or None when the periodic full download that
+reconciles older revisions is due.
+
+Next to its table, each series keeps a packed copy of its whole history
+(``series_packed``, see DailySeries.to_bytes), rewritten on every write, so
+:func:`read_series` costs one row fetch and no per-point decoding. A hash of
+that copy is the series' content :func:`version`, which derived payloads are
+cached against.
+
+The file is DATA_DIR/series.sqlite3 unless BITVIZ_SERIES_DB says otherwise.
+Series that were cached as JSON blobs under '<name>_cache' before the store
+existed are imported, with their original fetch time, on first use, and
+series stored before packed copies existed get one on their first read.
+"""
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cache import DATA_DIR, backend, decode_series, refresh_lead
+from cache_backends import open_sqlite
+from series import DAY_MS, DailySeries
+
+DB_PATH = Path(os.environ.get('BITVIZ_SERIES_DB') or DATA_DIR / 'series.sqlite3')
+EPOCH = datetime(1970, 1, 1)
+# How often a series is downloaded in full rather than incrementally
+FULL_REFRESH_EVERY = timedelta(days=7)
+
+_NAME_RE = re.compile(r'[a-z0-9_]+')
+_local = threading.local()
+_ready: Set[str] = set()
+_ready_lock = threading.Lock()
+
+
+def _day(d: datetime) -> int:
+    return (d - EPOCH).days
+
+
+def _conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = open_sqlite(DB_PATH)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS series_meta ('
+            ' name TEXT PRIMARY KEY,'
+            ' source TEXT,'
+            ' fetched_at TEXT,'
+            ' updated_at TEXT,'
+            ' first_day INTEGER,'
+            ' last_day INTEGER,'
+            ' points INTEGER NOT NULL DEFAULT 0,'
+            ' reconciled_at TEXT,'
+            ' version TEXT)'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS series_packed (name TEXT PRIMARY KEY, blob BLOB NOT NULL)')
+        columns = {r[1] for r in conn.execute('PRAGMA table_info(series_meta)')}
+        for column in ('reconciled_at', 'version'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE series_meta ADD COLUMN {column} TEXT')
+        _local.conn = conn
+    return conn
+
+
+def _table(name: str) -> str:
+    """Quoted table name for a series, creating the table (and importing
+    the legacy JSON cache for it) the first time this process sees it."""
+    if not _NAME_RE.fullmatch(name):
+        raise ValueError(f'bad series name: {name!r}')
+    table = f'"series_{name}"'
+    if name not in _ready:
+        with _ready_lock:
+            if name not in _ready:
+                conn = _conn()
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (day INTEGER PRIMARY KEY, value REAL NOT NULL)')
+                if conn.execute('SELECT 1 FROM series_meta WHERE name = ?', (name,)).fetchone() is None:
+                    _import_legacy(name)
+                _ready.add(name)
+    return table
+
+
+def _import_legacy(name: str):
+    key = f'{name}_cache'
+    entry = backend().get(key)
+    if not entry:
+        return
+    data = entry.get('data') or {}
+    points = decode_series(data, 'series') or decode_series(data, 'prices')
+    if points and _write(name, points, source=f'migrated from cache {key}', full=True,
+                         fetched_at=entry.get('fetched_at')) is not None:
+        backend().delete(key)
+
+
+def fresh(name: str, max_age: timedelta) -> bool:
+    """True if the series holds data refreshed within max_age (less the
+    cache.refresh_ahead lead, when warming)."""
+    m = info(name)
+    try:
+        age = datetime.utcnow() - datetime.fromisoformat(m['fetched_at']) if m else None
+        return bool(m and m['points'] and age < max_age - refresh_lead())
+    except (TypeError, ValueError):
+        return False
+
+
+def refresh_start(name: str, overlap: timedelta,
+                  full_every: timedelta = FULL_REFRESH_EVERY) -> Optional[datetime]:
+    """Date an incremental refresh should request data from, or None when
+    the series has to be downloaded in full: it is empty, or its last full
+    download is older than full_every."""
+    m = info(name)
+    try:
+        if not m or not m['points'] or not m['reconciled_at']:
+            return None
+        if datetime.utcnow() - datetime.fromisoformat(m['reconciled_at']) >= full_every:
+            return None
+        return datetime.strptime(m['last_date'], '%Y-%m-%d') - overlap
+    except (TypeError, ValueError):
+        return None
+
+
+def read(name: str, start: Optional[datetime] = None,
+         end: Optional[datetime] = None) -> List[Tuple[datetime, float]]:
+    """Observations with start <= date <= end, ascending. Empty if the
+    series is unknown or the store can't be opened."""
+    try:
+        table = _table(name)
+        rows = _conn().execute(
+            f'SELECT day, value FROM {table} WHERE day BETWEEN ? AND ? ORDER BY day',
+            (_day(start) if start else -2**62, _day(end) if end else 2**62),
+        ).fetchall()
+    except Exception:
+        return []
+    return [(EPOCH + timedelta(days=day), value) for day, value in rows]
+
+
+def read_series(name: str, fallback: Iterable[Tuple[datetime, float]] = ()) -> DailySeries:
+    """The whole series as typed arrays, decoded from its packed copy.
+    If the series is unknown or the store can't be opened: `fallback` (e.g.
+    what a loader has just fetched) as a series, so empty by default."""
+    series = _read_packed(name)
+    return series if len(series) else DailySeries.from_pairs(fallback)
+
+
+def _read_packed(name: str) -> DailySeries:
+    try:
+        _table(name)
+        conn = _conn()
+        row = conn.execute('SELECT blob FROM series_packed WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            return DailySeries.from_bytes(row[0])
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return _repack(name)
+    except Exception:
+        return DailySeries.from_pairs([])
+
+
+def version(name: str) -> Optional[str]:
+    """Content hash of the series, which changes exactly when one of its
+    values does. None if the series is empty or unknown."""
+    m = info(name)
+    if not m or not m['points']:
+        return None
+    if m['version'] is None:
+        # Stored before versions existed: repacking sets it
+        read_series(name)
+        m = info(name)
+    return m['version'] if m else None
+
+
+def _repack(name: str) -> DailySeries:
+    """Rebuild a series' packed copy and version from its table. Call
+    inside a write transaction."""
+    conn = _conn()
+    series = DailySeries.from_pairs([])
+    for day, value in conn.execute(f'SELECT day, value FROM "series_{name}" ORDER BY day'):
+        series.ts_ms.append(day * DAY_MS)
+        series.values.append(value)
+    blob = series.to_bytes()
+    conn.execute('INSERT OR REPLACE INTO series_packed (name, blob) VALUES (?, ?)', (name, blob))
+    conn.execute('UPDATE series_meta SET version = ? WHERE name = ?',
+                 (hashlib.sha1(blob).hexdigest()[:16], name))
+    return series
+
+
+def upsert(name: str, points: Iterable[Tuple[datetime, float]], source: str,
+           full: bool = False) -> Optional[int]:
+    """Record a successful refresh: add new days, update revised values and
+    mark the series fresh. Pass full=True when points are the whole history,
+    which also restarts the FULL_REFRESH_EVERY clock. An incremental refresh
+    that found nothing new should still call this with no points.
+
+    Returns the number of rows written, or None if the store is unavailable
+    (e.g. a read-only filesystem)."""
+    try:
+        _table(name)
+        return _write(name, points, source, full)
+    except Exception:
+        return None
+
+
+def _write(name: str, points: Iterable[Tuple[datetime, float]], source: str,
+           full: bool = False, fetched_at: Optional[str] = None) -> Optional[int]:
+    table = f'"series_{name}"'
+    rows = [(_day(d), float(v)) for d, v in points]
+    now = datetime.utcnow().isoformat()
+    conn = _conn()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        before = conn.total_changes
+        # INSERT OR IGNORE + UPDATE rather than ON CONFLICT, which needs
+        # SQLite 3.24+; later duplicates of a day win, as with a dict.
+        conn.executemany(f'INSERT OR IGNORE INTO {table} (day, value) VALUES (?, ?)', rows)
+        conn.executemany(f'UPDATE {table} SET value = ? WHERE day = ? AND value <> ?',
+                         [(v, day, v) for day, v in rows])
+        written = conn.total_changes - before
+        first, last, count = conn.execute(f'SELECT MIN(day), MAX(day), COUNT(*) FROM {table}').fetchone()
+        prev = conn.execute('SELECT updated_at, reconciled_at, version FROM series_meta WHERE name = ?',
+                            (name,)).fetchone()
+        fetched_at = fetched_at or now
+        conn.execute(
+            'INSERT OR REPLACE INTO series_meta'
+            ' (name, source, fetched_at, updated_at, first_day, last_day, points, reconciled_at, version)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (name, source, fetched_at, now if written or not prev else prev[0], first, last, count,
+             fetched_at if full else (prev[1] if prev else None), prev[2] if prev else None),
+        )
+        if written or prev is None:
+            _repack(name)
+    return written
+
+
+def info(name: str) -> Optional[dict]:
+    """Provenance and freshness for a series: source, fetched_at (last
+    successful refresh), updated_at (last time a value changed),
+    reconciled_at (last full download), content version, first/last date
+    and number of points."""
+    try:
+        _table(name)
+        row = _conn().execute(
+            'SELECT source, fetched_at, updated_at, reconciled_at, version, first_day, last_day, points'
+            ' FROM series_meta WHERE name = ?',
+            (name,),
+        ).fetchone()
+    except Exception:
+        return None
+    if row is None:
+        return None
+    source, fetched_at, updated_at, reconciled_at, content_version, first_day, last_day, points = row
+    return {
+        'source': source,
+        'fetched_at': fetched_at,
+        'updated_at': updated_at,
+        'reconciled_at': reconciled_at,
+        'version': content_version,
+        'first_date': (EPOCH + timedelta(days=first_day)).strftime('%Y-%m-%d') if first_day is not None else None,
+        'last_date': (EPOCH + timedelta(days=last_day)).strftime('%Y-%m-%d') if last_day is not None else None,
+        'points': points,
+    }
+
+
+def status() -> Dict[str, dict]:
+    """info() for every stored series, for the /api/series-status endpoint."""
+    try:
+        names = [r[0] for r in _conn().execute('SELECT name FROM series_meta ORDER BY name')]
+    except Exception:
+        return {}
+    return {name: info(name) for name in names}
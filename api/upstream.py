@@ -0,0 +1,361 @@
+"""Outbound HTTP for every upstream data provider.
+
+All calls go through :func:`get`, which keeps a circuit breaker per provider
+and a short-lived negative cache per request. Once a provider is known to be
+down, callers get :class:`UpstreamUnavailable` immediately instead of paying
+the network timeout again, and fall through to their fallback source or
+stale cache.
+
+Calls made while a request deadline is active (see deadline.py) also have
+their timeout clamped to the time left in that budget.
+
+Providers with a published rate limit get a token bucket (``RATE_LIMITS``).
+``INTERACTIVE`` calls may spend the whole bucket; ``BACKGROUND`` calls leave a
+reserve for them and wait for quota rather than being sent into a 429.
+Every call is recorded in a small in-memory ledger.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import requests
+
+import deadline
+
+# Consecutive failures before a breaker opens, and how long it stays open.
+# The cooldown doubles each time a half-open probe fails, up to the max.
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN_S = 30.0
+MAX_COOLDOWN_S = 15 * 60.0
+
+# How long a single failed request is remembered, even while its provider's
+# breaker is still closed.
+NEGATIVE_TTL_S = 60.0
+# Most failed requests remembered at once; keys carry their params, so
+# e.g. incremental date windows would otherwise pile up.
+NEGATIVE_MAX_ENTRIES = 500
+
+# Don't start a call with less budget than this; it would only time out.
+MIN_CALL_BUDGET_S = 0.25
+
+# Scheduling priorities for rate-limited providers.
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Longest an interactive call waits for quota before giving up (and the
+# caller serving stale data). Background calls wait until the request
+# deadline, or up to BACKGROUND_MAX_WAIT_S outside a request.
+INTERACTIVE_MAX_WAIT_S = 2.0
+BACKGROUND_MAX_WAIT_S = 120.0
+
+LEDGER_SIZE = 200
+
+_lock = threading.Lock()
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """Raised instead of calling a provider that is known to be failing."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Raised when the current request has no upstream budget left."""
+
+
+class RateLimited(UpstreamUnavailable):
+    """Raised when a call could not get provider quota within its wait limit."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with exponential cooldown.
+
+    While open, :meth:`allow` refuses every call. Once the cooldown passes a
+    single probe call is let through (half-open); its outcome either closes
+    the breaker or re-opens it with a doubled cooldown.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 base_cooldown: float = BASE_COOLDOWN_S, max_cooldown: float = MAX_COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = base_cooldown
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        with _lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() < self.open_until:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            # Half-open: exactly one probe at a time
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with _lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self.probe_in_flight = False
+            self.last_error = None
+
+    def release_probe(self):
+        """Give up a half-open probe without judging the provider."""
+        with _lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, error: str):
+        with _lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._open()
+            elif self.failures >= self.failure_threshold:
+                self.cooldown = self.base_cooldown
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.open_until = time.monotonic() + self.cooldown
+        self.probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with _lock:
+            retry_in = max(0.0, self.open_until - time.monotonic()) if self.state == self.OPEN else 0.0
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'cooldown_s': round(self.cooldown, 1),
+                'retry_in_s': round(retry_in, 1),
+                'last_error': self.last_error,
+            }
+
+
+class TokenBucket:
+    """Token bucket refilled at ``per_minute`` calls, holding up to ``burst``.
+
+    The last ``reserve`` tokens are kept for interactive calls; background
+    calls sleep until the bucket is above the reserve.
+    """
+
+    def __init__(self, per_minute: float, burst: int, reserve: int = 0):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.reserve = float(reserve)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority: str, max_wait: float) -> float:
+        """Take one token, sleeping for it if needed. Returns seconds waited;
+        raises :class:`RateLimited` if that would take longer than max_wait."""
+        need = 1.0 if priority == INTERACTIVE else 1.0 + self.reserve
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= need:
+                    self.tokens -= 1.0
+                    return waited
+                wait = (need - self.tokens) / self.rate
+            if waited + wait > max_wait:
+                raise RateLimited(f'no quota within {max_wait:.1f}s ({priority})')
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, retry_after: float):
+        """The provider said 429: stop issuing calls for retry_after seconds."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - retry_after * self.rate
+            self.updated = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                'tokens': round(self.tokens, 2),
+                'burst': self.burst,
+                'reserve': self.reserve,
+                'per_minute': round(self.rate * 60.0, 1),
+            }
+
+
+# CoinGecko's public API allows roughly 10-30 calls/minute depending on load;
+# stay at the low end and keep two calls in hand for spot lookups.
+RATE_LIMITS: Dict[str, TokenBucket] = {
+    'coingecko': TokenBucket(per_minute=10, burst=5, reserve=2),
+}
+
+_ledger: deque = deque(maxlen=LEDGER_SIZE)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+# (provider, url, params) -> (expires_at, error message)
+_negative: Dict[Tuple, Tuple[float, str]] = {}
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    with _lock:
+        b = _breakers.get(provider)
+        if b is None:
+            b = _breakers[provider] = CircuitBreaker(provider)
+        return b
+
+
+def _negative_key(provider: str, url: str, params) -> Tuple:
+    if isinstance(params, dict):
+        params = tuple(sorted((str(k), str(v)) for k, v in params.items()))
+    return (provider, url, params)
+
+
+def _is_failure(resp: requests.Response) -> bool:
+    """Server errors and throttling count against the provider; other 4xx
+    responses are the caller's problem and leave the breaker alone."""
+    return resp.status_code >= 500 or resp.status_code == 429
+
+
+def get(provider: str, url: str, priority: str = INTERACTIVE, **kwargs) -> requests.Response:
+    """``requests.get`` guarded by the provider's breaker and negative cache.
+
+    Raises :class:`UpstreamUnavailable` without touching the network when
+    the breaker is open or this exact request failed within the last
+    ``NEGATIVE_TTL_S`` seconds, :class:`DeadlineExceeded` when the request
+    budget is spent, and :class:`RateLimited` when no quota frees up in time.
+    Otherwise returns the response as-is, so callers keep their own
+    ``r.ok`` / ``raise_for_status()`` handling.
+    """
+    key = _negative_key(provider, url, kwargs.get('params'))
+    with _lock:
+        neg = _negative.get(key)
+        if neg is not None:
+            if time.monotonic() < neg[0]:
+                raise UpstreamUnavailable(f'{provider}: recently failed ({neg[1]})')
+            del _negative[key]
+
+    d = deadline.current()
+    if d is not None and d.remaining() < MIN_CALL_BUDGET_S:
+        d.exhausted = True
+        raise DeadlineExceeded(f'{provider}: request budget exhausted')
+
+    # Ask the breaker first: a call it refuses must not spend quota
+    b = breaker(provider)
+    if not b.allow():
+        raise UpstreamUnavailable(f'{provider}: circuit open')
+
+    # Wait for quota (deferring background calls) before the deadline clamp,
+    # since waiting spends the same budget.
+    waited = 0.0
+    bucket = RATE_LIMITS.get(provider)
+    if bucket is not None:
+        if priority == INTERACTIVE:
+            max_wait = INTERACTIVE_MAX_WAIT_S
+        else:
+            max_wait = BACKGROUND_MAX_WAIT_S
+        if d is not None:
+            max_wait = min(max_wait, d.remaining() - MIN_CALL_BUDGET_S)
+        try:
+            waited = bucket.acquire(priority, max_wait)
+        except RateLimited as e:
+            b.release_probe()
+            if d is not None:
+                d.exhausted = True
+            _log(provider, priority, url, 'deferred', waited=max_wait)
+            raise RateLimited(f'{provider}: {e}') from None
+
+    # Clamp the provider's own timeout to whatever is left of the budget
+    clamped = False
+    if d is not None:
+        left = d.remaining()
+        timeout = kwargs.get('timeout')
+        if timeout is None or left < timeout:
+            kwargs['timeout'] = max(left, MIN_CALL_BUDGET_S)
+            clamped = True
+
+    started = time.monotonic()
+    try:
+        resp = requests.get(url, **kwargs)
+    except requests.Timeout as e:
+        _log(provider, priority, url, type(e).__name__, waited, started)
+        if clamped:
+            # Our budget ran out, not the provider's patience; don't hold it
+            # against the breaker, but release a half-open probe slot.
+            d.exhausted = True
+            b.release_probe()
+        else:
+            _record_failure(b, key, f'{type(e).__name__}')
+        raise
+    except requests.RequestException as e:
+        _log(provider, priority, url, type(e).__name__, waited, started)
+        _record_failure(b, key, f'{type(e).__name__}')
+        raise
+    _log(provider, priority, url, resp.status_code, waited, started)
+    if resp.status_code == 429 and bucket is not None:
+        try:
+            retry_after = float(resp.headers.get('Retry-After', 60))
+        except ValueError:
+            retry_after = 60.0
+        bucket.penalize(retry_after)
+    if _is_failure(resp):
+        _record_failure(b, key, f'HTTP {resp.status_code}')
+    else:
+        b.record_success()
+    return resp
+
+
+def _log(provider: str, priority: str, url: str, outcome, waited: float = 0.0,
+         started: Optional[float] = None):
+    _ledger.append({
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'provider': provider,
+        'priority': priority,
+        'path': url.split('://', 1)[-1].split('/', 1)[-1],
+        'outcome': outcome,
+        'waited_ms': round(waited * 1000.0),
+        'elapsed_ms': round((time.monotonic() - started) * 1000.0) if started is not None else None,
+    })
+
+
+def _record_failure(b: CircuitBreaker, key: Tuple, error: str):
+    b.record_failure(error)
+    now = time.monotonic()
+    with _lock:
+        # Re-inserted at the end, so entries stay in expiry order
+        _negative.pop(key, None)
+        _negative[key] = (now + NEGATIVE_TTL_S, error)
+        for k in list(_negative):
+            if _negative[k][0] > now and len(_negative) <= NEGATIVE_MAX_ENTRIES:
+                break
+            del _negative[k]
+
+
+def status() -> dict:
+    """Breaker state per provider, quota per rate-limited provider and the
+    most recent calls, for the /api/upstream-status endpoint."""
+    with _lock:
+        providers = sorted(_breakers)
+    return {
+        'providers': {name: breaker(name).snapshot() for name in providers},
+        'rate_limits': {name: bucket.snapshot() for name, bucket in RATE_LIMITS.items()},
+        'ledger': list(_ledger)[::-1],
+    }
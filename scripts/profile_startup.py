@@ -0,0 +1,83 @@
+"""Measure cold-start cost of the Flask app the way a fresh Vercel instance
+pays it: import api/index.py in a new interpreter, then serve one request.
+
+    python scripts/profile_startup.py [--runs 15] [--api-dir DIR] [path ...]
+
+Prints, per path, the p50 time to import Flask and api/index.py and the
+p50/p90 time to first response, all measured from interpreter start, plus how
+many modules were loaded and whether `requests` was among them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / 'api'
+DEAD_PROXY = 'http://127.0.0.1:9'
+
+# Runs inside the child interpreter. The werkzeug test client is imported
+# before the clock starts since a real deployment doesn't pay for it.
+CHILD = r'''
+import json, sys, time
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+t0 = time.perf_counter()
+import flask
+t1 = time.perf_counter()
+sys.path.insert(0, {api_dir!r})
+import index
+t2 = time.perf_counter()
+Client(index.app, Response).get({path!r})
+t3 = time.perf_counter()
+print(json.dumps({{'flask_ms': (t1 - t0) * 1000, 'import_ms': (t2 - t0) * 1000,
+                  'first_response_ms': (t3 - t0) * 1000, 'modules': len(sys.modules),
+                  'requests_loaded': 'requests' in sys.modules}}))
+'''
+
+
+def _child_env(cache_dir: str) -> dict:
+    # Upstream calls fail fast against a dead proxy, so the numbers measure
+    # our own code rather than the network; the (partial) cache entries they
+    # produce go to a throwaway directory instead of api/data.
+    return dict(os.environ, BITVIZ_DATA_DIR=cache_dir,
+                HTTP_PROXY=DEAD_PROXY, HTTPS_PROXY=DEAD_PROXY, NO_PROXY='')
+
+
+def run_once(api_dir: Path, path: str) -> dict:
+    code = CHILD.format(api_dir=str(api_dir), path=path)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             check=True, env=_child_env(cache_dir))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=['/', '/api/tip', '/api/debasement', '/api/cycle-data'])
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--api-dir', type=Path, default=API_DIR,
+                        help='profile another checkout, e.g. to compare against an older commit')
+    args = parser.parse_args()
+
+    print(f'{"path":<24}{"flask p50":>11}{"import p50":>12}{"first resp p50":>16}{"p90":>10}'
+          f'{"modules":>9}  requests')
+    for path in args.paths:
+        results = [run_once(args.api_dir, path) for _ in range(args.runs)]
+        first = [r['first_response_ms'] for r in results]
+        print(f'{path:<24}{statistics.median(r["flask_ms"] for r in results):>9.1f}ms'
+              f'{statistics.median(r["import_ms"] for r in results):>10.1f}ms'
+              f'{statistics.median(first):>14.1f}ms{pct(first, 0.9):>8.1f}ms'
+              f'{results[-1]["modules"]:>9}  {"yes" if results[-1]["requests_loaded"] else "no"}')
+
+
+if __name__ == '__main__':
+    main()
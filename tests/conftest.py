@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The API modules import each other as top-level modules (as on Vercel), and
+# must not write into api/data while under test.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'api'))
+os.environ.setdefault('BITVIZ_DATA_DIR', tempfile.mkdtemp(prefix='bitviz-test-'))
+os.environ.setdefault('BITVIZ_CACHE', 'memory')
@@ -0,0 +1,136 @@
+"""Stand-in for a Redis server, speaking just the RESP2 commands
+cache_backends.RedisBackend sends, so its client can be tested without one."""
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        server: 'RespServer' = self.server.owner
+        with server.lock:
+            server.connections += 1
+            server.sockets.append(self.connection)
+        authed = server.password is None
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].decode().upper()
+            if name == 'AUTH':
+                authed = args[1].decode() == server.password
+                self._write(b'+OK\r\n' if authed else b'-ERR invalid password\r\n')
+                continue
+            if not authed:
+                self._write(b'-NOAUTH Authentication required.\r\n')
+                continue
+            with server.lock:
+                reply = server.execute(name, args[1:])
+            self._write(reply)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            raise ValueError(f'expected an array, got {line!r}')
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _write(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _array(items) -> bytes:
+    return b'*%d\r\n' % len(items) + b''.join(_bulk(i) for i in items)
+
+
+class RespServer:
+    """In-memory strings with PX expiry plus sorted sets, on 127.0.0.1."""
+
+    def __init__(self, password: Optional[str] = None, port: int = 0):
+        self.password = password
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.sockets = []
+        self.commands = []
+        self.strings: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.zsets: Dict[bytes, Dict[bytes, float]] = {}
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.owner = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.02,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening and drop every open connection, like a crash."""
+        self._server.shutdown()
+        self._server.server_close()
+        with self.lock:
+            for sock in self.sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self.strings.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self.strings[key]
+            return None
+        return value
+
+    def execute(self, name: str, args) -> bytes:
+        self.commands.append(name)
+        if name == 'SELECT':
+            return b'+OK\r\n'
+        if name == 'SET':
+            expires_at = None
+            if len(args) >= 4 and args[2].upper() == b'PX':
+                expires_at = time.time() + int(args[3]) / 1000.0
+            self.strings[args[0]] = (args[1], expires_at)
+            return b'+OK\r\n'
+        if name == 'MGET':
+            return _array([self._get(k) for k in args])
+        if name == 'DEL':
+            n = sum(1 for k in args if self.strings.pop(k, None) is not None)
+            return b':%d\r\n' % n
+        if name == 'ZADD':
+            zset = self.zsets.setdefault(args[0], {})
+            added = 0
+            for score, member in zip(args[1::2], args[2::2]):
+                added += member not in zset
+                zset[member] = float(score)
+            return b':%d\r\n' % added
+        if name == 'ZCARD':
+            return b':%d\r\n' % len(self.zsets.get(args[0], {}))
+        if name == 'ZRANGE':
+            zset = self.zsets.get(args[0], {})
+            ordered = sorted(zset, key=lambda m: (zset[m], m))
+            start, stop = int(args[1]), int(args[2])
+            return _array(ordered[start:stop + 1 if stop >= 0 else None])
+        if name == 'ZREM':
+            zset = self.zsets.get(args[0], {})
+            n = sum(1 for m in args[1:] if zset.pop(m, None) is not None)
+            return b':%d\r\n' % n
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
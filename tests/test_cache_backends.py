@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+import cache_backends
+from cache_backends import FileBackend, MemoryBackend, RedisBackend, SQLiteBackend, from_url
+from resp_server import RespServer
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=['memory', 'file', 'sqlite', 'redis'])
+def make_backend(request, tmp_path):
+    servers = []
+
+    def make(max_entries=100):
+        if request.param == 'memory':
+            return MemoryBackend(max_entries)
+        if request.param == 'file':
+            return FileBackend(tmp_path / 'cache', max_entries)
+        if request.param == 'sqlite':
+            return SQLiteBackend(tmp_path / 'cache.sqlite3', max_entries)
+        servers.append(RespServer())
+        return RedisBackend(port=servers[-1].port, max_entries=max_entries)
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def test_get_and_set_many(make_backend):
+    b = make_backend()
+    b.set_many({'a': {'data': [1, 2.5, None]}, 'b': {'data': 'x'}})
+    assert b.get_many(['a', 'b', 'missing']) == {'a': {'data': [1, 2.5, None]}, 'b': {'data': 'x'}}
+    b.set('a', {'data': 'new'})
+    assert b.get('a') == {'data': 'new'}
+    b.delete('a')
+    assert b.get('a') is None
+    assert b.get_many([]) == {}
+
+
+def test_returned_entries_are_copies(make_backend):
+    b = make_backend()
+    b.set('a', {'data': [1]})
+    b.get('a')['data'].append(2)
+    assert b.get('a') == {'data': [1]}
+
+
+def test_raw_bytes_round_trip(make_backend):
+    b = make_backend()
+    blob = bytes(range(256)) + b'\r\n\n{"not": "json"'
+    b.set_raw_many({'r': blob, 'empty': b''})
+    assert b.get_raw_many(['r', 'empty', 'missing']) == {'r': blob, 'empty': b''}
+    assert b.get_raw('r') == blob
+    b.delete('r')
+    assert b.get_raw('r') is None
+
+
+def test_ttl_expiry(make_backend):
+    b = make_backend()
+    b.set('short', {'data': 1}, ttl=0.2)
+    b.set('long', {'data': 2}, ttl=60)
+    b.set_raw('short_raw', b'x', ttl=0.2)
+    assert b.get('short') == {'data': 1} and b.get_raw('short_raw') == b'x'
+    time.sleep(0.4)
+    assert b.get('short') is None
+    assert b.get_raw('short_raw') is None
+    assert b.get('long') == {'data': 2}
+
+
+def test_eviction_bounds_entries(make_backend):
+    b = make_backend(max_entries=3)
+    for i in range(6):
+        b.set(f'k{i}', {'data': i})
+        time.sleep(0.002)  # distinct write times for the file backend
+    present = b.get_many([f'k{i}' for i in range(6)])
+    assert sorted(present) == ['k3', 'k4', 'k5']
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite', 'redis'])
+def test_eviction_is_least_recently_used(kind, tmp_path, resp_server):
+    b = {
+        'memory': lambda: MemoryBackend(3),
+        'sqlite': lambda: SQLiteBackend(tmp_path / 'c.sqlite3', 3),
+        'redis': lambda: RedisBackend(port=resp_server.port, max_entries=3),
+    }[kind]()
+    for key in ('a', 'b', 'c'):
+        b.set(key, {'data': key})
+        time.sleep(0.002)
+    assert b.get('a')  # touched: now 'b' is the least recently used
+    time.sleep(0.002)
+    b.set('d', {'data': 'd'})
+    assert sorted(b.get_many(['a', 'b', 'c', 'd'])) == ['a', 'c', 'd']
+
+
+def test_file_backend_only_evicts_its_own_files(tmp_path):
+    (tmp_path / 'bitcoin_historical.csv').write_text('Date,Close\n')
+    (tmp_path / 'notes.json').write_text('{}')
+    (tmp_path / 'blob.bin').write_bytes(b'x')
+    b = FileBackend(tmp_path, max_entries=2)
+    for i in range(5):
+        b.set(f'k{i}', {'data': i})
+        b.set_raw(f'r{i}', b'raw')
+    assert (tmp_path / 'bitcoin_historical.csv').exists()
+    assert (tmp_path / 'notes.json').exists()
+    assert (tmp_path / 'blob.bin').exists()
+    owned = [p for p in tmp_path.iterdir() if p.name.endswith(('.cache.json', '.cache.bin'))]
+    assert len(owned) == 2
+
+
+def test_redis_auth_and_db(resp_server):
+    server = RespServer(password='s3cret')
+    try:
+        b = from_url(f'redis://:s3cret@127.0.0.1:{server.port}/2', None)
+        b.set('a', {'data': 1})
+        assert b.get('a') == {'data': 1}
+        assert 'SELECT' in server.commands
+    finally:
+        server.stop()
+
+
+def test_redis_outage_is_not_retried_until_back_off_passes(monkeypatch):
+    server = RespServer()
+    port = server.port
+    b = RedisBackend(port=port, timeout=0.5)
+    b.set('a', {'data': 1})
+    server.stop()
+
+    assert b.get('a') is None  # connection drops: treated as a miss
+    down_until = b._down_until
+    assert down_until > time.monotonic()
+    b.set('b', {'data': 2})  # no exception, no attempt
+    assert b._down_until == down_until
+
+    # Back up (empty) and the back-off expired: reconnects on next use
+    server = RespServer(port=port)
+    try:
+        monkeypatch.setattr(b, '_down_until', 0.0)
+        b.set('c', {'data': 3})
+        assert b.get('c') == {'data': 3}
+        assert server.connections == 1
+    finally:
+        server.stop()
+
+
+def test_resp_connection_reply_types(resp_server):
+    conn = cache_backends.RespConnection('127.0.0.1', resp_server.port)
+    try:
+        assert conn.execute('SET', 'k', b'v') == 'OK'
+        assert conn.execute('MGET', 'k', 'nope') == [b'v', None]
+        assert conn.execute('ZADD', 'z', 1, 'm') == 1
+        with pytest.raises(cache_backends.RespError):
+            conn.execute('NOSUCHCOMMAND')
+    finally:
+        conn.close()
+
+
+def test_from_url():
+    assert isinstance(from_url('memory', None), MemoryBackend)
+    assert isinstance(from_url('file', '/tmp/x'), FileBackend)
+    r = from_url('redis://:pw@example.invalid:6380/3', None, max_entries=7)
+    assert (r.host, r.port, r.db, r.password, r.max_entries) == ('example.invalid', 6380, 3, 'pw', 7)
+    with pytest.raises(ValueError):
+        from_url('ftp://x', None)
@@ -0,0 +1,66 @@
+import pytest
+from flask import g, jsonify
+
+import datasets
+import deadline
+from datasets import Dataset
+from index import DEFAULT_DEADLINE_S, app
+
+seen = {}
+
+
+def _refresh_view():
+    seen['remaining'] = deadline.remaining()
+    return jsonify({})
+
+
+app.add_url_rule('/_test/refresh', endpoint='_test_refresh', view_func=_refresh_view)
+
+
+@pytest.fixture
+def warm_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(datasets, 'warm', lambda app, lead, budget_s: calls.append(lead) or {})
+    return calls
+
+
+def get(path: str, headers=None):
+    with app.test_request_context(path, headers=headers or {}):
+        r = app.full_dispatch_request()
+        return r.status_code, r.get_json()
+
+
+def test_warm_refused_without_a_secret(monkeypatch, warm_calls):
+    monkeypatch.delenv('CRON_SECRET', raising=False)
+    assert get('/api/warm')[0] == 403
+    assert warm_calls == []
+
+
+def test_warm_needs_the_secret_and_clamps_lead(monkeypatch, warm_calls):
+    monkeypatch.setenv('CRON_SECRET', 's3cret')
+    assert get('/api/warm')[0] == 401
+    assert get('/api/warm', {'Authorization': 'Bearer wrong'})[0] == 401
+    assert get('/api/warm', {'Authorization': 'Bearer s3cr\u00e9t'})[0] == 401
+    auth = {'Authorization': 'Bearer s3cret'}
+    assert get('/api/warm?lead_s=nan', auth)[0] == 400
+
+    status, body = get('/api/warm?lead_s=1e9', auth)
+    assert status == 200 and body['lead_s'] == datasets.MAX_WARM_LEAD.total_seconds()
+    assert get('/api/warm?lead_s=-5', auth)[1]['lead_s'] == 0
+    assert get('/api/warm', auth)[1]['lead_s'] == datasets.WARM_LEAD.total_seconds()
+    assert warm_calls[0] == datasets.MAX_WARM_LEAD
+
+
+def test_path_refresh_keeps_the_callers_budget():
+    with app.test_request_context('/api/warm'):
+        app.preprocess_request()  # starts the warm route's deadline
+        outer = g.upstream_deadline
+        datasets._run(Dataset('x', None, '/_test/refresh'), app)
+        assert g.upstream_deadline is outer
+        # Not the refreshed route's own (default) deadline
+        assert seen['remaining'] > DEFAULT_DEADLINE_S
+
+
+def test_failed_path_refresh_raises():
+    with app.app_context(), pytest.raises(Exception):
+        datasets._run(Dataset('x', None, '/_test/missing'), app)
@@ -0,0 +1,64 @@
+import importlib.util
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    'fetch_historical_data',
+    Path(__file__).resolve().parent.parent / 'api' / 'data' / 'fetch_historical_data.py',
+)
+fhd = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fhd)
+
+D = date(2024, 1, 10)
+
+
+def day(n: int) -> date:
+    return D + timedelta(days=n)
+
+
+def test_fills_gaps_inside_the_window():
+    prices = {day(1): 1.0, day(3): 3.0, day(4): 4.0}
+    rows, filled = fhd.gap_filled_rows(prices, D, day(5), carry=0.5)
+    assert rows == [(day(1), 1.0), (day(2), 1.0), (day(3), 3.0), (day(4), 4.0)]
+    assert filled == 1
+
+
+def test_trailing_days_without_data_are_left_for_the_next_run():
+    rows, filled = fhd.gap_filled_rows({day(1): 1.0}, D, day(5), carry=0.5)
+    assert rows == [(day(1), 1.0)] and filled == 0
+
+
+def test_window_not_reaching_the_csv_is_refused():
+    with pytest.raises(fhd.GapTooWide):
+        fhd.gap_filled_rows({day(30): 1.0}, D, day(31), carry=0.5)
+
+
+def test_gap_wider_than_coingecko_serves_aborts(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'h.csv'
+    stale = date.today() - timedelta(days=fhd.MAX_FETCH_DAYS + 30)
+    csv_path.write_text(f'Date,Close\n{stale.isoformat()},100.0\n')
+    monkeypatch.setattr(fhd, 'CSV_PATH', csv_path)
+    monkeypatch.setattr(fhd, 'fetch_daily_closes', lambda days: pytest.fail('should not fetch'))
+    with pytest.raises(fhd.GapTooWide):
+        fhd.fetch_historical_data()
+    assert csv_path.read_text() == f'Date,Close\n{stale.isoformat()},100.0\n'
+
+
+def test_appends_missing_days(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'h.csv'
+    today = fhd.datetime.utcnow().date()
+    start = today - timedelta(days=4)
+    csv_path.write_text(f'Date,Close\n{start.isoformat()},100.0\n')
+    monkeypatch.setattr(fhd, 'CSV_PATH', csv_path)
+    monkeypatch.setattr(fhd, 'fetch_daily_closes', lambda days: {
+        start + timedelta(days=i): 100.0 + i for i in (1, 3)})
+    fhd.fetch_historical_data()
+    lines = csv_path.read_text().splitlines()
+    assert lines[1:] == [
+        f'{start.isoformat()},100.0',
+        f'{(start + timedelta(days=1)).isoformat()},101.0',
+        f'{(start + timedelta(days=2)).isoformat()},101.0',
+        f'{(start + timedelta(days=3)).isoformat()},103.0',
+    ]
@@ -0,0 +1,151 @@
+import json
+import math
+import random
+import struct
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import derived
+import formats
+import timeseries
+import upstream
+from index import app
+from series import DailySeries
+
+
+# A reference decoder, written from the format description in formats.py
+
+def decode_columnar(node):
+    if isinstance(node, list):
+        return [decode_columnar(v) for v in node]
+    if not isinstance(node, dict):
+        return node
+    if node.get('$axis') == 'date':
+        day = date.fromisoformat(node['start']).toordinal()
+        steps = node['delta_days'] if 'delta_days' in node else [node['step_days']] * (node['count'] - 1)
+        out = [day]
+        for d in steps:
+            out.append(out[-1] + int(d))
+        return [date.fromordinal(d).isoformat() for d in out][:node['count']]
+    if node.get('$axis') == 'num':
+        if 'step' in node:
+            return [node['start'] + i * node['step'] for i in range(node['count'])]
+        out = [node['start']]
+        for d in node['deltas']:
+            out.append(out[-1] + d)
+        return out
+    if '$rows' in node:
+        return [list(row) for row in zip(*(decode_columnar(c) for c in node['columns']))]
+    if '$records' in node:
+        fields = {k: decode_columnar(v) for k, v in node['fields'].items()}
+        return [{k: fields[k][i] for k in fields} for i in range(node['$records'])]
+    return {k: decode_columnar(v) for k, v in node.items()}
+
+
+def decode_binary(blob: bytes):
+    assert blob[:4] == formats.BINARY_MAGIC
+    m = struct.unpack('<I', blob[4:8])[0]
+    assert (8 + m) % 8 == 0
+    body = blob[8 + m:]
+
+    def column(node):
+        if isinstance(node, list):
+            return [column(v) for v in node]
+        if not isinstance(node, dict):
+            return node
+        for key, typecode, null in (('$f64', 'd', None), ('$f32', 'f', None), ('$i32', 'i', -2 ** 31)):
+            if key in node:
+                offset, count = node[key]
+                assert offset % 8 == 0
+                a = array(typecode)
+                a.frombytes(body[offset:offset + count * a.itemsize])
+                if typecode == 'i':
+                    return [None if v == null else v / node['scale'] for v in a]
+                return [None if math.isnan(v) else v for v in a]
+        return {k: column(v) for k, v in node.items()}
+
+    return decode_columnar(column(json.loads(blob[8:8 + m])))
+
+
+def plain(payload):
+    return json.loads(json.dumps(formats._plain(payload)))
+
+
+# Payloads
+
+def test_encodings_round_trip():
+    rnd = random.Random(5)
+    payload = {
+        'dates': ['2024-01-01', '2024-01-02', '2024-01-03'],
+        'uneven': ['2024-01-01', '2024-02-01', '2024-02-03'],
+        'rows': [[1.5, 2.0, None], [2.5, 4.25, 6.0], [4.0, 8.5, 1e-9]],
+        'dated_rows': [['2020-01-01', 1, 2.5], ['2021-01-01', 2, 3.5]],
+        'records': [{'label': 'a', 'n': 1, 'xy': [[0, 1.0], [1, 2.0]]},
+                    {'label': 'b', 'n': None, 'xy': [[0, 3.0], [2, 4.0], [3, 5.0]]}],
+        'mixed': [{'a': 1}, {'b': 2}, [1, 2], 'x', None],
+        'prices': [round(rnd.uniform(0, 1e5), 2) for _ in range(50)],
+        'raw': [rnd.uniform(-1, 1) for _ in range(50)],
+        'big': [2 ** 40, 2 ** 41, None],
+        'ticks': [0.1 * i for i in range(10)],  # not exactly start + i * step
+        'one': [1], 'empty': [], 'scalar': 3.25, 'nested': {'deep': [[1, 2], [3, 4]]},
+    }
+    assert decode_columnar(json.loads(json.dumps(formats.columnar(payload)))) == payload
+    assert decode_binary(formats.binary(payload)) == payload
+
+
+def test_series_windows_round_trip():
+    dense = DailySeries.from_pairs((datetime(2020, 1, 1) + timedelta(days=i), i * 1.1) for i in range(100))
+    gappy = DailySeries.from_pairs([(datetime(2020, 1, 1), 1.0), (datetime(2020, 1, 5), 2.0),
+                                    (datetime(2020, 1, 6), 3.0)])
+    payload = {'dense': dense.window(), 'gappy': gappy.window(), 'tail': dense.last_days(10),
+               'empty': dense.window(5, 5)}
+    expected = plain(payload)
+    assert decode_columnar(json.loads(json.dumps(formats.columnar(payload), default=formats._json_default))) == expected
+    assert decode_binary(formats.binary(payload)) == expected
+
+
+@pytest.fixture
+def endpoints(tmp_path, monkeypatch):
+    """The app over a store of synthetic series, with no upstream access."""
+    monkeypatch.setattr(timeseries, 'DB_PATH', tmp_path / 'series.sqlite3')
+    monkeypatch.setattr(timeseries, '_local', threading.local())
+    monkeypatch.setattr(timeseries, '_ready', set())
+    monkeypatch.setattr(derived, '_sources', {})
+
+    def offline(*args, **kwargs):
+        raise upstream.requests.ConnectionError('offline')
+    monkeypatch.setattr(upstream, 'get', offline)
+    import debasement
+    monkeypatch.setattr(debasement, '_fetch_uk_cpi_annual', lambda: {y: 2.0 + y % 3 for y in range(1990, 2030)})
+
+    rnd = random.Random(11)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = datetime(2010, 7, 17)
+    price, points = 0.05, []
+    for i in range((today - start).days + 1):
+        price *= math.exp(rnd.gauss(0.002, 0.04))
+        points.append((start + timedelta(days=i), price))
+    timeseries.upsert('btc_daily_usd_all', points, source='test', full=True)
+    for name, level in [('fred_m2sl', 8000.0), ('fred_cpiaucsl', 210.0), ('ecb_m3', 9000.0), ('boe_m4', 1.6e6)]:
+        months = [datetime(2000 + m // 12, m % 12 + 1, 1) for m in range((today.year - 2000) * 12 + today.month)]
+        timeseries.upsert(name, [(d, level * 1.004 ** i) for i, d in enumerate(months)], source='test', full=True)
+
+    def get(path: str) -> bytes:
+        with app.test_request_context(path):
+            r = app.full_dispatch_request()
+            assert r.status_code == 200, r.get_data()[:200]
+            return r.get_data()
+    return get
+
+
+@pytest.mark.parametrize('path', ['/api/cycle-data', '/api/cycle-data?anchor=low', '/api/debasement'])
+def test_binary_is_smaller_than_json_and_round_trips(endpoints, path):
+    sep = '&' if '?' in path else '?'
+    as_json = endpoints(path)
+    as_binary = endpoints(path + sep + 'format=binary')
+    assert len(as_binary) < len(as_json) * 0.75
+    assert decode_binary(as_binary) == json.loads(as_json)
+    assert decode_columnar(json.loads(endpoints(path + sep + 'format=columnar'))) == json.loads(as_json)
@@ -0,0 +1,53 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import derived
+import timeseries
+import upstream
+from index import app
+
+FIRST = datetime(2010, 7, 17)
+CLOSES = [float(i % 10 + 1) for i in range(30)]
+
+
+@pytest.fixture
+def get(tmp_path, monkeypatch):
+    """The app over a short synthetic USD history, with no upstream access."""
+    monkeypatch.setattr(timeseries, 'DB_PATH', tmp_path / 'series.sqlite3')
+    monkeypatch.setattr(timeseries, '_local', threading.local())
+    monkeypatch.setattr(timeseries, '_ready', set())
+    monkeypatch.setattr(derived, '_sources', {})
+
+    def offline(*args, **kwargs):
+        raise upstream.requests.ConnectionError('offline')
+    monkeypatch.setattr(upstream, 'get', offline)
+    timeseries.upsert('btc_daily_usd_all', [(FIRST + timedelta(days=i), v) for i, v in enumerate(CLOSES)],
+                      source='test', full=True)
+
+    def get(path: str):
+        with app.test_request_context(path):
+            r = app.full_dispatch_request()
+            return r.status_code, r.get_json()
+    return get
+
+
+@pytest.mark.parametrize('start', ['2010-07-17', '2010-01-01'])
+def test_price_percentile_window_from_the_first_close(get, start):
+    status, body = get(f'/api/price-percentile?currency=usd&price=5&start={start}')
+    assert status == 200
+    assert body['start'] == '2010-07-17' and body['days'] == 30
+    assert body['days_above'] == sum(v > 5 for v in CLOSES)
+
+
+def test_price_percentile_window_bounds(get):
+    status, body = get('/api/price-percentile?currency=usd&price=5&start=2010-07-18&end=2010-07-26')
+    assert status == 200 and body['days'] == 9 and body['days_above'] == sum(v > 5 for v in CLOSES[1:10])
+    assert get('/api/price-percentile?currency=usd&days=100')[1]['days'] == 30
+    assert get('/api/price-percentile?currency=usd&start=2011-01-01')[0] == 404
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-inf', 'x'])
+def test_price_percentile_rejects_non_finite_prices(get, price):
+    assert get(f'/api/price-percentile?currency=usd&price={price}')[0] == 400
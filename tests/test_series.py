@@ -0,0 +1,201 @@
+import math
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from series import (DAY_MS, GENESIS_MS, DailySeries, OrderIndex, PowerLawFit, downsample_xy, from_ms,
+                    holding_returns, rolling_corr_beta, rolling_extreme_index, rolling_volatility, sma, to_ms)
+
+D = datetime(2020, 1, 1)
+
+
+def daily(n: int, start: datetime = D, seed: int = 1) -> DailySeries:
+    rnd = random.Random(seed)
+    return DailySeries.from_pairs((start + timedelta(days=i), rnd.uniform(1, 1e5)) for i in range(n))
+
+
+def same(a: DailySeries, b: DailySeries) -> bool:
+    # Compared as bytes so NaN == NaN
+    return a.ts_ms.tobytes() == b.ts_ms.tobytes() and a.values.tobytes() == b.values.tobytes()
+
+
+@pytest.mark.parametrize('compress', [True, False])
+@pytest.mark.parametrize('series', [
+    DailySeries.from_pairs([]),
+    daily(1),
+    daily(3000),
+    # Gaps, so the timestamps have to be stored
+    DailySeries.from_pairs([(D, 1.0), (D + timedelta(days=1), 2.0), (D + timedelta(days=40), 3.0)]),
+    # Before the epoch, and values that don't survive a text round-trip
+    DailySeries.from_pairs([(datetime(1960, 1, 1) + timedelta(days=i), v)
+                            for i, v in enumerate([0.0, -0.0, -1.5, math.inf, -math.inf, math.nan, 5e-324])]),
+], ids=['empty', 'one', 'dense', 'gaps', 'special'])
+def test_pack_round_trip(series, compress):
+    assert same(DailySeries.from_bytes(series.to_bytes(compress=compress)), series)
+
+
+def test_dense_series_packs_without_timestamps():
+    dense, gappy = daily(1000), daily(1000)
+    gappy.ts_ms[-1] += DAY_MS
+    assert len(dense.to_bytes(compress=False)) + 1000 * 8 == len(gappy.to_bytes(compress=False))
+
+
+def test_from_bytes_rejects_bad_input():
+    blob = daily(10).to_bytes(compress=False)
+    with pytest.raises(ValueError):
+        DailySeries.from_bytes(b'XXXX' + blob[4:])
+    with pytest.raises(ValueError):
+        DailySeries.from_bytes(blob[:-8])
+
+
+def test_ms_conversions():
+    for when in [datetime(1970, 1, 1), datetime(1969, 12, 31, 23, 59, 59, 999000), datetime(2024, 2, 29, 12, 30)]:
+        assert from_ms(to_ms(when)) == when
+    assert to_ms(D) == DailySeries.from_pairs([(D, 0.0)]).ts_ms[0]
+
+
+def test_lookups_match_brute_force():
+    rnd = random.Random(3)
+    pairs, d = [], datetime(2019, 11, 17)
+    while d < datetime(2022, 3, 1):
+        pairs.append((d, rnd.random()))
+        d += timedelta(days=rnd.choice([1, 1, 2, 9, 31, 45]))
+    series = DailySeries.from_pairs(pairs)
+
+    assert [series.date(i) for i in range(len(series))] == [p[0] for p in pairs]
+    for when in [pairs[0][0] - timedelta(days=1), *(p[0] for p in pairs),
+                 *(p[0] + timedelta(hours=12) for p in pairs)]:
+        before = [v for d, v in pairs if d <= when]
+        assert series.value_at_or_before(when) == (before[-1] if before else None)
+
+    ends = {}
+    for d, v in pairs:
+        ends[(d.year, d.month)] = v
+    assert series.month_ends() == ends
+    assert DailySeries.from_pairs([]).month_ends() == {}
+
+
+def test_order_index_counts_match_brute_force():
+    rnd = random.Random(41)
+    values = [float(rnd.randint(0, 50)) for _ in range(300)]  # with ties
+    index = OrderIndex()
+    index.extend(values[:137])
+    grown = index.copy()
+    grown.extend(values[137:])
+    full = OrderIndex()
+    full.extend(values)
+    assert grown.levels == full.levels
+    assert len(index) == 137
+
+    for _ in range(500):
+        lo, hi = sorted(rnd.randint(0, len(values)) for _ in range(2))
+        x = rnd.choice(values) + rnd.choice([-0.5, 0.0, 0.5])
+        assert full.count_above(x, lo, hi) == sum(v > x for v in values[lo:hi])
+    assert full.count_above(-1.0) == len(values)
+    assert full.count_above(25.0, 10, 10_000) == sum(v > 25.0 for v in values[10:])
+
+
+@pytest.mark.parametrize('window', [1, 2, 7, 30])
+def test_rolling_helpers_match_brute_force(window):
+    rnd = random.Random(window)
+    values = [float(rnd.randint(1, 20)) for _ in range(200)]  # with ties
+    gappy = [None if rnd.random() < 0.2 else v for v in values]
+
+    for i in range(len(values)):
+        lo = max(0, i + 1 - window)
+        span = values[lo:i + 1]
+        assert rolling_extreme_index(values, window)[i] == lo + span.index(max(span))
+        assert rolling_extreme_index(values, window, highest=False)[i] == lo + span.index(min(span))
+
+        present = [v for v in gappy[lo:i + 1] if v is not None]
+        expected = sum(present) / len(present) if i >= window - 1 and present else None
+        assert sma(gappy, window)[i] == pytest.approx(expected)
+
+        vol = rolling_volatility(values, window)[i]
+        if window < 2 or i < window - 1:
+            assert vol is None
+        else:
+            assert vol == pytest.approx(statistics.stdev(span) * math.sqrt(365) * 100, rel=1e-9, abs=1e-9)
+
+
+def test_downsample_keeps_stride_and_last_point():
+    pairs = [(i, i * 2) for i in range(1001)]
+    assert downsample_xy(pairs, 1001) == pairs
+    assert downsample_xy(pairs, 300) == pairs[::3] + [pairs[-1]]
+    assert downsample_xy(pairs[:1000], 300) == pairs[:1000:3]  # already ends on the last point
+    assert downsample_xy([], 10) == []
+
+
+@pytest.mark.parametrize('hold_days', [1, 5, 30])
+def test_holding_returns_match_brute_force(hold_days):
+    rnd = random.Random(hold_days)
+    pairs, d = [], D
+    for _ in range(150):
+        pairs.append((d, rnd.choice([0.0, math.nan, rnd.uniform(1, 100), rnd.uniform(1, 100)])))
+        d += timedelta(days=rnd.choice([1, 1, 3]))
+    expected = []
+    for i, (entry, price) in enumerate(pairs):
+        exits = [v for when, v in pairs if when >= entry + timedelta(days=hold_days)]
+        if not exits:
+            break
+        if price > 0 and exits[0] > 0:  # skipped without both prices
+            expected.append((i, exits[0] / price - 1.0))
+    assert holding_returns(DailySeries.from_pairs(pairs), hold_days) == expected
+
+
+def test_power_law_fit_matches_least_squares():
+    rnd = random.Random(45)
+    ts_ms = [GENESIS_MS - 10 * DAY_MS + i * DAY_MS * 7 for i in range(700)]
+    values = [10 ** (-17 + 5.8 * math.log10(max(PowerLawFit.days(t), 1)) + rnd.gauss(0, 0.3)) for t in ts_ms]
+    values[100] = 0.0  # skipped, like anything at or before genesis
+    points = [(math.log10(PowerLawFit.days(t)), math.log10(v)) for t, v in zip(ts_ms, values)
+              if t > GENESIS_MS and v > 0]
+
+    n = len(points)
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    sxy = sum((x - mx) * (y - my) for x, y in points)
+    syy = sum((y - my) ** 2 for _, y in points)
+    slope = sxy / sxx
+    intercept = my - slope * mx
+    sse = sum((y - intercept - slope * x) ** 2 for x, y in points)
+    expected = (slope, intercept, math.sqrt(sse / (n - 2)), 1 - sse / syy)
+
+    fit = PowerLawFit()
+    fit.extend(ts_ms[:300], values[:300])
+    grown = fit.copy()
+    grown.extend(ts_ms[300:], values[300:])
+    assert grown.n == n
+    assert grown.params() == pytest.approx(expected, rel=1e-6)
+    assert fit.n < n  # the copy didn't share state
+
+    too_few = PowerLawFit()
+    too_few.extend(ts_ms[:3], values[:3])  # two of them before genesis
+    assert too_few.params() is None
+
+
+@pytest.mark.parametrize('window', [3, 12, 24])
+def test_rolling_corr_beta_match_brute_force(window):
+    rnd = random.Random(window)
+    ys = [None if rnd.random() < 0.1 else rnd.gauss(0, 1) for _ in range(120)]
+    xs = [None if y is None or rnd.random() < 0.1 else 0.5 * y + rnd.gauss(0, 0.5) for y in ys]
+    xs[40:70] = [0.1] * 30  # no variance in x
+    ys[80:110] = [0.7] * 30  # nor in y
+    corr, beta = rolling_corr_beta(xs, ys, window)
+    for i in range(len(xs)):
+        lo = max(0, i + 1 - window)
+        pairs = [(x, y) for x, y in zip(xs[lo:i + 1], ys[lo:i + 1]) if x is not None and y is not None]
+        expected_corr = expected_beta = None
+        if len(pairs) >= 3:
+            px, py = [p[0] for p in pairs], [p[1] for p in pairs]
+            mx, my = statistics.fmean(px), statistics.fmean(py)
+            cov = statistics.fmean([(x - mx) * (y - my) for x, y in pairs])
+            if len(set(py)) > 1:
+                expected_beta = cov / statistics.pvariance(py)
+                if len(set(px)) > 1:
+                    expected_corr = cov / math.sqrt(statistics.pvariance(px) * statistics.pvariance(py))
+        assert beta[i] == pytest.approx(expected_beta, abs=1e-9)
+        assert corr[i] == pytest.approx(expected_corr, abs=1e-9)
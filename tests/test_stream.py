@@ -0,0 +1,22 @@
+import pytest
+
+from index import app
+
+
+@pytest.fixture
+def get(monkeypatch):
+    def get(path: str, stream_enabled: bool):
+        monkeypatch.setitem(app.config, 'STREAM_ENABLED', stream_enabled)
+        with app.test_request_context(path):
+            r = app.full_dispatch_request()
+            return r.status_code, r.get_data()
+    return get
+
+
+def test_disabled_stream_tells_eventsource_to_stop(get):
+    assert get('/api/stream', False) == (204, b'')
+    assert b'startStream();' not in get('/', False)[1]
+
+
+def test_pages_open_the_stream_when_enabled(get):
+    assert b'startStream();' in get('/', True)[1]
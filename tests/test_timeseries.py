@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import timeseries
+
+D = datetime(2024, 1, 1)
+
+
+def day(n: int) -> datetime:
+    return D + timedelta(days=n)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(timeseries, 'DB_PATH', tmp_path / 'series.sqlite3')
+    monkeypatch.setattr(timeseries, '_local', threading.local())
+    monkeypatch.setattr(timeseries, '_ready', set())
+    return timeseries
+
+
+def test_upsert_writes_only_new_and_revised_days(store):
+    assert store.upsert('s', [(day(0), 1.0), (day(1), 2.0)], source='t', full=True) == 2
+    v1 = store.version('s')
+    updated = store.info('s')['updated_at']
+
+    assert store.upsert('s', [(day(1), 2.0)], source='t') == 0
+    assert store.version('s') == v1
+    assert store.info('s')['updated_at'] == updated
+
+    assert store.upsert('s', [(day(1), 2.5), (day(2), 3.0)], source='t') == 2
+    assert store.version('s') != v1
+    assert store.read('s') == [(day(0), 1.0), (day(1), 2.5), (day(2), 3.0)]
+    info = store.info('s')
+    assert (info['first_date'], info['last_date'], info['points']) == ('2024-01-01', '2024-01-03', 3)
+
+
+def test_later_duplicates_win(store):
+    store.upsert('s', [(day(0), 1.0), (day(0), 5.0)], source='t')
+    assert store.read('s') == [(day(0), 5.0)]
+
+
+def test_read_range_and_packed_copy_agree(store):
+    points = [(day(i), float(i * i)) for i in range(0, 40, 3)]
+    store.upsert('s', reversed(points), source='t', full=True)
+    assert store.read('s', start=day(6), end=day(15)) == [p for p in points if day(6) <= p[0] <= day(15)]
+    packed = store.read_series('s')
+    assert list(packed.ts_ms) == [(d - timeseries.EPOCH).days * timeseries.DAY_MS for d, _ in points]
+    assert list(packed.values) == [v for _, v in points]
+
+
+def test_empty_incremental_refresh_marks_series_fresh(store):
+    store.upsert('s', [(day(0), 1.0)], source='t', full=True)
+    assert store.fresh('s', timedelta(hours=1))
+    assert not store.fresh('s', timedelta(0))
+    assert store.upsert('s', [], source='t') == 0
+    assert store.info('s')['points'] == 1
+
+
+def test_refresh_start(store):
+    assert store.refresh_start('s', timedelta(days=3)) is None  # empty: full download
+
+    store.upsert('s', [(day(0), 1.0), (day(10), 2.0)], source='t')
+    assert store.refresh_start('s', timedelta(days=3)) is None  # never downloaded in full
+
+    store.upsert('s', [(day(0), 1.0), (day(10), 2.0)], source='t', full=True)
+    assert store.refresh_start('s', timedelta(days=3)) == day(7)
+    store.upsert('s', [(day(11), 2.0)], source='t')
+    assert store.refresh_start('s', timedelta(days=3)) == day(8)
+    # The periodic full download is due
+    assert store.refresh_start('s', timedelta(days=3), full_every=timedelta(0)) is None
+
+
+def test_unknown_series_and_bad_names(store):
+    assert store.read('nothing') == []
+    assert len(store.read_series('nothing')) == 0
+    assert store.read_series('nothing', fallback=[(day(0), 1.0)]).values.tolist() == [1.0]
+    assert store.version('nothing') is None
+    assert store.upsert('Bad Name!', [(day(0), 1.0)], source='t') is None
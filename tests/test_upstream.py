@@ -0,0 +1,136 @@
+import pytest
+import requests
+
+import upstream
+from upstream import CircuitBreaker, RateLimited, TokenBucket, UpstreamUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(upstream.time, 'monotonic', c)
+    monkeypatch.setattr(upstream.time, 'sleep', lambda s: setattr(c, 'now', c.now + s))
+    return c
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(upstream, '_breakers', {})
+    monkeypatch.setattr(upstream, '_negative', {})
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_breaker_opens_after_threshold_and_probes_once(clock):
+    b = CircuitBreaker('p', failure_threshold=2, base_cooldown=10, max_cooldown=40)
+    b.record_failure('x')
+    assert b.state == CircuitBreaker.CLOSED and b.allow()
+    b.record_failure('x')
+    assert b.state == CircuitBreaker.OPEN
+    assert not b.allow()
+
+    clock.now += 10
+    assert b.allow()
+    assert b.state == CircuitBreaker.HALF_OPEN
+    assert not b.allow()  # one probe at a time
+
+    b.record_success()
+    assert b.state == CircuitBreaker.CLOSED and b.failures == 0 and b.allow()
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(clock):
+    b = CircuitBreaker('p', failure_threshold=1, base_cooldown=10, max_cooldown=25)
+    b.record_failure('x')
+    for expected in (20, 25, 25):
+        clock.now = b.open_until
+        assert b.allow()
+        b.record_failure('x')
+        assert b.state == CircuitBreaker.OPEN and b.cooldown == expected
+        assert b.open_until == clock.now + expected
+
+
+def test_released_probe_can_be_retried(clock):
+    b = CircuitBreaker('p', failure_threshold=1, base_cooldown=10)
+    b.record_failure('x')
+    clock.now += 10
+    assert b.allow()
+    b.release_probe()
+    assert b.allow()
+
+
+def test_bucket_keeps_reserve_for_interactive_calls(clock):
+    bucket = TokenBucket(per_minute=60, burst=3, reserve=2)
+    assert bucket.acquire(upstream.BACKGROUND, max_wait=0) == 0.0
+    with pytest.raises(RateLimited):
+        bucket.acquire(upstream.BACKGROUND, max_wait=0.5)
+    assert bucket.acquire(upstream.INTERACTIVE, max_wait=0) == 0.0
+    assert bucket.acquire(upstream.INTERACTIVE, max_wait=0) == 0.0
+    # Empty: an interactive call now waits one refill interval
+    assert bucket.acquire(upstream.INTERACTIVE, max_wait=5) == pytest.approx(1.0)
+
+
+def test_bucket_penalize_blocks_for_retry_after(clock):
+    bucket = TokenBucket(per_minute=60, burst=5)
+    bucket.penalize(30)
+    with pytest.raises(RateLimited):
+        bucket.acquire(upstream.INTERACTIVE, max_wait=29)
+    assert bucket.acquire(upstream.INTERACTIVE, max_wait=40) == pytest.approx(31.0)
+
+
+def test_open_breaker_does_not_spend_quota(clock, monkeypatch):
+    bucket = TokenBucket(per_minute=60, burst=2)
+    monkeypatch.setitem(upstream.RATE_LIMITS, 'limited', bucket)
+    monkeypatch.setattr(upstream.requests, 'get', lambda url, **kw: FakeResponse(503))
+    for i in range(upstream.FAILURE_THRESHOLD):
+        clock.now += 60  # refill, and outlive the negative cache
+        upstream.get('limited', f'https://example.invalid/{i}')
+    assert upstream.breaker('limited').state == CircuitBreaker.OPEN
+
+    before = bucket.tokens
+    for _ in range(5):
+        with pytest.raises(UpstreamUnavailable):
+            upstream.get('limited', 'https://example.invalid/other')
+    assert bucket.tokens == before
+
+    # Half-open with the probe in flight: everything else is refused, free
+    b = upstream.breaker('limited')
+    clock.now = b.open_until
+    bucket.tokens = 2.0
+    assert b.allow()
+    with pytest.raises(UpstreamUnavailable):
+        upstream.get('limited', 'https://example.invalid/other')
+    assert bucket.tokens == 2.0
+
+
+def test_negative_cache_is_bounded_and_pruned(clock, monkeypatch):
+    monkeypatch.setattr(upstream, 'NEGATIVE_MAX_ENTRIES', 3)
+
+    def fail(url, **kw):
+        raise requests.ConnectionError('down')
+    monkeypatch.setattr(upstream.requests, 'get', fail)
+
+    for i in range(5):
+        upstream.breaker('flaky').record_success()
+        with pytest.raises(requests.ConnectionError):
+            upstream.get('flaky', 'https://example.invalid/', params={'start': i})
+    assert len(upstream._negative) == 3
+    with pytest.raises(UpstreamUnavailable):
+        upstream.get('flaky', 'https://example.invalid/', params={'start': 4})
+
+    clock.now += upstream.NEGATIVE_TTL_S + 1
+    upstream.breaker('flaky').record_success()
+    with pytest.raises(requests.ConnectionError):
+        upstream.get('flaky', 'https://example.invalid/', params={'start': 99})
+    assert list(upstream._negative) == [upstream._negative_key('flaky', 'https://example.invalid/', {'start': 99})]